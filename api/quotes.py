@@ -0,0 +1,92 @@
+"""
+Vercel Serverless Function — GET /api/quotes?tickers=AAPL,MSFT,...
+Returns live data for many stocks with one bulk yfinance download
+"""
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market.cache import QuoteCache, FRESH, STALE, NEGATIVE
+from market.quotes import parse_tickers, fetch_quotes
+from market.reference import REAL_PRICES
+
+# Survives between invocations while the container stays warm
+QUOTE_CACHE = QuoteCache(maxsize=1024, ttl=60, stale_ttl=0)
+
+
+def fallback_quote(ticker):
+    if ticker in REAL_PRICES:
+        return {
+            "success": True,
+            "stock": {
+                "ticker": ticker, "price": REAL_PRICES[ticker],
+                "change_percent": 0, "market_cap": 0, "is_live": False
+            },
+            "source": "fallback"
+        }
+    return {"success": False, "error": f"Ticker {ticker} not found"}
+
+
+def resolve_quotes(tickers):
+    quotes = {}
+    misses = []
+    for ticker in tickers:
+        state, data = QUOTE_CACHE.lookup(ticker)
+        if state in (FRESH, STALE):
+            quotes[ticker] = {"success": True, "stock": data, "source": "cache"}
+        elif state == NEGATIVE:
+            quotes[ticker] = fallback_quote(ticker)
+        else:
+            misses.append(ticker)
+
+    live = {}
+    if misses:
+        try:
+            live = fetch_quotes(misses)
+        except Exception as e:
+            print(f"Bulk quote fetch failed: {e}")
+
+    for ticker in misses:
+        data = live.get(ticker)
+        if data:
+            QUOTE_CACHE.set(ticker, data)
+            quotes[ticker] = {"success": True, "stock": data, "source": "live"}
+            continue
+        if ticker in live:
+            QUOTE_CACHE.set_missing(ticker)
+        quotes[ticker] = fallback_quote(ticker)
+
+    return {t: quotes[t] for t in tickers}
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        tickers = parse_tickers(params.get('tickers', [''])[0])
+
+        if not tickers:
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(json.dumps({"success": False, "error": "Missing tickers"}).encode())
+            return
+
+        result = {"success": True, "quotes": resolve_quotes(tickers), "count": len(tickers)}
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(result).encode())
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
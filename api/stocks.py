@@ -1,123 +1,98 @@
 """
 Vercel Serverless Function — GET /api/stocks
-Returns all S&P 500 stocks from Wikipedia + cached/real prices
+Returns all S&P 500 stocks from the build-time constituents snapshot
+(market/data/constituents.json), optionally revalidated from Wikipedia
 """
 from http.server import BaseHTTPRequestHandler
-import json
 import os
-import urllib.request
-import random
+import sys
+import threading
+import time
 from datetime import datetime
 
-# Real stock prices (Feb 2026) — fallback when yfinance unavailable
-REAL_PRICES = {
-    "AAPL": 227.63, "MSFT": 409.04, "NVDA": 129.84, "GOOGL": 185.34, "GOOG": 186.82,
-    "AMZN": 235.42, "META": 719.76, "TSLA": 361.62, "BRK-B": 482.79, "AVGO": 238.59,
-    "JPM": 276.00, "LLY": 821.79, "V": 344.26, "UNH": 517.08, "XOM": 105.10,
-    "MA": 553.08, "COST": 1026.61, "HD": 406.66, "PG": 169.30, "JNJ": 150.73,
-    "WMT": 102.38, "NFLX": 982.54, "CRM": 330.92, "BAC": 46.67, "ORCL": 174.59,
-    "CVX": 147.68, "KO": 62.70, "MRK": 89.91, "ABBV": 181.35, "PEP": 142.41,
-    "AMD": 112.58, "TMO": 538.84, "CSCO": 64.49, "ACN": 360.59, "LIN": 452.88,
-    "MCD": 294.50, "ABT": 124.55, "ADBE": 430.58, "DHR": 233.43, "WFC": 79.68,
-    "TXN": 192.47, "PM": 132.99, "VZ": 39.27, "NEE": 69.56, "INTC": 19.64,
-    "QCOM": 168.92, "IBM": 248.55, "GE": 199.87, "CAT": 365.92, "NOW": 1024.35,
-    "HON": 224.53, "BA": 174.88, "AMGN": 282.34, "RTX": 127.45, "GS": 635.22,
-    "BLK": 1015.67, "ISRG": 585.43, "SBUX": 102.89, "MMM": 148.23, "DIS": 111.34,
-    "NKE": 71.56, "PYPL": 87.45, "F": 9.87, "GM": 52.34, "T": 23.45,
-    "COP": 98.75, "LOW": 245.32, "SPGI": 498.21, "UPS": 125.67, "AXP": 312.45,
-    "DE": 412.88, "PLD": 112.34, "MDLZ": 68.92, "SCHW": 78.45, "ADI": 198.76,
-    "SO": 84.32, "DUK": 105.67, "CME": 234.89, "ICE": 156.78, "PGR": 267.34,
-    "CI": 312.45, "ELV": 378.90, "REGN": 756.23, "CL": 92.45, "PANW": 378.90,
-    "SNPS": 534.67, "CDNS": 289.45, "LRCX": 876.54, "AMAT": 176.89, "KLAC": 698.34,
-}
-
-KNOWN_CAPS = {
-    "AAPL": 3_200_000_000_000, "MSFT": 3_100_000_000_000, "NVDA": 2_900_000_000_000,
-    "GOOGL": 2_100_000_000_000, "GOOG": 2_100_000_000_000, "AMZN": 2_000_000_000_000,
-    "META": 1_400_000_000_000, "TSLA": 1_100_000_000_000, "BRK-B": 900_000_000_000,
-    "AVGO": 850_000_000_000, "JPM": 700_000_000_000, "LLY": 700_000_000_000,
-    "V": 600_000_000_000, "UNH": 550_000_000_000, "XOM": 500_000_000_000,
-    "MA": 480_000_000_000, "COST": 420_000_000_000, "HD": 400_000_000_000,
-    "PG": 390_000_000_000, "JNJ": 380_000_000_000, "WMT": 370_000_000_000,
-    "NFLX": 350_000_000_000, "CRM": 320_000_000_000, "BAC": 310_000_000_000,
-    "ORCL": 300_000_000_000, "CVX": 280_000_000_000, "KO": 270_000_000_000,
-    "MRK": 260_000_000_000, "ABBV": 250_000_000_000, "PEP": 240_000_000_000,
-    "AMD": 230_000_000_000, "TMO": 220_000_000_000, "CSCO": 210_000_000_000,
-    "ACN": 200_000_000_000, "LIN": 200_000_000_000,
-}
-
-
-def fetch_sp500():
-    """Fetch S&P 500 from Wikipedia and generate stock data"""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market.constituents import fetch_sp500, load_snapshot
+from market.encoding import encode_payload
+
+CACHE_TTL = 300  # seconds - matches Cache-Control max-age
+# Opt-in: refresh from Wikipedia in the background once the data is older
+# than CACHE_TTL. Off by default - the function then only serves the
+# build-time snapshot and never touches Wikipedia on a request.
+REVALIDATE = os.environ.get("STOCKS_REVALIDATE", "").lower() in ("1", "true", "yes")
+
+# Module state survives between invocations while the container stays warm
+WARM = {"body": None, "time": 0.0, "revalidating": False}
+WARM_LOCK = threading.Lock()
+
+
+def encode_stocks(stocks, source, last_updated):
+    return encode_payload({"stocks": stocks, "count": len(stocks), "last_updated": last_updated, "source": source})
+
+
+def load_body():
+    """Encoded body from the shipped snapshot - Wikipedia only if it is missing"""
+    snapshot = load_snapshot()
+    if snapshot:
+        return encode_stocks(snapshot["stocks"], "snapshot", snapshot.get("generated_at"))
+    stocks = fetch_sp500()
+    if stocks:
+        return encode_stocks(stocks, "live", datetime.now().isoformat())
+    return None
+
+
+def revalidate():
+    """Background refresh - keeps serving the current body if Wikipedia fails"""
     try:
-        # Try importing pandas for Wikipedia parsing
-        import pandas as pd
-        url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=8) as resp:
-            html = resp.read()
-        tables = pd.read_html(html)
-        df = tables[0]
-
-        stocks = []
-        total_target = 62_000_000_000_000
-        remaining = total_target - sum(KNOWN_CAPS.values())
-        unknown_count = len(df) - len(KNOWN_CAPS)
-        avg = remaining / max(unknown_count, 1)
-
-        for _, row in df.iterrows():
-            ticker = str(row['Symbol']).replace('.', '-')
-            name = str(row['Security'])
-            sector = str(row['GICS Sector'])
-
-            mc = KNOWN_CAPS.get(ticker, int(max(5e9, min(150e9, avg * random.uniform(0.3, 1.7)))))
-
-            if ticker in REAL_PRICES:
-                price = REAL_PRICES[ticker]
-                change = round(random.uniform(-1.5, 1.5), 2)
-            else:
-                if mc > 500e9: sf = 15e9
-                elif mc > 100e9: sf = 3e9
-                elif mc > 50e9: sf = 1e9
-                else: sf = 500e6
-                price = round(max(15, min(800, (mc / sf) * random.uniform(0.95, 1.05))), 2)
-                change = round(random.uniform(-2.0, 2.0), 2)
-
-            total = sum(s.get('market_cap', 0) for s in stocks) + mc
-            stocks.append({
-                "ticker": ticker, "name": name, "sector": sector,
-                "market_cap": mc, "price": price,
-                "change_percent": change, "weight": 0
-            })
-
-        # Calculate weights
-        total_mc = sum(s['market_cap'] for s in stocks)
-        for s in stocks:
-            s['weight'] = round((s['market_cap'] / total_mc) * 100, 4)
-
-        return stocks
-    except Exception as e:
-        print(f"Wikipedia fetch failed: {e}")
-        return None
+        stocks = fetch_sp500()
+        if stocks:
+            body = encode_stocks(stocks, "live", datetime.now().isoformat())
+            with WARM_LOCK:
+                WARM.update(body=body, time=time.time())
+    finally:
+        WARM["revalidating"] = False
+
+
+def encoded_stocks():
+    """Encoded /api/stocks body - loaded once per container, then reused"""
+    body = WARM["body"]
+    if body is None:
+        with WARM_LOCK:
+            if WARM["body"] is None:
+                WARM.update(body=load_body(), time=time.time())
+            body = WARM["body"]
+    elif REVALIDATE and time.time() - WARM["time"] >= CACHE_TTL and not WARM["revalidating"]:
+        WARM["revalidating"] = True
+        threading.Thread(target=revalidate, daemon=True).start()
+    return body
+
+
+ERROR_BODY = encode_payload({"stocks": [], "count": 0, "error": "Failed to fetch data", "source": "error"})
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
-        stocks = fetch_sp500()
+        body = encoded_stocks() or ERROR_BODY
+        content, coding, etag = body.variant(self.headers.get('Accept-Encoding', ''))
+
+        if body.matches_etag(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Cache-Control', 'public, max-age=300')
+            self.end_headers()
+            return
 
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Cache-Control', 'public, max-age=300')
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        if coding:
+            self.send_header('Content-Encoding', coding)
         self.end_headers()
-
-        if stocks:
-            result = {"stocks": stocks, "count": len(stocks), "last_updated": datetime.now().isoformat(), "source": "live"}
-        else:
-            result = {"stocks": [], "count": 0, "error": "Failed to fetch data", "source": "error"}
-
-        self.wfile.write(json.dumps(result).encode())
+        self.wfile.write(content)
 
     def do_OPTIONS(self):
         self.send_response(200)
@@ -0,0 +1,4 @@
+"""
+Benchmarks and load checks - run from the repo root, e.g.
+python -m bench.loop_responsiveness
+"""
@@ -0,0 +1,67 @@
+"""
+Sector/index aggregates - delta updates vs recomputing from the universe.
+
+Publishes random price moves through a SnapshotStore, checks that the
+incrementally maintained aggregates equal a fresh rebuild, and times one
+update of CHANGED tickers against a full recomputation per universe size.
+
+    python -m bench.aggregates
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from market.aggregates import Aggregates
+from market.refresher import apply_quotes
+from market.snapshot import SnapshotStore
+from market.synthetic import synthetic_universe
+
+SIZES = (500, 10_000, 100_000)
+CHANGED = 20
+STEPS = 200
+
+
+def random_quotes(columns, rng) -> dict:
+    rows = rng.choice(len(columns), CHANGED, replace=False).tolist()
+    return {
+        columns.tickers[i]: {"price": round(columns.price[i] * rng.uniform(0.98, 1.02), 2),
+                             "change_percent": round(rng.uniform(-3, 3), 2)}
+        for i in rows
+    }
+
+
+def simulate(size: int):
+    """(live aggregates, store, seconds per incremental update)"""
+    rng = np.random.default_rng(size)
+    store = SnapshotStore()
+    aggregates = Aggregates()
+    aggregates.on_publish(store.publish(synthetic_universe(size), source="synthetic"), None)
+    spent = 0.0
+    for _ in range(STEPS):
+        columns, changed = apply_quotes(store.current.columns, random_quotes(store.current.columns, rng))
+        snapshot = store.publish(columns, source="refresh", changed=changed)
+        start = time.perf_counter()
+        aggregates.on_publish(snapshot, frozenset(changed))  # What the store's listener call does
+        spent += time.perf_counter() - start
+    return aggregates, store, spent / STEPS
+
+
+def run() -> bool:
+    ok = True
+    print(f"{'tickers':>8s} {'update':>10s} {'rebuild':>10s}")
+    for size in SIZES:
+        aggregates, store, update = simulate(size)
+        fresh = Aggregates()
+        start = time.perf_counter()
+        fresh.on_publish(store.current, None)
+        rebuild = time.perf_counter() - start
+        same = aggregates.sectors(10) == fresh.sectors(10) and aggregates.index(10) == fresh.index(10)
+        ok &= same
+        print(f"{size:8d} {update * 1e6:8.0f}us {rebuild * 1e6:8.0f}us {'' if same else 'MISMATCH'}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
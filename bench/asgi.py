@@ -0,0 +1,47 @@
+"""
+Minimal in-process ASGI client - drives the FastAPI app on the current
+event loop without a server or extra dependencies
+"""
+
+import json
+from typing import Dict, Optional, Tuple
+
+
+async def request(app, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                  body: bytes = b"") -> Tuple[int, Dict[str, str], bytes]:
+    """Send one HTTP request to an ASGI app - returns (status, headers, body)"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    sent = False
+    status = 0
+    response_headers = {}
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update({k.decode(): v.decode() for k, v in message.get("headers", [])})
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, response_headers, b"".join(chunks)
+
+
+async def get_json(app, path: str):
+    status, _, body = await request(app, "GET", path)
+    return status, json.loads(body) if body else None
@@ -0,0 +1,68 @@
+"""
+Server-side constellation layout - cold vs warm-started layouts per size.
+
+Checks the graph against the frontend's rules (one hub per sector, at most
+HUB_LINKS star links, no overlapping nodes after settling), then times a
+cold layout and a warm start after a 1% price move for each universe size.
+
+    python -m bench.graph_layout
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from market.constituents import load_snapshot
+from market.graph import HUB_LINKS, LayoutCache, build_graph
+from market.synthetic import companies_universe, synthetic_universe
+
+SIZES = (2000, 5000)
+
+
+def overlaps(graph, pos) -> int:
+    """Node pairs whose squares overlap by more than 10% of their radii"""
+    i, j = np.triu_indices(len(graph), 1)
+    distance = np.hypot(*(pos[i] - pos[j]).T)
+    return int((distance < (graph.size[i] + graph.size[j] + 2) * 0.9).sum())
+
+
+def check(columns) -> bool:
+    graph = build_graph(columns)
+    hubs = np.unique(graph.source[graph.opacity == 0.35])
+    star = np.bincount(graph.source[graph.opacity == 0.35])
+    ok = len(hubs) == len(columns.sectors) and star.max() <= HUB_LINKS
+    ok &= bool(np.all(columns.sector_codes[graph.source] == columns.sector_codes[graph.target]))
+    _, pos, _ = LayoutCache().layout(columns, 1, None)
+    crowded = overlaps(graph, pos)
+    print(f"{len(graph)} nodes, {len(graph.source)} links, {len(hubs)} hubs, {crowded} overlapping pairs")
+    return ok and crowded == 0
+
+
+def measure(label: str, columns) -> None:
+    layouts = LayoutCache()
+    start = time.perf_counter()
+    layouts.layout(columns, 1, None)
+    cold = (time.perf_counter() - start) * 1000
+
+    moved = columns.with_prices(columns.market_cap * 1.01, columns.price * 1.01,
+                                columns.change_percent + 1, columns.weight)
+    start = time.perf_counter()
+    _, _, warm_started = layouts.layout(moved, 2, None)
+    warm = (time.perf_counter() - start) * 1000
+    assert warm_started
+    print(f"{label:>12s} {len(columns):7d} {cold:9.0f}ms {warm:9.0f}ms")
+
+
+def run() -> bool:
+    sp500 = companies_universe(load_snapshot()["stocks"])
+    ok = check(sp500)
+    print(f"{'universe':>12s} {'nodes':>7s} {'cold':>11s} {'warm':>11s}")
+    measure("sp500", sp500)
+    for size in SIZES:
+        measure("synthetic", synthetic_universe(size))
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
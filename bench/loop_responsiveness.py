@@ -0,0 +1,79 @@
+"""
+Event-loop responsiveness check - /api/stocks and /api/health must stay
+fast while upstream (yfinance) calls hang.
+
+Stubs the live quote fetch with a call that blocks for HANG_SECONDS, fires
+a burst of /api/stock/{ticker} requests at it and measures in-memory
+endpoint latency meanwhile. Exits non-zero when the loop is stalled.
+
+    python -m bench.loop_responsiveness
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import main
+from bench.asgi import request
+
+HANG_SECONDS = 2.0
+HANGING_REQUESTS = 20
+PROBES = 100
+MAX_P99_MS = 250.0  # A blocked loop shows up as ~HANG_SECONDS, not tens of ms
+
+
+def hanging_quote(ticker):
+    time.sleep(HANG_SECONDS)
+    return None
+
+
+async def probe_while(path: str, pending):
+    """Hit path repeatedly while any of the pending upstream requests hang"""
+    latencies = []
+    while len(latencies) < PROBES and any(not t.done() for t in pending):
+        start = time.perf_counter()
+        status, _, _ = await request(main.app, "GET", path)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert status == 200, f"{path} returned {status}"
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run() -> bool:
+    main.UNIVERSE.publish(main.generate_stock_data(main.get_fallback_companies()), source="bench")
+    main.fetch_live_quote = hanging_quote
+    main.UPSTREAM = main.UpstreamExecutor(max_workers=4, timeout=HANG_SECONDS * 2)
+
+    hanging = [
+        asyncio.create_task(request(main.app, "GET", f"/api/stock/HANG{i}"))
+        for i in range(HANGING_REQUESTS)
+    ]
+    await asyncio.sleep(0.05)  # Let the hanging calls reach the executor
+
+    health = await probe_while("/api/health", hanging)
+    stocks = await probe_while("/api/stocks", hanging)
+    await asyncio.gather(*hanging)
+
+    ok = True
+    for name, latencies in (("/api/stocks", stocks), ("/api/health", health)):
+        if not latencies:
+            print(f"{name:14s} no probes completed while upstream was hanging [STALLED]")
+            ok = False
+            continue
+        p50 = statistics.median(latencies)
+        p99 = percentile(latencies, 99)
+        status = "OK" if p99 < MAX_P99_MS else "STALLED"
+        ok &= p99 < MAX_P99_MS
+        print(f"{name:14s} n={len(latencies):4d} p50={p50:7.2f}ms p99={p99:7.2f}ms [{status}]")
+    print(f"upstream: {main.UPSTREAM.stats()}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,122 @@
+"""
+Metrics - /api/metrics must be valid Prometheus text format and cheap
+enough to leave on.
+
+Parses the exposition (histogram buckets cumulative, _count equal to the
++Inf bucket), times the middleware against a bare ASGI app, times a scrape,
+checks that a blocked event loop shows up as lag and that a profiled
+request returns its stacks.
+
+    python -m bench.metrics
+"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+
+os.environ["MARKET_PROVIDER"] = "stub"
+os.environ["PRICE_REFRESH_INTERVAL"] = "0"
+os.environ["PROFILE_REQUESTS"] = "1"
+os.environ["LOOP_LAG_INTERVAL"] = "0.05"
+os.environ.setdefault("UNIVERSE_SIZE", "500")
+os.environ.setdefault("SNAPSHOT_FILE", os.path.join(tempfile.mkdtemp(), "sp500_snapshot.bin"))
+
+import main
+from bench.asgi import request
+from market.metrics import Histogram, MetricsMiddleware
+
+REQUESTS = 5000
+MAX_OVERHEAD_US = 50.0   # per request, middleware vs bare app
+MAX_SCRAPE_MS = 10.0
+BLOCK = 0.2              # seconds the loop is blocked for the lag check
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? (\S+)$')
+
+
+def check_exposition(text: str) -> bool:
+    """Every line a comment or a well-formed sample, histograms consistent"""
+    buckets = {}
+    counts = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        if match is None:
+            print(f"malformed line: {line!r}")
+            return False
+        float(match.group(5).replace("+Inf", "inf"))
+        name, value = line.rsplit(" ", 1)
+        if "_bucket{" in name:
+            series = re.sub(r',?le="[^"]*"', "", name).replace("_bucket", "").replace("{}", "")
+            previous = buckets.get(series, [0])[-1]
+            if float(value) < previous:
+                print(f"non-cumulative buckets: {line!r}")
+                return False
+            buckets.setdefault(series, [0]).append(float(value))
+        elif "_count" in name:
+            counts[name.replace("_count", "")] = float(value)
+    consistent = all(counts.get(series) == values[-1] for series, values in buckets.items())
+    print(f"exposition: {len(text.splitlines())} lines, {len(buckets)} histogram series, consistent {consistent}")
+    return consistent and bool(buckets)
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def time_requests(app) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await request(app, "GET", "/api/health")
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+
+async def check_overhead() -> bool:
+    measured = MetricsMiddleware(bare_app, Histogram("latency", "", ["method", "route", "status"]),
+                                 Histogram("sizes", "", ["route"]))
+    bare = min([await time_requests(bare_app) for _ in range(3)])
+    wrapped = min([await time_requests(measured) for _ in range(3)])
+    overhead = wrapped - bare
+    print(f"middleware: {bare:.1f}us bare, {wrapped:.1f}us measured, {overhead:.1f}us overhead per request")
+    return overhead < MAX_OVERHEAD_US
+
+
+async def run() -> bool:
+    await main.startup_event()
+    for path in ("/api/stocks", "/api/stock/AAPL", "/api/quotes?tickers=AAPL,MSFT", "/api/sectors", "/missing"):
+        for _ in range(20):
+            await request(main.app, "GET", path)
+
+    time.sleep(BLOCK)  # Block the loop - the lag monitor must notice
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    status, headers, body = await request(main.app, "GET", "/api/metrics")
+    scrape = (time.perf_counter() - start) * 1000
+    text = body.decode()
+    print(f"scrape: {len(body)} bytes in {scrape:.2f}ms, {headers['content-type']}")
+    ok = status == 200 and scrape < MAX_SCRAPE_MS and check_exposition(text)
+    ok &= 'route="/api/stock/{ticker}"' in text and 'route="unmatched"' in text
+
+    print(f"event loop lag max {main.LOOP_LAG.max * 1000:.0f}ms after blocking {BLOCK * 1000:.0f}ms")
+    ok &= main.LOOP_LAG.max >= BLOCK * 0.75
+
+    _, headers, _ = await request(main.app, "GET", "/api/graph", headers={"X-Profile": "1"})
+    profile_id = headers.get("x-profile-id", "")
+    status, headers, body = await request(main.app, "GET", f"/api/metrics/profile/{profile_id}")
+    print(f"profile {profile_id}: {headers.get('x-profile-samples')} samples, "
+          f"{len(body.splitlines())} distinct stacks, layout seen {b'simulate' in body}")
+    ok &= status == 200 and b"simulate" in body
+    missing, _, _ = await request(main.app, "GET", "/api/metrics/profile/unknown")
+    ok &= missing == 404
+    await main.shutdown_event()
+
+    return await check_overhead() and ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,82 @@
+"""
+Market data providers - the offline data path, rate limiting and circuit
+breaking, without the network.
+
+Checks that the stub provider is deterministic, that an outage opens the
+circuit after FAILURES calls and later fails fast (no retry storm), that a
+half-open probe closes it again, and that the token bucket holds calls to
+its rate. Then times a full-universe quote fetch through the stub.
+
+    python -m bench.providers
+"""
+
+import sys
+import time
+
+from market.constituents import load_snapshot
+from market.providers import FAILURES, CircuitOpen, ProviderError, StubProvider, TokenBucket
+
+CALLS = 200
+
+
+def check_determinism(tickers) -> bool:
+    a, b = StubProvider(seed=7), StubProvider(seed=7)
+    first, second = a.quotes(tickers), b.quotes(tickers)
+    other = StubProvider(seed=8).quotes(tickers)
+    ok = first == second and first != other and a.quotes(tickers) != first
+    print(f"deterministic quotes: {ok} ({len(first)} tickers)")
+    return ok
+
+
+def check_breaker() -> bool:
+    stub = StubProvider(reset_after=0.2)
+    stub.down = True
+    reached = 0
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        try:
+            stub.quote("AAPL")
+        except CircuitOpen:
+            pass
+        except ProviderError:
+            reached += 1
+    fail_fast = (time.perf_counter() - start) / CALLS * 1e6
+    state = stub.upstream.breaker.state
+    print(f"outage: {reached}/{CALLS} calls reached upstream, circuit {state}, {fail_fast:.1f}us per call")
+    ok = reached == FAILURES and state == "open"
+
+    stub.down = False
+    time.sleep(0.25)
+    recovered = stub.quote("AAPL") is not None and stub.upstream.breaker.state == "closed"
+    print(f"half-open probe closed the circuit: {recovered}")
+    return ok and recovered
+
+
+def check_bucket() -> bool:
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.perf_counter()
+    granted = sum(bucket.acquire(max_wait=1.0) for _ in range(30))
+    elapsed = time.perf_counter() - start
+    expected = (30 - 5) / 50
+    print(f"token bucket: {granted} calls in {elapsed:.2f}s (expected ~{expected:.2f}s)")
+    return granted == 30 and expected * 0.9 <= elapsed <= expected + 0.2
+
+
+def run() -> bool:
+    snapshot = load_snapshot() or {"stocks": []}
+    tickers = [s["ticker"] for s in snapshot["stocks"]] or ["AAPL", "MSFT", "NVDA"]
+    ok = check_determinism(tickers)
+    ok &= check_breaker()
+    ok &= check_bucket()
+
+    stub = StubProvider()
+    companies = stub.companies()
+    start = time.perf_counter()
+    quotes = stub.quotes(tickers)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"stub: {len(companies)} companies, {len(quotes)} quotes in {elapsed:.1f}ms")
+    return ok and len(quotes) == len(tickers)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
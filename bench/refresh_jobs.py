@@ -0,0 +1,64 @@
+"""
+Background refresh jobs - POST /api/refresh must answer at once, collapse
+concurrent requests onto one rebuild and keep serving the old universe
+until the new one is swapped in and persisted.
+
+Runs against the stub provider with an artificial upstream latency, fires
+a burst of refreshes and probes /api/stocks while the rebuild runs.
+
+    python -m bench.refresh_jobs
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ["MARKET_PROVIDER"] = "stub"
+os.environ["PRICE_REFRESH_INTERVAL"] = "0"
+os.environ.setdefault("SNAPSHOT_FILE", os.path.join(tempfile.mkdtemp(), "sp500_snapshot.bin"))
+
+import orjson
+
+import main
+from bench.asgi import request
+
+LATENCY = 1.0      # seconds per stub upstream call
+REFRESHES = 50
+MAX_ACCEPT_MS = 50.0
+
+
+async def run() -> bool:
+    await main.startup_event()
+    version = main.UNIVERSE.current.version
+    main.PROVIDER.latency = LATENCY
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(request(main.app, "POST", "/api/refresh") for _ in range(REFRESHES)))
+    accepted = (time.perf_counter() - start) * 1000
+    jobs = {orjson.loads(body)["job"]["id"] for _, _, body in responses}
+    job_id = jobs.pop()
+
+    probes = []
+    while main.JOBS.get(job_id).state != "done":
+        probe = time.perf_counter()
+        status, _, body = await request(main.app, "GET", "/api/stocks")
+        probes.append((time.perf_counter() - probe) * 1000)
+        assert status == 200 and orjson.loads(body)["count"]
+        await asyncio.sleep(0.02)
+
+    _, _, body = await request(main.app, "GET", f"/api/refresh/{job_id}")
+    job = orjson.loads(body)["job"]
+    persisted = os.path.getmtime(main.SNAPSHOT_FILE) >= job["started_at"]
+    await main.shutdown_event()
+
+    print(f"{REFRESHES} refreshes accepted in {accepted:.1f}ms -> {len(jobs) + 1} job, joined {job['joined']}")
+    print(f"rebuild {job['duration']:.2f}s, version {version} -> {job['result']['version']}, persisted {persisted}")
+    print(f"/api/stocks during the rebuild: {len(probes)} probes, max {max(probes):.1f}ms")
+    return (not jobs and job["joined"] == REFRESHES - 1 and accepted < MAX_ACCEPT_MS
+            and job["result"]["version"] == version + 1 and persisted and max(probes) < MAX_ACCEPT_MS)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,104 @@
+"""
+Serverless cold start - import time, first request and warm request latency
+of every api/*.py function, each measured in a fresh interpreter the way a
+new container would load it.
+
+    python -m bench.serverless_cold_start
+    python -m bench.serverless_cold_start stocks health
+
+Exits non-zero when /api/stocks needs longer than MAX_STOCKS_COLD_MS for
+import + first request (it must be served from the shipped snapshot).
+"""
+
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import HTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+
+# function -> request path (the query string is what Vercel would pass on)
+ROUTES = {
+    "health": "/api/health",
+    "stocks": "/api/stocks",
+    "stock": "/api/stock?ticker=AAPL",
+    "quotes": "/api/quotes?tickers=AAPL,MSFT,NVDA",
+}
+WARM_REQUESTS = 50
+REQUEST_TIMEOUT = 30
+MAX_STOCKS_COLD_MS = 1000.0
+
+
+def child(name: str) -> None:
+    """Runs in a fresh interpreter - prints one JSON line of timings"""
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(f"api_{name}", os.path.join(API_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - start) * 1000
+
+    server = HTTPServer(("127.0.0.1", 0), module.handler)
+    server.RequestHandlerClass.log_message = lambda *args: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}{ROUTES[name]}"
+
+    def timed_get() -> float:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            e.read()  # 4xx/5xx still count - we time the function, not upstream
+        return (time.perf_counter() - start) * 1000
+
+    first_ms = timed_get()
+    warm = [timed_get() for _ in range(WARM_REQUESTS)]
+    server.shutdown()
+    print(json.dumps({
+        "import_ms": import_ms,
+        "first_ms": first_ms,
+        "warm_p50_ms": statistics.median(warm),
+        "warm_max_ms": max(warm),
+        "modules": len(sys.modules),
+    }))
+
+
+def measure(name: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.serverless_cold_start", "--child", name],
+        cwd=ROOT, capture_output=True, text=True, timeout=REQUEST_TIMEOUT * (WARM_REQUESTS + 2)
+    )
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if out.returncode != 0 or not lines:
+        raise RuntimeError(f"{name} failed:\n{out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def run(names) -> bool:
+    ok = True
+    print(f"{'function':10s} {'import':>10s} {'1st req':>10s} {'warm p50':>10s} {'warm max':>10s} {'modules':>8s}")
+    for name in names:
+        r = measure(name)
+        print(f"{name:10s} {r['import_ms']:8.1f}ms {r['first_ms']:8.1f}ms "
+              f"{r['warm_p50_ms']:8.2f}ms {r['warm_max_ms']:8.2f}ms {r['modules']:8d}")
+        if name == "stocks":
+            cold = r["import_ms"] + r["first_ms"]
+            if cold > MAX_STOCKS_COLD_MS:
+                print(f"/api/stocks cold start {cold:.0f}ms > {MAX_STOCKS_COLD_MS:.0f}ms [SLOW]")
+                ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2])
+        sys.exit(0)
+    names = sys.argv[1:] or list(ROUTES)
+    sys.exit(0 if run(names) else 1)
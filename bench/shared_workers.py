@@ -0,0 +1,178 @@
+"""
+Multi-worker mode - `uvicorn main:app --workers N` with SHARED_DIR set must
+behave like one server: one leader, the same version and bytes from every
+worker, live quotes fetched once for all workers, refreshes requested on
+any worker, and a follower taking over when the leader dies.
+
+Starts real uvicorn servers on the stub provider, one with SHARED_DIR and
+one without for the quote comparison, and talks to them over HTTP.
+
+    python -m bench.shared_workers
+"""
+
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+WORKERS = 4
+POLL = 0.1          # SHARED_POLL for the run
+REFRESHES = 4
+TICKERS = 50        # Distinct tickers asked for, each once per worker
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    def __init__(self, shared: bool):
+        self.tmp = tempfile.mkdtemp(prefix="sp500-workers-")
+        self.port = free_port()
+        env = {
+            **os.environ, "MARKET_PROVIDER": "stub", "PRICE_REFRESH_INTERVAL": "0", "UNIVERSE_SIZE": "2000",
+            "SNAPSHOT_FILE": os.path.join(self.tmp, "sp500_snapshot.bin"),
+            "HISTORY_DIR": os.path.join(self.tmp, "history"), "SHARED_POLL": str(POLL),
+        }
+        env.pop("SHARED_DIR", None)
+        if shared:
+            env["SHARED_DIR"] = os.path.join(self.tmp, "shared")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(WORKERS),
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def request(self, method: str, path: str) -> Tuple[int, Dict[str, str], bytes]:
+        """One request on a fresh connection - the kernel spreads them over the workers"""
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            conn.request(method, path)
+            response = conn.getresponse()
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, response.read()
+        finally:
+            conn.close()
+
+    def get_json(self, path: str, method: str = "GET") -> Dict:
+        return json.loads(self.request(method, path)[2])
+
+    def wait_ready(self, timeout: float = 60) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if self.get_json("/api/health")["stocks"]:
+                    return True
+            except (OSError, ValueError, http.client.HTTPException):
+                pass
+            time.sleep(0.2)
+        return False
+
+    def workers(self, requests: int = 200) -> Dict[int, Dict]:
+        """Latest /api/cache/stats "shared" block per worker pid"""
+        seen = {}
+        for _ in range(requests):
+            shared = self.get_json("/api/cache/stats")["shared"]
+            seen[shared["pid"]] = shared
+        return seen
+
+    def stop(self):
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        subprocess.run(["rm", "-rf", self.tmp])
+
+
+def converged(server: Server, timeout: float = 5) -> Optional[int]:
+    """The one version every worker serves, once they agree"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        versions = {w["pid"]: w for w in server.workers(60).values()}
+        local = {server.get_json("/api/health")["version"] for _ in range(40)}
+        if len(local) == 1 and len({w["version"] for w in versions.values()}) == 1:
+            return local.pop()
+        time.sleep(POLL)
+    return None
+
+
+def quote_sources(server: Server, tickers: List[str]) -> Counter:
+    sources = Counter()
+    for _ in range(WORKERS):
+        for ticker in tickers:
+            sources[server.get_json(f"/api/stock/{ticker}")["source"]] += 1
+    return sources
+
+
+def run() -> bool:
+    server = Server(shared=True)
+    ok = True
+    try:
+        if not server.wait_ready():
+            print("shared server did not start")
+            return False
+        workers = server.workers()
+        leaders = [pid for pid, w in workers.items() if w["leader"]]
+        print(f"{len(workers)} workers seen, leaders {leaders}")
+        ok &= len(leaders) == 1 and len(workers) >= 2
+
+        start = time.perf_counter()
+        results = [server.get_json("/api/refresh?wait=true", method="POST") for _ in range(REFRESHES)]
+        elapsed = (time.perf_counter() - start) * 1000
+        versions = [r.get("version") for r in results]
+        version = converged(server)
+        print(f"{REFRESHES} refreshes through any worker in {elapsed:.0f}ms -> versions {versions}, "
+              f"all workers on {version}")
+        ok &= all(r["success"] for r in results) and version == max(versions) and versions == sorted(versions)
+
+        etags = {server.request("GET", "/api/stocks")[1]["etag"] for _ in range(40)}
+        print(f"/api/stocks ETags across workers: {len(etags)}")
+        ok &= len(etags) == 1
+
+        snapshot = server.get_json("/api/stocks?format=columnar")
+        tickers = snapshot["columns"]["ticker"][-TICKERS:]
+        shared = quote_sources(server, tickers)
+        print(f"shared quotes: {dict(shared)} for {TICKERS} tickers x {WORKERS} requests")
+        ok &= shared["live"] == TICKERS
+
+        leader = leaders[0]
+        os.kill(leader, signal.SIGKILL)
+        start = time.perf_counter()
+        new_leaders = []
+        while time.perf_counter() - start < 5 and not new_leaders:
+            time.sleep(POLL)
+            new_leaders = [pid for pid, w in server.workers(40).items() if w["leader"] and pid != leader]
+        takeover = (time.perf_counter() - start) * 1000
+        result = server.get_json("/api/refresh?wait=true", method="POST")
+        print(f"leader {leader} killed -> {new_leaders} took over in ~{takeover:.0f}ms, "
+              f"refresh afterwards: version {result.get('version')}")
+        ok &= len(new_leaders) == 1 and result["success"] and result["version"] == version + 1
+    finally:
+        server.stop()
+
+    server = Server(shared=False)
+    try:
+        if not server.wait_ready():
+            print("per-worker server did not start")
+            return False
+        snapshot = server.get_json("/api/stocks?format=columnar")
+        alone = quote_sources(server, snapshot["columns"]["ticker"][-TICKERS:])
+        print(f"per-worker quotes: {dict(alone)} for the same requests")
+        ok &= alone["live"] > shared["live"]
+    finally:
+        server.stop()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,342 @@
+"""
+Benchmark suite with regression gates - startup time, p50/p99 latency,
+throughput and peak RSS of the FastAPI app and the api/*.py functions,
+offline against the stub market data provider.
+
+Every scenario runs in a fresh interpreter (so startup and RSS are its
+own): the app at each universe size is driven in-process through
+bench.asgi, the serverless functions over real HTTP on localhost. Results
+are compared with a JSON baseline; a metric worse than the baseline by
+more than --threshold (and by more than a small absolute slack, so
+sub-millisecond jitter never fails a run) fails the suite.
+
+    python -m bench.suite                          # run and gate against bench/baseline.json
+    python -m bench.suite --update                 # record a new baseline
+    python -m bench.suite --concurrency 64 --requests 5000 --sizes 500,10000,50000
+    python -m bench.suite --threshold 0.2          # tighter gate on a quiet, dedicated machine
+
+The default threshold leaves room for shared-CPU noise (runs on a busy VM
+swing by +-40%). The baseline is per machine - record one with --update
+before gating on new hardware.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+
+SIZES = (500, 10_000)
+CONCURRENCY = 16
+REQUESTS = 2000
+REFRESH_ROUNDS = 5
+REPEATS = 3               # Each load phase runs this often; metrics are medians
+CACHED_TICKERS = 100
+THRESHOLD = 0.5           # Fail when a metric is >50% worse than the baseline
+SLACK = {"ms": 5.0, "mb": 16.0, "rps": 0.0}  # ...and worse by more than this
+WORKER_TIMEOUT = 600
+
+# api/*.py function -> request path
+SERVERLESS_ROUTES = {
+    "stocks": "/api/stocks",
+    "stock": "/api/stock?ticker=AAPL",
+    "quotes": "/api/quotes?tickers=AAPL,MSFT,NVDA",
+}
+
+
+def summarize(latencies: List[float], wall: float, errors: int = 0) -> Dict[str, float]:
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    return {
+        "p50_ms": round(pct(50), 3),
+        "p99_ms": round(pct(99), 3),
+        "throughput_rps": round(len(ordered) / wall, 1),
+        "errors": errors,
+    }
+
+
+def median_of(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# --- workers (fresh interpreter each) ---------------------------------------
+
+def asgi_worker(size: int, concurrency: int, requests: int, repeats: int) -> Dict:
+    """Startup and load of main.app with a universe of `size` tickers"""
+    tmp = tempfile.mkdtemp(prefix="bench-suite-")
+    os.environ.update({
+        "MARKET_PROVIDER": "stub",
+        "PRICE_REFRESH_INTERVAL": "0",
+        "SNAPSHOT_FILE": os.path.join(tmp, "sp500_snapshot.bin"),
+        "HISTORY_DIR": os.path.join(tmp, "history"),
+        # 500 = the shipped constituents through the stub, else synthetic
+        "UNIVERSE_SIZE": "0" if size == 500 else str(size),
+    })
+    os.chdir(tmp)  # Legacy sp500_full_cache.json lookups stay out of the repo
+
+    start = time.perf_counter()
+    import main
+    from bench.asgi import request
+    import_ms = (time.perf_counter() - start) * 1000
+
+    async def load(method: str, path: Callable[[int], str], count: int) -> Dict:
+        latencies, errors = [], 0
+        jobs = iter(range(count))
+
+        async def client():
+            nonlocal errors
+            for i in jobs:
+                t = time.perf_counter()
+                status, _, _ = await request(main.app, method, path(i))
+                latencies.append((time.perf_counter() - t) * 1000)
+                errors += status >= 500
+        t = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - t, errors)
+
+    async def refresh() -> Dict:
+        """Bursts of `concurrency` POSTs - all but one join the running job"""
+        latencies, durations, errors = [], [], 0
+        t = time.perf_counter()
+        for _ in range(REFRESH_ROUNDS):
+            async def post():
+                nonlocal errors
+                s = time.perf_counter()
+                status, headers, _ = await request(main.app, "POST", "/api/refresh")
+                latencies.append((time.perf_counter() - s) * 1000)
+                errors += status != 202
+                return headers.get("location", "").rpartition("/")[2]
+            ids = set(await asyncio.gather(*(post() for _ in range(concurrency))))
+            job = await main.JOBS.wait(main.JOBS.get(ids.pop()))
+            errors += len(ids) + (job.state != "done")
+            durations.append(job.to_dict()["duration"] * 1000)
+        accept = summarize(latencies, time.perf_counter() - t, errors)
+        del accept["throughput_rps"]  # Bound by the rebuilds waited for, not by the endpoint
+        return {**accept, "rebuild_ms": round(sorted(durations)[len(durations) // 2], 1)}
+
+    async def repeated(phase: Callable[[], Awaitable[Dict]]) -> Dict:
+        return median_of([await phase() for _ in range(repeats)])
+
+    async def stock_live() -> Dict:
+        """Distinct tickers with an empty quote cache - the provider path"""
+        main.QUOTE_CACHE.clear()
+        count = min(requests, len(tickers))
+        return await load("GET", lambda i: f"/api/stock/{tickers[i]}", count)
+
+    async def scenario() -> Dict:
+        nonlocal tickers
+        t = time.perf_counter()
+        await main.startup_event()
+        startup_ms = (time.perf_counter() - t) * 1000
+        tickers = list(main.UNIVERSE.current.columns.tickers)
+        for path in ("/api/stocks", f"/api/stock/{tickers[-1]}"):
+            await request(main.app, "GET", path)  # Warm-up - first-call imports aren't the steady state
+        results = {
+            "import_ms": round(import_ms, 1),
+            "startup_ms": round(startup_ms, 1),
+            "stocks": await repeated(lambda: load("GET", lambda i: "/api/stocks", requests)),
+            "stock_live": await repeated(stock_live),
+            "stock_cached": await repeated(
+                lambda: load("GET", lambda i: f"/api/stock/{tickers[i % CACHED_TICKERS]}", requests)),
+            "refresh": await repeated(refresh),
+        }
+        await main.shutdown_event()
+        return results
+
+    tickers: List[str] = []
+    results = asyncio.run(scenario())
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 turns bursts into 1s SYN retries
+
+
+def serverless_worker(concurrency: int, requests: int, repeats: int) -> Dict:
+    """Each api/*.py function behind a threaded HTTP server on localhost"""
+    os.environ["MARKET_PROVIDER"] = "stub"
+    results = {}
+    for name, route in SERVERLESS_ROUTES.items():
+        spec = importlib.util.spec_from_file_location(f"api_{name}", os.path.join(ROOT, "api", f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.handler.log_message = lambda *args: None
+        server = Server(("127.0.0.1", 0), module.handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}{route}"
+
+        results[name] = median_of([http_load(url, concurrency, requests) for _ in range(repeats)])
+        server.shutdown()
+        server.server_close()
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def http_load(url: str, concurrency: int, requests: int) -> Dict:
+    """`requests` GETs of url from `concurrency` client threads"""
+    latencies, errors = [], []
+    jobs = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                if next(jobs, None) is None:
+                    return
+            t = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as resp:
+                    resp.read()
+            except (urllib.error.URLError, OSError):
+                errors.append(1)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+    t = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - t, len(errors))
+
+
+def spawn(*args: str) -> Dict:
+    out = subprocess.run([sys.executable, "-m", "bench.suite", "--worker", *args],
+                         cwd=ROOT, capture_output=True, text=True, timeout=WORKER_TIMEOUT,
+                         env={**os.environ, "PYTHONPATH": ROOT})
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if out.returncode != 0 or not lines:
+        raise RuntimeError(f"worker {' '.join(args)} failed:\n{out.stderr[-3000:]}")
+    return json.loads(lines[-1])
+
+
+# --- baseline and gates -----------------------------------------------------
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        else:
+            flat[name] = value
+    return flat
+
+
+def unit(metric: str) -> Optional[str]:
+    """ms / mb (lower is better), rps (higher is better) or None (not gated)"""
+    for suffix, kind in (("_ms", "ms"), ("_mb", "mb"), ("_rps", "rps")):
+        if metric.endswith(suffix):
+            return kind
+    return None
+
+
+def regressions(current: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[Tuple]:
+    """(metric, baseline, current, change) for every gated metric that got worse"""
+    worse = []
+    for metric, value in current.items():
+        kind, base = unit(metric), baseline.get(metric)
+        if metric.endswith(".errors") and value:
+            worse.append((metric, base or 0, value, float("inf")))
+        if kind is None or not base:
+            continue
+        change = (value - base) / base
+        if kind == "rps":
+            if change < -threshold:
+                worse.append((metric, base, value, change))
+        elif change > threshold and value - base > SLACK[kind]:
+            worse.append((metric, base, value, change))
+    return worse
+
+
+def report(results: Dict[str, float], baseline: Dict[str, float]) -> None:
+    print(f"{'metric':48s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for metric, value in results.items():
+        if unit(metric) is None:
+            continue
+        base = baseline.get(metric)
+        change = f"{(value - base) / base * 100:+7.1f}%" if base else "     new"
+        print(f"{metric:48s} {base if base is not None else '-':>12} {value:>12} {change}")
+
+
+def run(args) -> bool:
+    results = {}
+    for size in args.sizes:
+        key = f"asgi.{size}.c{args.concurrency}"
+        print(f"running {key} ...", flush=True)
+        results.update(flatten(spawn("asgi", str(size), str(args.concurrency), str(args.requests), str(args.repeats)), key))
+    key = f"serverless.c{args.concurrency}"
+    print(f"running {key} ...", flush=True)
+    results.update(flatten(spawn("serverless", str(args.concurrency), str(args.requests), str(args.repeats)), key))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+    report(results, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"metrics": results}, f, indent=1, sort_keys=True)
+    if args.update or not baseline:
+        merged = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "requests": args.requests, "metrics": merged}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return True
+
+    worse = regressions(results, baseline, args.threshold)
+    for metric, base, value, change in worse:
+        print(f"REGRESSION {metric}: {base} -> {value} ({change * 100:+.0f}%)")
+    if not worse:
+        print(f"No regressions beyond {args.threshold * 100:.0f}%")
+    return not worse
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--worker"]:
+        kind, *params = argv[1:]
+        worker = asgi_worker if kind == "asgi" else serverless_worker
+        print(json.dumps(worker(*map(int, params))))
+        return 0
+
+    parser = argparse.ArgumentParser(description="API benchmark suite with regression gates")
+    parser.add_argument("--sizes", type=lambda v: [int(s) for s in v.split(",")], default=list(SIZES),
+                        help="universe sizes for the app (500 = the real constituents)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="requests per endpoint")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs per load phase (median)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed relative regression")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--out", help="also write this run's results here")
+    return 0 if run(parser.parse_args(argv)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
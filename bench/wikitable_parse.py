@@ -0,0 +1,151 @@
+"""
+Constituents table parsing - stdlib streaming parser vs pandas.read_html.
+
+First checks the streaming parser against the fixture page (and against
+pandas when it is installed), then measures each implementation in a fresh
+interpreter: import time, parse time and peak RSS.
+
+    python -m bench.wikitable_parse
+
+The fixture (bench/fixtures/sp500_wikipedia.html) follows the markup of the
+Wikipedia "List of S&P 500 companies" page: constituents table first, then
+the changes table with rowspan/colspan headers, footnote <sup>s and page
+chrome around both.
+"""
+
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "bench", "fixtures", "sp500_wikipedia.html")
+EXPECTED_ROWS = 503
+RUNS = 20
+KEY_FIELDS = ("Symbol", "Security", "GICS Sector")
+
+
+def rss_kb() -> int:
+    """Peak RSS of this process. VmHWM first - ru_maxrss survives exec and
+    would report the parent's peak in a freshly spawned child."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def check() -> bool:
+    """Fixture test - row count, header and the fields we use match pandas"""
+    from market.constituents import parse_companies
+    from market.wikitable import iter_rows
+
+    with open(FIXTURE, "rb") as f:
+        html = f.read()
+
+    # Small chunks so rows and tags are split across feed() calls
+    consumed = []
+
+    def chunks(size=997):
+        for i in range(0, len(html), size):
+            consumed.append(size)
+            yield html[i:i + size]
+
+    rows = list(iter_rows(chunks()))
+    ok = len(rows) == EXPECTED_ROWS
+    print(f"stdlib rows={len(rows)} (expected {EXPECTED_ROWS}), "
+          f"read {sum(consumed) / len(html):.0%} of the page before stopping")
+    ok &= sum(consumed) < len(html)
+
+    companies = parse_companies([html])
+    ok &= companies[0] == {"ticker": "MMM", "name": "3M", "sector": "Industrials"}
+    ok &= all(c["ticker"] and c["name"] and c["sector"] for c in companies)
+    ok &= any(c["name"] == "Lowe's" for c in companies)  # Entity decoding
+
+    try:
+        import io
+        import pandas as pd
+    except ImportError:
+        print("pandas not installed - skipping cross-check")
+        return ok
+    df = pd.read_html(io.BytesIO(html))[0]
+    expected = [{k: str(row[k]) for k in KEY_FIELDS} for row in df.to_dict("records")]
+    actual = [{k: row[k] for k in KEY_FIELDS} for row in rows]
+    same = expected == actual
+    print(f"pandas cross-check: {'OK' if same else 'MISMATCH'}")
+    return ok and same
+
+
+def child(impl: str) -> None:
+    """Runs in a fresh interpreter - prints one JSON line of measurements"""
+    with open(FIXTURE, "rb") as f:
+        html = f.read()
+    base_rss = rss_kb()
+
+    start = time.perf_counter()
+    if impl == "stdlib":
+        from market.constituents import parse_companies
+        parse = lambda: parse_companies([html])
+    else:
+        import io
+        import pandas as pd
+        import lxml.etree  # read_html's parser - part of what pandas costs
+
+        def parse():
+            df = pd.read_html(io.BytesIO(html))[0]
+            return [
+                {"ticker": str(row['Symbol']).replace('.', '-'), "name": str(row['Security']),
+                 "sector": str(row['GICS Sector'])}
+                for _, row in df.iterrows()
+            ]
+    import_ms = (time.perf_counter() - start) * 1000
+
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        companies = parse()
+        times.append((time.perf_counter() - start) * 1000)
+    assert len(companies) == EXPECTED_ROWS, len(companies)
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "parse_ms": statistics.median(times),
+        "peak_rss_mb": (rss_kb() - base_rss) / 1024,
+    }))
+
+
+def measure(impl: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-m", "bench.wikitable_parse", "--child", impl],
+        cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if out.returncode != 0 or not lines:
+        raise RuntimeError(f"{impl} failed:\n{out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def run() -> bool:
+    ok = check()
+    print(f"{'parser':8s} {'import':>10s} {'parse':>10s} {'peak RSS':>10s}")
+    for impl in ("stdlib", "pandas"):
+        try:
+            r = measure(impl)
+        except RuntimeError as e:
+            print(f"{impl:8s} unavailable ({str(e).splitlines()[-1]})")
+            continue
+        print(f"{impl:8s} {r['import_ms']:8.1f}ms {r['parse_ms']:8.1f}ms {r['peak_rss_mb']:8.1f}MB")
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2])
+        sys.exit(0)
+    sys.exit(0 if run() else 1)
@@ -3,16 +3,35 @@ S&P 500 Constellation Terminal - Backend API
 500 companies with instant startup using Wikipedia data + mock prices
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
-import yfinance as yf
-import pandas as pd
-import json
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from datetime import datetime, timezone
+import asyncio
 import os
-import random
-import math
-from typing import Optional, List, Dict
+import time
+from typing import Optional, List, Dict, Tuple
+from market.aggregates import DEFAULT_MOVERS, MAX_MOVERS, Aggregates
+from market.cache import QuoteCache, SingleFlight, FRESH, STALE, NEGATIVE
+from market.columnar import BINARY_MEDIA_TYPE, ColumnarStore
+from market.correlation import DEFAULT_K, DEFAULT_WINDOW, MAX_K, MAX_WINDOW, MIN_WINDOW, CorrelationIndex
+from market.encoding import EncodedBody, EncodedCache, dumps
+from market.executor import UpstreamExecutor
+from market.graph import LayoutCache
+from market.history import DEFAULT_PERIOD, DEFAULT_POINTS, INTERVALS, MAX_POINTS, TOP_UP_PERIOD, HistoryStore, ingest
+from market.jobs import DONE, JobRegistry
+from market.metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, SIZE_BUCKETS, LoopLagMonitor,
+                            MetricsMiddleware, ProfileStore)
+from market.persist import SnapshotFileError, import_json, load_snapshot, write_snapshot
+from market.query import QueryError, StockQuery, query_payload, resolve_sector
+from market.providers import make_provider
+from market.quotes import parse_tickers
+from market.reference import REAL_PRICES
+from market.refresher import PriceRefresher, carry_prices
+from market.shared import SharedQuoteCache, SharedSegment, table_slots
+from market.snapshot import SnapshotStore
+from market.stream import Broadcaster, sse_event, delta_payload, KEEPALIVE, KEEPALIVE_SECONDS
+from market.synthetic import DEFAULT_SEED, companies_universe, estimate_caps, synthetic_universe
 
 app = FastAPI(title="S&P 500 Constellation Terminal API")
 
@@ -24,287 +43,903 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-CACHE_FILE = "sp500_full_cache.json"
-SINGLE_STOCK_CACHE = {}
-SP500_DATA = []  # Will be populated on startup
-
-def fetch_sp500_from_wikipedia() -> List[Dict]:
-    """Fetch S&P 500 list from Wikipedia with realistic market caps"""
-    # Known market caps for top companies (as of early 2026, in USD)
-    KNOWN_CAPS = {
-        "AAPL": 3_200_000_000_000, "MSFT": 3_100_000_000_000, "NVDA": 2_900_000_000_000,
-        "GOOGL": 2_100_000_000_000, "GOOG": 2_100_000_000_000, "AMZN": 2_000_000_000_000,
-        "META": 1_400_000_000_000, "TSLA": 1_100_000_000_000, "BRK-B": 900_000_000_000,
-        "AVGO": 850_000_000_000, "JPM": 700_000_000_000, "LLY": 700_000_000_000,
-        "V": 600_000_000_000, "UNH": 550_000_000_000, "XOM": 500_000_000_000,
-        "MA": 480_000_000_000, "COST": 420_000_000_000, "HD": 400_000_000_000,
-        "PG": 390_000_000_000, "JNJ": 380_000_000_000, "WMT": 370_000_000_000,
-        "NFLX": 350_000_000_000, "CRM": 320_000_000_000, "BAC": 310_000_000_000,
-        "ORCL": 300_000_000_000, "CVX": 280_000_000_000, "KO": 270_000_000_000,
-        "MRK": 260_000_000_000, "ABBV": 250_000_000_000, "PEP": 240_000_000_000,
-        "AMD": 230_000_000_000, "TMO": 220_000_000_000, "CSCO": 210_000_000_000,
-        "ACN": 200_000_000_000, "LIN": 200_000_000_000, "MCD": 195_000_000_000,
-        "ABT": 190_000_000_000, "ADBE": 185_000_000_000, "DHR": 180_000_000_000,
-        "WFC": 175_000_000_000, "TXN": 170_000_000_000, "PM": 165_000_000_000,
-        "VZ": 160_000_000_000, "NEE": 155_000_000_000, "INTC": 100_000_000_000,
-    }
-    
-    # Real stock prices (Feb 7, 2026 close prices) - used when Yahoo API is unavailable
-    REAL_PRICES = {
-        "AAPL": 227.63, "MSFT": 409.04, "NVDA": 129.84, "GOOGL": 185.34, "GOOG": 186.82,
-        "AMZN": 235.42, "META": 719.76, "TSLA": 361.62, "BRK-B": 482.79, "AVGO": 238.59,
-        "JPM": 276.00, "LLY": 821.79, "V": 344.26, "UNH": 517.08, "XOM": 105.10,
-        "MA": 553.08, "COST": 1026.61, "HD": 406.66, "PG": 169.30, "JNJ": 150.73,
-        "WMT": 102.38, "NFLX": 982.54, "CRM": 330.92, "BAC": 46.67, "ORCL": 174.59,
-        "CVX": 147.68, "KO": 62.70, "MRK": 89.91, "ABBV": 181.35, "PEP": 142.41,
-        "AMD": 112.58, "TMO": 538.84, "CSCO": 64.49, "ACN": 360.59, "LIN": 452.88,
-        "MCD": 294.50, "ABT": 124.55, "ADBE": 430.58, "DHR": 233.43, "WFC": 79.68,
-        "TXN": 192.47, "PM": 132.99, "VZ": 39.27, "NEE": 69.56, "INTC": 19.64,
-        "QCOM": 168.92, "IBM": 248.55, "GE": 199.87, "CAT": 365.92, "NOW": 1024.35,
-        "HON": 224.53, "BA": 174.88, "AMGN": 282.34, "RTX": 127.45, "GS": 635.22,
-        "BLK": 1015.67, "ISRG": 585.43, "SBUX": 102.89, "MMM": 148.23, "DIS": 111.34,
-        "NKE": 71.56, "PYPL": 87.45, "F": 9.87, "GM": 52.34, "T": 23.45,
-    }
-    
+CACHE_FILE = "sp500_full_cache.json"  # Legacy JSON cache - imported once when there is no snapshot
+SNAPSHOT_FILE = os.environ.get("SNAPSHOT_FILE", "sp500_snapshot.bin")
+SNAPSHOT_MAX_AGE = float(os.environ.get("SNAPSHOT_MAX_AGE", 24 * 3600))  # seconds, 0 = never rebuild
+QUOTE_CACHE_SIZE = int(os.environ.get("QUOTE_CACHE_SIZE", 2048))
+QUOTE_CACHE_TTL = float(os.environ.get("QUOTE_CACHE_TTL", 60))
+# Multi-worker mode (uvicorn --workers N): SHARED_DIR names a directory all
+# workers share (tmpfs, e.g. /dev/shm/sp500). The worker holding the leader
+# lock loads, refreshes and publishes the universe; the others map every
+# version from there, polling every SHARED_POLL seconds. Quotes go into one
+# table for all workers. Unset = one process, everything in memory.
+SHARED_DIR = os.environ.get("SHARED_DIR", "")
+SHARED_POLL = float(os.environ.get("SHARED_POLL", 0.2))
+SHARED = SharedSegment(SHARED_DIR, table_slots(QUOTE_CACHE_SIZE)) if SHARED_DIR else None
+SHARED_SYNC = {"task": None}  # The shared_sync() loop
+if SHARED is not None:
+    QUOTE_CACHE = SharedQuoteCache(SHARED, ttl=QUOTE_CACHE_TTL)
+else:
+    QUOTE_CACHE = QuoteCache(maxsize=QUOTE_CACHE_SIZE, ttl=QUOTE_CACHE_TTL)
+QUOTE_FLIGHT = SingleFlight()
+UNIVERSE_FLIGHT = SingleFlight()
+
+# Blocking upstream I/O runs here, never on the event loop
+UPSTREAM = UpstreamExecutor(
+    max_workers=int(os.environ.get("UPSTREAM_WORKERS", 8)),
+    timeout=float(os.environ.get("UPSTREAM_TIMEOUT", 10)),
+)
+BULK_TIMEOUT = 30       # seconds - chunked yf.download of many tickers
+UNIVERSE_TIMEOUT = 60   # seconds - Wikipedia fetch + parse
+BACKGROUND_TASKS = set()  # Strong refs so revalidation tasks aren't GC'd
+UNIVERSE_BUILT = {"at": None}  # When the constituents were fetched
+JOBS = JobRegistry()  # Background refresh jobs, polled via /api/refresh/{id}
+UNIVERSE = SnapshotStore()  # Versioned stock list, populated on startup
+STREAM = Broadcaster()      # SSE subscribers of /api/stream
+ENCODED = EncodedCache()    # Pre-encoded bodies per (route, snapshot version)
+QUERY_ENCODED = EncodedCache(maxsize=256)  # Filtered /api/stocks slices per (query, version)
+# 0 = the real S&P 500 constituents, N = a seeded synthetic universe of N
+# tickers (load testing - combine with PRICE_REFRESH_INTERVAL=0)
+UNIVERSE_SIZE = int(os.environ.get("UNIVERSE_SIZE", 0))
+UNIVERSE_SEED = int(os.environ.get("UNIVERSE_SEED", DEFAULT_SEED))
+FALLBACK_SIZE = 500
+
+def universe_price(ticker: str) -> Optional[float]:
+    """Reference price for the stub provider - the published price, if any"""
+    stock = UNIVERSE.current.get(ticker)
+    return stock["price"] if stock else None
+
+def provider_options(name: str) -> Dict:
+    return {"price_of": universe_price, "seed": UNIVERSE_SEED} if name == "stub" else {}
+
+# Every upstream call goes through a provider: pooled session, rate limit,
+# circuit breaker. "stub" = deterministic offline data, no network at all.
+MARKET_PROVIDER = os.environ.get("MARKET_PROVIDER", "yahoo")
+PROVIDER = make_provider(MARKET_PROVIDER, **provider_options(MARKET_PROVIDER))
+# Daily bars may come from elsewhere, e.g. HISTORY_SOURCE=stub with live quotes
+HISTORY_SOURCE = os.environ.get("HISTORY_SOURCE", MARKET_PROVIDER)
+HISTORY_PROVIDER = PROVIDER if HISTORY_SOURCE == MARKET_PROVIDER else make_provider(
+    HISTORY_SOURCE, **provider_options(HISTORY_SOURCE))
+HISTORY = HistoryStore(os.environ.get("HISTORY_DIR", "history"))  # <TICKER>.npy daily bars
+HISTORY_FLIGHT = SingleFlight()
+HISTORY_ENCODED = EncodedCache(maxsize=256)  # Encoded /api/history responses per query + file version
+AGGREGATES = Aggregates()  # Sector/index sums, updated from every publish
+# Every movers value of /api/sectors and /api/index for one version - kept
+# apart so client-chosen movers cannot evict the /api/stocks bodies
+AGGREGATES_ENCODED = EncodedCache(maxsize=2 * (MAX_MOVERS + 1))
+CORRELATIONS = CorrelationIndex(HISTORY)  # Rolling return correlations per window
+CORRELATION_FLIGHT = SingleFlight()
+# When the universe's history was last found complete and current - rescanned
+# for new tickers and bars that fell behind every HISTORY_CHECK_EVERY seconds
+HISTORY_CHECKED = {"tickers": None, "at": 0.0}
+HISTORY_CHECK_EVERY = 300
+CORRELATION_ENCODED = EncodedCache(maxsize=64)  # Encoded /api/correlations per (window, k, engine version)
+GRAPH_LAYOUTS = LayoutCache()  # Last layout per sector - warm start for the next version
+GRAPH_FLIGHT = SingleFlight()
+GRAPH_ENCODED = EncodedCache(maxsize=32)  # Encoded /api/graph responses per (sector, version)
+STOCK_FORMATS = {"json": "application/json", "columnar": "application/json", "binary": BINARY_MEDIA_TYPE}
+
+def fetch_sp500_from_wikipedia(allow_fallback: bool = True) -> List[Dict]:
+    """Fetch S&P 500 list from Wikipedia with realistic market caps.
+    Without allow_fallback a failed fetch raises instead of returning the
+    fallback list."""
     try:
-        import urllib.request
-        url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-        headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'}
-        request = urllib.request.Request(url, headers=headers)
+        # Streamed through the stdlib table parser - no pandas.read_html
+        listed = PROVIDER.companies(timeout=10)
         
-        with urllib.request.urlopen(request, timeout=10) as response:
-            html = response.read()
+        # Known caps as is, the rest estimated - seeded, same caps on every restart
+        companies = estimate_caps(listed, UNIVERSE_SEED)
         
-        tables = pd.read_html(html)
-        df = tables[0]
-        
-        companies = []
-        remaining_cap = 62_000_000_000_000 - sum(KNOWN_CAPS.values())  # ~$62T total target
-        unknown_count = len(df) - len([t for t in KNOWN_CAPS if KNOWN_CAPS[t] > 0])
-        avg_remaining = remaining_cap / max(unknown_count, 1)
-        
-        for idx, row in df.iterrows():
-            ticker = str(row['Symbol']).replace('.', '-')
-            name = str(row['Security'])
-            sector = str(row['GICS Sector'])
-            
-            if ticker in KNOWN_CAPS:
-                market_cap = KNOWN_CAPS[ticker]
-            else:
-                # Random distribution around average, with variance
-                base = avg_remaining * random.uniform(0.3, 1.7)
-                market_cap = int(max(5_000_000_000, min(150_000_000_000, base)))
-            
-            companies.append({
-                "ticker": ticker,
-                "name": name,
-                "sector": sector,
-                "market_cap": market_cap
-            })
-        
-        print(f"Loaded {len(companies)} companies from Wikipedia")
+        print(f"Loaded {len(companies)} companies from {PROVIDER.companies_source}")
         return companies
         
     except Exception as e:
         print(f"Wikipedia fetch failed: {e}")
+        if not allow_fallback:
+            raise
         return get_fallback_companies()
 
 def get_fallback_companies() -> List[Dict]:
-    """Fallback list of top S&P 500 companies"""
-    sectors = [
-        "Information Technology", "Health Care", "Financials", "Consumer Discretionary",
-        "Communication Services", "Industrials", "Consumer Staples", "Energy",
-        "Utilities", "Real Estate", "Materials"
-    ]
-    
-    top_tickers = [
-        ("AAPL", "Apple Inc.", "Information Technology", 3000),
-        ("MSFT", "Microsoft", "Information Technology", 2800),
-        ("GOOGL", "Alphabet", "Communication Services", 1700),
-        ("AMZN", "Amazon", "Consumer Discretionary", 1600),
-        ("NVDA", "NVIDIA", "Information Technology", 1500),
-        ("META", "Meta Platforms", "Communication Services", 900),
-        ("TSLA", "Tesla", "Consumer Discretionary", 750),
-        ("BRK-B", "Berkshire Hathaway", "Financials", 780),
-        ("UNH", "UnitedHealth", "Health Care", 500),
-        ("XOM", "Exxon Mobil", "Energy", 450),
-    ]
-    
-    companies = []
-    for t, n, s, mc in top_tickers:
-        companies.append({"ticker": t, "name": n, "sector": s, "market_cap": mc * 1_000_000_000})
-    
-    # Generate additional companies to reach ~500
-    for i in range(490):
-        sector = random.choice(sectors)
-        idx = len(companies)
-        market_cap = int(5_000_000_000 * (500 - idx) / 100 * random.uniform(0.5, 1.5))
-        companies.append({
-            "ticker": f"STK{idx:03d}",
-            "name": f"Company {idx}",
-            "sector": sector,
-            "market_cap": market_cap
-        })
-    
-    return companies
+    """Fallback list of top S&P 500 companies plus seeded synthetic names"""
+    return synthetic_universe(FALLBACK_SIZE, UNIVERSE_SEED).to_records(
+        fields=("ticker", "name", "sector", "market_cap")
+    )
 
 def generate_stock_data(companies: List[Dict]) -> List[Dict]:
     """Generate stock data with REAL prices - uses hardcoded fallback when API unavailable"""
-    # Real stock prices (Feb 8, 2026 prices) - used when Yahoo API is unavailable
-    REAL_PRICES = {
-        "AAPL": 278.00, "MSFT": 409.04, "NVDA": 185.00, "GOOGL": 185.34, "GOOG": 186.82,
-        "AMZN": 235.42, "META": 719.76, "TSLA": 361.62, "BRK-B": 482.79, "AVGO": 238.59,
-        "JPM": 276.00, "LLY": 821.79, "V": 344.26, "UNH": 517.08, "XOM": 105.10,
-        "MA": 553.08, "COST": 1026.61, "HD": 406.66, "PG": 169.30, "JNJ": 150.73,
-        "WMT": 102.38, "NFLX": 982.54, "CRM": 330.92, "BAC": 46.67, "ORCL": 174.59,
-        "CVX": 147.68, "KO": 62.70, "MRK": 89.91, "ABBV": 181.35, "PEP": 142.41,
-        "AMD": 112.58, "TMO": 538.84, "CSCO": 64.49, "ACN": 360.59, "LIN": 452.88,
-        "MCD": 294.50, "ABT": 124.55, "ADBE": 430.58, "DHR": 233.43, "WFC": 79.68,
-        "TXN": 192.47, "PM": 132.99, "VZ": 39.27, "NEE": 69.56, "INTC": 19.64,
-        "QCOM": 168.92, "IBM": 248.55, "GE": 199.87, "CAT": 365.92, "NOW": 1024.35,
-        "HON": 224.53, "BA": 174.88, "AMGN": 282.34, "RTX": 127.45, "GS": 635.22,
-        "BLK": 1015.67, "ISRG": 585.43, "SBUX": 102.89, "MMM": 148.23, "DIS": 111.34,
-        "NKE": 71.56, "PYPL": 87.45, "F": 9.87, "GM": 52.34, "T": 23.45,
-        "COP": 98.75, "LOW": 245.32, "SPGI": 498.21, "UPS": 125.67, "AXP": 312.45,
-        "DE": 412.88, "PLD": 112.34, "MDLZ": 68.92, "SCHW": 78.45, "ADI": 198.76,
-        "SO": 84.32, "DUK": 105.67, "CME": 234.89, "ICE": 156.78, "PGR": 267.34,
-        "CI": 312.45, "ELV": 378.90, "REGN": 756.23, "CL": 92.45, "PANW": 378.90,
-        "SNPS": 534.67, "CDNS": 289.45, "LRCX": 876.54, "AMAT": 176.89, "KLAC": 698.34,
-        "MCHP": 67.89, "NXPI": 234.56, "FTNT": 98.76, "ENPH": 67.43, "SEDG": 23.45,
-    }
-    
-    stocks = []
-    total_cap = sum(c["market_cap"] for c in companies)
-    
     print(f"Using real prices for {len(REAL_PRICES)} major stocks, generating for others...")
-    
-    for company in companies:
-        ticker = company["ticker"]
-        
-        if ticker in REAL_PRICES:
-            # Use real price
-            price = REAL_PRICES[ticker]
-            change = random.uniform(-1.5, 1.5)  # Small random change for visual effect
-        else:
-            # Generate realistic price based on market cap
-            # Average shares outstanding varies by market cap tier
-            if company["market_cap"] > 500_000_000_000:
-                shares_factor = 15_000_000_000  # Large cap ~15B shares
-            elif company["market_cap"] > 100_000_000_000:
-                shares_factor = 3_000_000_000   # Mid-large cap ~3B shares
-            elif company["market_cap"] > 50_000_000_000:
-                shares_factor = 1_000_000_000   # Mid cap ~1B shares
-            else:
-                shares_factor = 500_000_000     # Smaller cap ~500M shares
-            
-            base_price = company["market_cap"] / shares_factor
-            price = max(15, min(800, base_price * random.uniform(0.95, 1.05)))
-            change = random.uniform(-2.0, 2.0)
-        
-        stocks.append({
-            "ticker": company["ticker"],
-            "name": company["name"],
-            "sector": company["sector"],
-            "market_cap": company["market_cap"],
-            "price": round(price, 2),
-            "change_percent": round(change, 2),
-            "weight": round((company["market_cap"] / total_cap) * 100, 4)
-        })
-    
-    return stocks
-
-def load_or_create_cache() -> List[Dict]:
-    """Load cache or create fresh data"""
-    global SP500_DATA
-    
+    # One seeded, vectorised pass (market/synthetic.py) - same input, same prices
+    return companies_universe(companies, UNIVERSE_SEED).to_records()
+
+def build_universe(allow_fallback: bool = True) -> List[Dict]:
+    """Fresh stock list from Wikipedia (or the fallback list) - blocking"""
+    return generate_stock_data(fetch_sp500_from_wikipedia(allow_fallback))
+
+def build_columns() -> ColumnarStore:
+    """A complete new universe, built off to the side - blocking. Raises
+    rather than fall back, so a failed rebuild keeps the data being served."""
+    if UNIVERSE_SIZE:
+        return synthetic_universe(UNIVERSE_SIZE, UNIVERSE_SEED)
+    return ColumnarStore.from_records(build_universe(allow_fallback=False))
+
+def persist_universe(snapshot) -> None:
+    """Write the snapshot file (atomic) - a failure only costs the next cold start"""
+    try:
+        write_snapshot(SNAPSHOT_FILE, snapshot.columns, snapshot.source)
+    except OSError as e:
+        print(f"Snapshot write failed: {e!r}")
+
+def load_or_create_cache() -> float:
+    """Publish the on-disk snapshot, the legacy JSON cache or fresh data.
+    Returns when the published data was built (unix time)."""
+    if UNIVERSE_SIZE:
+        snapshot = UNIVERSE.publish(synthetic_universe(UNIVERSE_SIZE, UNIVERSE_SEED), source="synthetic")
+        print(f"Generated synthetic universe of {len(snapshot)} stocks (seed {UNIVERSE_SEED})")
+        return time.time()
+
+    if os.path.exists(SNAPSHOT_FILE):
+        try:
+            columns, info = load_snapshot(SNAPSHOT_FILE)
+            UNIVERSE.publish(columns, source="snapshot")
+            print(f"Loaded {info.count} stocks from {SNAPSHOT_FILE} (age {info.age:.0f}s)")
+            return info.created_at
+        except SnapshotFileError as e:
+            print(f"Ignoring snapshot file: {e}")
+
     if os.path.exists(CACHE_FILE):
         try:
-            with open(CACHE_FILE, 'r') as f:
-                data = json.load(f)
-                if len(data.get("stocks", [])) >= 400:
-                    SP500_DATA = data["stocks"]
-                    print(f"Loaded {len(SP500_DATA)} stocks from cache")
-                    return SP500_DATA
-        except:
-            pass
-    
-    # Fetch fresh data
-    companies = fetch_sp500_from_wikipedia()
-    SP500_DATA = generate_stock_data(companies)
-    
-    # Save cache
+            stocks = import_json(CACHE_FILE)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring legacy cache: {e!r}")
+            stocks = []
+        if len(stocks) >= 400:
+            snapshot = UNIVERSE.publish(stocks, source="cache")
+            print(f"Imported {len(snapshot)} stocks from {CACHE_FILE}")
+            persist_universe(snapshot)
+            return os.path.getmtime(CACHE_FILE)
+
+    snapshot = UNIVERSE.publish(build_universe(), source=PROVIDER.companies_source)
+    persist_universe(snapshot)
+    return time.time()
+
+async def rebuild_universe() -> Dict:
+    """Refresh job: build the new universe on an upstream thread while the
+    old one is still served, swap it in with one publish and persist it.
+    An unchanged ticker list goes out as a delta of the rows that moved."""
     try:
-        with open(CACHE_FILE, 'w') as f:
-            json.dump({"stocks": SP500_DATA, "updated": datetime.now().isoformat()}, f)
-    except:
-        pass
-    
-    return SP500_DATA
+        columns = await UPSTREAM.run(build_columns, timeout=UNIVERSE_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("Universe rebuild timed out")
+        raise RuntimeError("Upstream timeout") from None
+    source = "synthetic" if UNIVERSE_SIZE else PROVIDER.companies_source
+    # Tickers still listed keep their live prices instead of reference ones;
+    # no await between reading current and publishing, so no cycle is lost
+    columns, changed = carry_prices(columns, UNIVERSE.current.columns)
+    snapshot = UNIVERSE.publish(columns, source=source, changed=changed)
+    UNIVERSE_BUILT["at"] = time.time()
+    if not UNIVERSE_SIZE:
+        await UPSTREAM.run(persist_universe, snapshot)
+    return {"count": len(snapshot), "version": snapshot.version, "source": snapshot.source}
+
+async def leader_refresh() -> Dict:
+    """Refresh job of a follower: the leader rebuilds, this worker waits for
+    the ticket and adopts the version it published"""
+    ticket = SHARED.request_refresh()
+    deadline = time.monotonic() + UNIVERSE_TIMEOUT * 2
+    while (ok := SHARED.refresh_result(ticket)) is None:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Leader did not finish the refresh in time")
+        await asyncio.sleep(SHARED_POLL)
+    if not ok:
+        raise RuntimeError("Refresh failed on the leader")
+    await adopt_shared()
+    snapshot = UNIVERSE.current
+    return {"count": len(snapshot), "version": snapshot.version, "source": snapshot.source}
+
+def is_leader() -> bool:
+    """Whether this worker owns the universe (always, without SHARED_DIR)"""
+    return SHARED is None or SHARED.is_leader
+
+def start_refresh():
+    """(job, started) - joins the refresh that is already running, if any"""
+    return JOBS.submit("refresh", rebuild_universe if is_leader() else leader_refresh)
+
+async def ensure_universe():
+    """Load the universe off the event loop - concurrent callers share one load.
+    Data older than SNAPSHOT_MAX_AGE is rebuilt in the background."""
+    if not len(UNIVERSE.current) and not is_leader():
+        await wait_for_leader()
+    elif not len(UNIVERSE.current):
+        built_at = await UNIVERSE_FLIGHT.do(
+            "universe", lambda: UPSTREAM.run(load_or_create_cache, timeout=UNIVERSE_TIMEOUT)
+        )
+        if built_at is not None:
+            UNIVERSE_BUILT["at"] = built_at
+
+    built_at = UNIVERSE_BUILT["at"]
+    if (SNAPSHOT_MAX_AGE > 0 and not UNIVERSE_SIZE and built_at is not None and is_leader()
+            and time.time() - built_at > SNAPSHOT_MAX_AGE and not JOBS.active("refresh")):
+        # Stamp now so a failing rebuild is retried after SNAPSHOT_MAX_AGE, not per request
+        UNIVERSE_BUILT["at"] = time.time()
+        start_refresh()
+
+def broadcast_snapshot(snapshot, changed):
+    """Encode each new version once and fan it out to /api/stream subscribers"""
+    if changed is None:
+        message = sse_event("resync", {"version": snapshot.version}, snapshot.version)
+    else:
+        payload = delta_payload(snapshot, snapshot.version - 1, changed)
+        message = sse_event("delta", payload, snapshot.version)
+    STREAM.publish_threadsafe(snapshot.version, message)
+
+def share_snapshot(snapshot, changed):
+    """Leader: hand every new version to the other workers"""
+    if SHARED is None or not SHARED.is_leader or snapshot.version == SHARED.version:
+        return  # Single process, a follower, or the version was just adopted from there
+    try:
+        SHARED.publish(snapshot.columns, snapshot.source, snapshot.version, changed,
+                       meta={"built_at": UNIVERSE_BUILT["at"] or time.time(),
+                             "published_at": snapshot.created_at.isoformat()})
+    except OSError as e:
+        print(f"Shared universe write failed: {e!r}")
+
+async def adopt_shared() -> bool:
+    """Publish the newest shared version locally - numeric columns stay
+    views onto the shared file. A version right after ours keeps its delta,
+    a gap makes /api/stream clients resync."""
+    current = UNIVERSE.current.version
+    if SHARED.version <= current:
+        return False
+    loaded = await asyncio.to_thread(SHARED.load)
+    if loaded is None:
+        return False
+    columns, info = loaded
+    version = info.meta.get("version", 0)
+    if version <= UNIVERSE.current.version:
+        return False
+    changed = info.meta.get("changed") if version == UNIVERSE.current.version + 1 else None
+    UNIVERSE.publish(columns, source=info.source, changed=changed, version=version,
+                     created_at=datetime.fromisoformat(info.meta["published_at"]))
+    UNIVERSE_BUILT["at"] = info.meta.get("built_at") or info.created_at
+    return True
+
+async def wait_for_leader():
+    """Follower start: poll for the leader's first version (it may still be
+    fetching the constituents)"""
+    deadline = time.monotonic() + UNIVERSE_TIMEOUT
+    while not await adopt_shared() and not len(UNIVERSE.current):
+        if time.monotonic() > deadline:
+            print("No shared universe from the leader yet")
+            return
+        await asyncio.sleep(SHARED_POLL)
+
+async def take_over():
+    """A follower that just got the leader lock carries on where the old
+    leader stopped"""
+    print(f"Worker {os.getpid()} is now the leader")
+    await adopt_shared()
+    await ensure_universe()
+    REFRESHER.start()
+
+def serve_refresh_requests():
+    """Leader: run the refresh followers asked for (or join the running one)"""
+    ticket = SHARED.take_refresh()
+    if ticket:
+        job, _ = JOBS.submit("refresh", rebuild_universe)
+        job.task.add_done_callback(lambda _: SHARED.complete_refresh(ticket, job.state == DONE))
+
+async def shared_sync():
+    """Every SHARED_POLL: a follower adopts new versions and tries for the
+    leader lock (free once the leader died), the leader serves refresh
+    requests"""
+    while True:
+        await asyncio.sleep(SHARED_POLL)
+        try:
+            if not SHARED.is_leader and SHARED.try_lead():
+                await take_over()
+            if SHARED.is_leader:
+                serve_refresh_requests()
+            else:
+                await adopt_shared()
+        except Exception as e:
+            print(f"Shared sync failed: {e!r}")
+
+UNIVERSE.add_listener(broadcast_snapshot)
+UNIVERSE.add_listener(AGGREGATES.on_publish)
+UNIVERSE.add_listener(share_snapshot)
+
+# Prometheus metrics for /api/metrics. Requests are timed by the middleware;
+# caches, executor, provider and snapshot keep their own counters, which are
+# only read when scraped
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by route template", ["method", "route", "status"])
+RESPONSE_BYTES = REGISTRY.histogram(
+    "http_response_size_bytes", "Response body size by route template", ["route"], buckets=SIZE_BUCKETS)
+QUOTE_RESPONSES = REGISTRY.counter(
+    "quote_responses_total", "Quotes served by source (cache, live, fallback, not_found)", ["source"])
+LOOP_LAG = LoopLagMonitor(
+    REGISTRY.histogram("event_loop_lag_seconds", "How late the event loop woke up from a timed sleep"),
+    interval=float(os.environ.get("LOOP_LAG_INTERVAL", 0.25)),
+)
+# PROFILE_REQUESTS=1 - requests sent with X-Profile: 1 are stack-sampled,
+# fetch the result via /api/metrics/profile/{X-Profile-Id}
+PROFILES = ProfileStore() if os.environ.get("PROFILE_REQUESTS") == "1" else None
+app.add_middleware(MetricsMiddleware, latency=REQUEST_SECONDS, sizes=RESPONSE_BYTES, profiles=PROFILES)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+ENCODED_CACHES = {
+    "encoded": ENCODED, "query_encoded": QUERY_ENCODED, "history_encoded": HISTORY_ENCODED,
+    "correlation_encoded": CORRELATION_ENCODED, "graph_encoded": GRAPH_ENCODED,
+    "aggregates_encoded": AGGREGATES_ENCODED,
+}
+
+def cache_lookups():
+    quotes = QUOTE_CACHE.stats()
+    samples = {("quote", result): quotes[result] for result in ("hits", "stale_hits", "negative_hits", "misses")}
+    for name, cache in ENCODED_CACHES.items():
+        samples[(name, "hits")] = cache.hits
+        samples[(name, "misses")] = cache.misses
+    return samples
+
+def cache_entries():
+    return {("quote",): len(QUOTE_CACHE), **{(name,): cache.stats()["size"] for name, cache in ENCODED_CACHES.items()}}
+
+def guard_stats(key: str):
+    return {(name,): guard.breaker.stats()[key] for name, guard in PROVIDER.guards.items()}
+
+REGISTRY.counter_callback("cache_lookups_total", "Cache lookups by cache and result", cache_lookups,
+                          ["cache", "result"])
+REGISTRY.gauge_callback("cache_entries", "Entries held per cache", cache_entries, ["cache"])
+REGISTRY.gauge_callback("upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+                        lambda: {(name,): CIRCUIT_STATES[state] for (name,), state in guard_stats("state").items()},
+                        ["upstream"])
+REGISTRY.counter_callback("upstream_circuit_opens_total", "Times the circuit breaker opened",
+                          lambda: guard_stats("opens"), ["upstream"])
+REGISTRY.gauge_callback("upstream_executor_running", "Upstream calls running in the executor",
+                        lambda: UPSTREAM.running)
+REGISTRY.counter_callback("upstream_executor_timeouts_total", "Upstream calls abandoned after their timeout",
+                          lambda: UPSTREAM.timeouts)
+REGISTRY.gauge_callback("snapshot_version", "Version of the published universe snapshot",
+                        lambda: UNIVERSE.current.version)
+REGISTRY.gauge_callback("snapshot_age_seconds", "Seconds since the current snapshot was published",
+                        lambda: (datetime.now() - UNIVERSE.current.created_at).total_seconds())
+REGISTRY.gauge_callback("universe_age_seconds", "Seconds since the constituents were fetched",
+                        lambda: time.time() - UNIVERSE_BUILT["at"] if UNIVERSE_BUILT["at"] else None)
+REGISTRY.counter_callback("price_refresh_cycles_total", "Background price refresh cycles",
+                          lambda: REFRESHER.cycles)
+REGISTRY.counter_callback("price_refresh_errors_total", "Failed background price refresh cycles",
+                          lambda: REFRESHER.errors)
+REGISTRY.gauge_callback("stream_subscribers", "Connected /api/stream clients", lambda: len(STREAM))
+REGISTRY.counter_callback("stream_dropped_total", "Stream messages dropped for slow clients",
+                          lambda: STREAM.dropped)
+REGISTRY.gauge_callback("worker_leader", "1 when this worker owns the universe (SHARED_DIR leader or single process)",
+                        lambda: int(is_leader()))
+REGISTRY.gauge_callback("event_loop_lag_max_seconds", "Largest event loop lag seen", lambda: LOOP_LAG.max)
 
 # Initialize on startup
 @app.on_event("startup")
 async def startup_event():
-    load_or_create_cache()
+    STREAM.bind(asyncio.get_running_loop())
+    LOOP_LAG.start()
+    if SHARED is not None:
+        SHARED.try_lead()
+        await adopt_shared()  # Carry on from the versions other workers already serve
+        SHARED_SYNC["task"] = asyncio.get_running_loop().create_task(shared_sync())
+    await ensure_universe()
+    if is_leader():
+        REFRESHER.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await REFRESHER.stop()
+    await JOBS.cancel_all()
+    await LOOP_LAG.stop()
+    if SHARED_SYNC["task"] is not None:
+        SHARED_SYNC["task"].cancel()
+        SHARED_SYNC["task"] = None
+    if SHARED is not None:
+        SHARED.resign()
+    UPSTREAM.shutdown()
 
 @app.get("/")
 async def root():
-    return {"message": "S&P 500 API", "stocks": len(SP500_DATA)}
+    return {"message": "S&P 500 API", "stocks": len(UNIVERSE.current)}
+
+def json_response(payload) -> Response:
+    """JSON response through the fast encoder (skips jsonable_encoder)"""
+    return Response(content=dumps(payload), media_type="application/json")
+
+def encoded_response(request: Request, body: EncodedBody, media_type: str = "application/json") -> Response:
+    """Serve a pre-encoded body - 304 on a matching If-None-Match, otherwise
+    the best precompressed variant for the client's Accept-Encoding"""
+    content, coding, etag = body.variant(request.headers.get("accept-encoding", ""))
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache", "Vary": "Accept-Encoding"}
+    if body.matches_etag(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(content=content, media_type=media_type, headers=headers)
+
+def stocks_payload(snapshot, format: str):
+    meta = {"version": snapshot.version, "last_updated": snapshot.created_at.isoformat()}
+    if format == "columnar":
+        return {**snapshot.columns.to_columns(), "count": len(snapshot), "format": "columnar", **meta}
+    if format == "binary":
+        return snapshot.columns.to_binary(meta)
+    return {"stocks": snapshot.stocks, "count": len(snapshot), **meta}
 
 @app.get("/api/stocks")
-async def get_stocks():
-    if not SP500_DATA:
-        load_or_create_cache()
-    
-    return {
-        "stocks": SP500_DATA,
-        "count": len(SP500_DATA),
-        "last_updated": datetime.now().isoformat()
-    }
+async def get_stocks(request: Request, since: Optional[int] = None, format: str = "json",
+                     sector: Optional[str] = None, min_cap: Optional[float] = None,
+                     max_cap: Optional[float] = None, sort: Optional[str] = None,
+                     limit: Optional[int] = None, offset: Optional[int] = None,
+                     fields: Optional[str] = None):
+    """Universe as row JSON (default), `format=columnar` (one array per field)
+    or `format=binary` (typed arrays, see ColumnarStore.to_binary).
+
+    `sector`, `min_cap`/`max_cap`, `sort` (field, `-` prefix = descending),
+    `limit`/`offset` and `fields` return a server-side slice instead of the
+    whole universe."""
+    if format not in STOCK_FORMATS:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown format {format}"})
+    try:
+        query = StockQuery.parse(sector, min_cap, max_cap, sort, limit, offset, fields)
+    except QueryError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    if query is not None and since is not None:
+        return JSONResponse(status_code=400, content={"success": False, "error": "since cannot be combined with filters"})
+
+    await ensure_universe()
+    snapshot = UNIVERSE.current
+
+    if since is not None:
+        # Reconnecting client - only what changed after its version
+        changed = UNIVERSE.changes_since(since, until=snapshot.version)
+        return json_response(delta_payload(snapshot, since, changed))
+
+    if query is not None:
+        try:
+            query = query.resolve(snapshot.columns)
+        except QueryError as e:
+            return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+        meta = {"version": snapshot.version, "last_updated": snapshot.created_at.isoformat()}
+        body = QUERY_ENCODED.get(
+            (query, format, snapshot.version),
+            lambda: query_payload(snapshot.columns, query, format, meta)
+        )
+        return encoded_response(request, body, STOCK_FORMATS[format])
+
+    # Encoded once per snapshot version and format, then just bytes or a 304
+    body = ENCODED.get(("stocks", format, snapshot.version), lambda: stocks_payload(snapshot, format))
+    return encoded_response(request, body, STOCK_FORMATS[format])
+
+@app.get("/api/stream")
+async def stream_stocks(request: Request, since: Optional[int] = None):
+    """SSE feed of price deltas. Every event id is a snapshot version, so a
+    reconnecting EventSource resumes via Last-Event-ID. A `resync` event means
+    the client must refetch /api/stocks."""
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+
+    subscriber = STREAM.subscribe()
+    snapshot = UNIVERSE.current
+
+    async def events():
+        seen = snapshot.version
+        try:
+            yield b"retry: 3000\n\n"
+            if since is None:
+                yield sse_event("hello", {"version": seen}, seen)
+            else:
+                tickers = UNIVERSE.changes_since(since, until=seen)
+                if tickers is None:
+                    yield sse_event("resync", {"version": seen}, seen)
+                else:
+                    yield sse_event("delta", delta_payload(snapshot, since, tickers), seen)
+
+            while True:
+                try:
+                    version, message = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                if subscriber.dropped:
+                    yield message  # Resync left by the broadcaster - client reconnects
+                    return
+                if version <= seen:
+                    continue
+                seen = version
+                yield message
+        finally:
+            STREAM.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def fetch_live_quote(ticker: str) -> Optional[Dict]:
+    """Live quote for one ticker - None when upstream has no price"""
+    data = PROVIDER.quote(ticker)
+    if data and not data["market_cap"]:
+        stock = UNIVERSE.current.get(ticker)
+        data["market_cap"] = stock["market_cap"] if stock else 0
+    return data
+
+def fetch_live_quotes(tickers: List[str]) -> Dict[str, Optional[Dict]]:
+    """Bulk live quotes - market cap taken from the universe (download has none)"""
+    live = PROVIDER.quotes(tickers)
+    columns = UNIVERSE.current.columns
+    for ticker, data in live.items():
+        i = columns.positions.get(ticker)
+        if data and i is not None:
+            data["market_cap"] = int(columns.market_cap[i])
+    return live
+
+async def load_quotes(tickers: List[str]) -> Dict[str, Dict]:
+    """Fetch tickers upstream, coalescing with fetches already in flight.
+
+    Results (including negative ones) are recorded in QUOTE_CACHE once per
+    upstream call, not once per waiting request.
+    """
+    async def fetch(keys):
+        if len(keys) == 1:
+            live = {keys[0]: await UPSTREAM.run(fetch_live_quote, keys[0])}
+        else:
+            live = await UPSTREAM.run(fetch_live_quotes, keys, timeout=BULK_TIMEOUT)
+        for key, data in live.items():
+            if data:
+                QUOTE_CACHE.set(key, data)
+            else:
+                QUOTE_CACHE.set_missing(key)
+        return {k: v for k, v in live.items() if v}
+
+    return await QUOTE_FLIGHT.do_many(tickers, fetch)
+
+def warm_quote_cache(quotes: Dict[str, Dict]):
+    """Feed refresher results into QUOTE_CACHE so hovers are served locally"""
+    columns = UNIVERSE.current.columns
+    for ticker, data in quotes.items():
+        i = columns.positions.get(ticker)
+        QUOTE_CACHE.set(ticker, {**data, "market_cap": int(columns.market_cap[i]) if i is not None else 0})
+
+REFRESHER = PriceRefresher(
+    UNIVERSE,
+    fetch=PROVIDER.quotes,
+    run=UPSTREAM.run,
+    interval=float(os.environ.get("PRICE_REFRESH_INTERVAL", 60)),
+    timeout=BULK_TIMEOUT * 2,
+    on_quotes=warm_quote_cache,
+)
+
+def revalidate_in_background(tickers: List[str]):
+    """Stale-while-revalidate - refresh stale entries without blocking the request"""
+    task = asyncio.get_running_loop().create_task(load_quotes(tickers))
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+
+def fallback_quote(ticker: str) -> Dict:
+    """Quote from the universe with is_live=False, or a not-found error"""
+    stock = UNIVERSE.current.get(ticker)
+    if stock:
+        QUOTE_RESPONSES.inc("fallback")
+        return {"success": True, "stock": {**stock, "is_live": False}, "source": "fallback"}
+    QUOTE_RESPONSES.inc("not_found")
+    return {"success": False, "error": f"Ticker {ticker} not found"}
 
 @app.get("/api/stock/{ticker}")
 async def get_single_stock(ticker: str):
-    ticker = ticker.upper()
-    
-    # Check cache
-    if ticker in SINGLE_STOCK_CACHE:
-        cached = SINGLE_STOCK_CACHE[ticker]
-        if datetime.now() - cached["time"] < timedelta(minutes=1):
-            return {"success": True, "stock": cached["data"], "source": "cache"}
-    
-    # Try live fetch
+    symbols = parse_tickers(ticker, limit=1)
+    if not symbols:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Invalid ticker {ticker}"})
+    ticker = symbols[0]
+
+    state, data = QUOTE_CACHE.lookup(ticker)
+    if state == STALE:
+        revalidate_in_background([ticker])
+    if state in (FRESH, STALE):
+        QUOTE_RESPONSES.inc("cache")
+        return {"success": True, "stock": data, "source": "cache"}
+    if state == NEGATIVE:
+        return fallback_quote(ticker)
+
+    live = await load_quotes([ticker])
+    if ticker in live:
+        QUOTE_RESPONSES.inc("live")
+        return {"success": True, "stock": live[ticker], "source": "live"}
+    return fallback_quote(ticker)
+
+@app.get("/api/quotes")
+async def get_quotes(tickers: str = ""):
+    """Batched quotes - cached tickers resolved locally, misses fetched in bulk"""
+    symbols = parse_tickers(tickers)
+    if not symbols:
+        return JSONResponse(status_code=400, content={"success": False, "error": "Missing tickers"})
+
+    quotes = {}
+    misses = []
+    stale = []
+    negative = []
+    for ticker in symbols:
+        state, data = QUOTE_CACHE.lookup(ticker)
+        if state in (FRESH, STALE):
+            quotes[ticker] = {"success": True, "stock": data, "source": "cache"}
+            if state == STALE:
+                stale.append(ticker)
+        elif state == NEGATIVE:
+            negative.append(ticker)
+        else:
+            misses.append(ticker)
+
+    if stale:
+        revalidate_in_background(stale)
+    cached = len(quotes)
+    QUOTE_RESPONSES.inc("cache", amount=cached)
+
+    live = await load_quotes(misses) if misses else {}
+    for ticker in misses:
+        if ticker in live:
+            quotes[ticker] = {"success": True, "stock": live[ticker], "source": "live"}
+    QUOTE_RESPONSES.inc("live", amount=len(quotes) - cached)
+
+    for ticker in symbols:
+        if ticker not in quotes:
+            quotes[ticker] = fallback_quote(ticker)
+
+    # Keep the request order in the response
+    return {
+        "success": True,
+        "quotes": {t: quotes[t] for t in symbols},
+        "count": len(symbols)
+    }
+
+def ingest_history(tickers: List[str], period: str = DEFAULT_PERIOD) -> int:
+    """Fill (or top up) the history store for tickers - blocking, run via UPSTREAM"""
+    return ingest(HISTORY, tickers, lambda chunk: HISTORY_PROVIDER.history(chunk, period))
+
+def history_work(tickers) -> Tuple[List[str], List[str]]:
+    """(tickers without history and no recent no-data answer, tickers whose bars fell behind)"""
+    new, behind = [], []
+    for ticker in tickers:
+        if not HISTORY.has(ticker):
+            if not HISTORY.is_missing(ticker):
+                new.append(ticker)
+        elif HISTORY.behind(ticker):
+            behind.append(ticker)
+    return new, behind
+
+async def ingest_universe_history() -> Dict:
+    """History job: full history for new universe tickers, the last month
+    for tickers whose newest bar is older than the last trading day - the
+    correlation engines then append the new bars incrementally"""
+    new, behind = history_work(UNIVERSE.current.columns.tickers)
+    stored = await UPSTREAM.run(ingest_history, new, timeout=UNIVERSE_TIMEOUT) if new else 0
+    if behind:
+        stored += await UPSTREAM.run(ingest_history, behind, TOP_UP_PERIOD, timeout=UNIVERSE_TIMEOUT)
+    return {"requested": len(new), "topped_up": len(behind), "stored": stored}
+
+def start_history_ingest():
+    """(job, started) - joins the ingest that is already running, if any"""
+    return JOBS.submit("history", ingest_universe_history)
+
+def top_up_in_background(ticker: str):
+    """Fetch the last month of bars for a ticker whose history fell behind,
+    without blocking the request"""
+    fetch = lambda: HISTORY_FLIGHT.do((ticker, TOP_UP_PERIOD), lambda: UPSTREAM.run(
+        ingest_history, [ticker], TOP_UP_PERIOD, timeout=BULK_TIMEOUT))
+    task = asyncio.get_running_loop().create_task(fetch())
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+
+async def has_upstream_history(ticker: str) -> bool:
+    """Whether asking upstream for ticker's bars makes sense - the stub
+    invents bars for any symbol, so it only serves universe members and
+    random symbols cannot fill HISTORY_DIR"""
+    if HISTORY_PROVIDER.name != "stub":
+        return True
+    await ensure_universe()
+    return ticker in UNIVERSE.current.columns.positions
+
+def parse_date(value: Optional[str]) -> Optional[float]:
+    """ISO date/datetime -> unix seconds (naive values are UTC)"""
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+@app.get("/api/history/{ticker}")
+async def get_history(request: Request, ticker: str, start: Optional[str] = None, end: Optional[str] = None,
+                      interval: str = "1d", max_points: int = DEFAULT_POINTS):
+    """Daily/weekly/monthly OHLCV for [start, end], downsampled to max_points.
+    A ticker without stored history is ingested on first request; one
+    upstream has no bars for is not asked again for an hour. Bars that end
+    before the last trading day are topped up in the background."""
+    symbols = parse_tickers(ticker, limit=1)
+    if not symbols:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Invalid ticker {ticker}"})
+    if interval not in INTERVALS:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown interval {interval}"})
+    if not 3 <= max_points <= MAX_POINTS:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"max_points must be between 3 and {MAX_POINTS}"})
     try:
-        stock = yf.Ticker(ticker)
-        fi = stock.fast_info
-        price = getattr(fi, 'last_price', 0) or 0
-        prev = getattr(fi, 'previous_close', price) or price
-        change = ((price - prev) / prev * 100) if prev else 0
-        mc = getattr(fi, 'market_cap', 0) or 0
-        
-        data = {
-            "ticker": ticker,
-            "price": round(price, 2),
-            "change_percent": round(change, 2),
-            "market_cap": mc,
-            "is_live": True
-        }
-        
-        SINGLE_STOCK_CACHE[ticker] = {"data": data, "time": datetime.now()}
-        return {"success": True, "stock": data, "source": "live"}
-        
-    except Exception as e:
-        # Return from SP500_DATA with is_live=False
-        stock = next((s for s in SP500_DATA if s["ticker"] == ticker), None)
-        if stock:
-            return {"success": True, "stock": {**stock, "is_live": False}, "source": "fallback"}
-        return {"success": False, "error": str(e)}
+        start_ts, end_ts = parse_date(start), parse_date(end)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Invalid date: {e}"})
+
+    symbol = symbols[0]
+    if not HISTORY.has(symbol):
+        if not HISTORY.is_missing(symbol) and await has_upstream_history(symbol):
+            await HISTORY_FLIGHT.do(symbol, lambda: UPSTREAM.run(ingest_history, [symbol], timeout=BULK_TIMEOUT))
+    elif HISTORY.behind(symbol):
+        top_up_in_background(symbol)  # Stored bars now, the new ones on the next request
+    version = HISTORY.version(symbol)
+    if version is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"No history for {symbol}"})
+
+    def build():
+        return HISTORY_ENCODED.get(
+            (symbol, start_ts, end_ts, interval, max_points, version),
+            lambda: {"success": True, **HISTORY.query(symbol, start_ts, end_ts, interval, max_points)}
+        )
+
+    # Resampling and LTTB are CPU work - off the event loop
+    body = await asyncio.to_thread(build)
+    return encoded_response(request, body)
+
+@app.get("/api/sectors")
+async def get_sectors(request: Request, movers: int = DEFAULT_MOVERS):
+    """Per-sector cap totals, index weight, cap-weighted change, breadth and
+    top movers - read from running sums, not a pass over the universe"""
+    if not 0 <= movers <= MAX_MOVERS:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"movers must be between 0 and {MAX_MOVERS}"})
+    await ensure_universe()
+    body = AGGREGATES.encoded("sectors", movers, AGGREGATES_ENCODED)
+    return encoded_response(request, body)
+
+@app.get("/api/index")
+async def get_index(request: Request, movers: int = DEFAULT_MOVERS):
+    """Whole-index totals, cap-weighted change, breadth and top movers"""
+    if not 0 <= movers <= MAX_MOVERS:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"movers must be between 0 and {MAX_MOVERS}"})
+    await ensure_universe()
+    body = AGGREGATES.encoded("index", movers, AGGREGATES_ENCODED)
+    return encoded_response(request, body)
+
+@app.get("/api/correlations")
+async def get_correlations(request: Request, k: int = DEFAULT_K, window: int = DEFAULT_WINDOW):
+    """Each ticker's k most correlated peers over the last `window` daily
+    returns, plus the deduplicated peer pairs as graph links. New daily
+    bars update the window incrementally."""
+    if not 1 <= k <= MAX_K:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"k must be between 1 and {MAX_K}"})
+    if not MIN_WINDOW <= window <= MAX_WINDOW:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"window must be between {MIN_WINDOW} and {MAX_WINDOW}"})
+
+    await ensure_universe()
+    tickers = list(UNIVERSE.current.columns.tickers)
+    job = None
+    universe = UNIVERSE.current.columns.tickers
+    if universe != HISTORY_CHECKED["tickers"] or time.monotonic() - HISTORY_CHECKED["at"] > HISTORY_CHECK_EVERY:
+        if any(history_work(universe)):
+            # Ingest in the background - correlate whatever is stored meanwhile
+            job, _ = start_history_ingest()
+        else:
+            HISTORY_CHECKED.update(tickers=universe, at=time.monotonic())
+
+    def encode(engine):
+        # Runs under the index lock - the version in the key is the one the payload is built from
+        if engine.last_t is None:
+            return False, None
+        return True, CORRELATION_ENCODED.get(
+            (window, k, engine.tickers, engine.version),
+            lambda: {"success": True, **engine.payload(k)}
+        )
+
+    def build():
+        return CORRELATIONS.use(tickers, window, encode)
+
+    # Blocking matrix work - off the event loop, once per (window, k)
+    result = await CORRELATION_FLIGHT.do((window, k), lambda: asyncio.to_thread(build))
+    if result is None:
+        print(f"Correlation build failed for window {window}, k {k}")
+        return JSONResponse(status_code=500, content={"success": False, "error": "Correlation build failed"})
+    ready, body = result
+    if not ready:
+        content = {"success": False, "error": f"Not enough history for a {window}-day window"}
+        if job is not None:
+            content["job"] = job.to_dict()
+        return JSONResponse(status_code=503, content=content)
+    return encoded_response(request, body)
+
+@app.get("/api/graph")
+async def get_graph(request: Request, sector: Optional[str] = None):
+    """Constellation nodes and links with precomputed x/y - render with
+    warmupTicks=0. Laid out once per (sector, snapshot version), starting
+    from the previous version's positions."""
+    await ensure_universe()
+    snapshot = UNIVERSE.current
+    name = None
+    if sector and sector != "All":
+        name = resolve_sector(snapshot.columns, sector)
+        if name is None:
+            return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown sector {sector}"})
+
+    key = (name, snapshot.version)
+
+    def build():
+        return GRAPH_ENCODED.get(key, lambda: GRAPH_LAYOUTS.payload(snapshot.columns, snapshot.version, name))
+
+    # The layout is CPU work - off the event loop, once per key
+    body = await GRAPH_FLIGHT.do(key, lambda: asyncio.to_thread(build))
+    if body is None:
+        return JSONResponse(status_code=500, content={"success": False, "error": "Graph layout failed"})
+    return encoded_response(request, body)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        **QUOTE_CACHE.stats(),
+        "coalesced": QUOTE_FLIGHT.coalesced,
+        "in_flight": len(QUOTE_FLIGHT),
+        "upstream": UPSTREAM.stats(),
+        "provider": PROVIDER.stats(),
+        "refresher": REFRESHER.stats(),
+        "stream": STREAM.stats(),
+        "encoded": ENCODED.stats(),
+        "query_encoded": QUERY_ENCODED.stats(),
+        "history": {**HISTORY.stats(), "encoded": HISTORY_ENCODED.stats()},
+        "graph": {**GRAPH_LAYOUTS.stats(), "encoded": GRAPH_ENCODED.stats()},
+        "aggregates": {**AGGREGATES.stats(), "encoded": AGGREGATES_ENCODED.stats()},
+        "jobs": JOBS.stats(),
+        "shared": SHARED.stats() if SHARED is not None else None,
+        "correlations": {"windows": CORRELATIONS.stats(), "encoded": CORRELATION_ENCODED.stats()}
+    }
+
+@app.get("/api/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+@app.get("/api/metrics/profile/{profile_id}")
+async def metrics_profile(profile_id: str):
+    """Collapsed stacks of a profiled request - flamegraph.pl / speedscope input"""
+    profile = PROFILES.get(profile_id) if PROFILES is not None else None
+    if profile is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Unknown profile {profile_id}"})
+    return Response(profile["collapsed"], media_type="text/plain", headers={
+        "X-Profile-Path": profile["path"],
+        "X-Profile-Duration": f"{profile['duration']:.6f}",
+        "X-Profile-Samples": str(profile["samples"]),
+    })
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "stocks": len(SP500_DATA)}
+    snapshot = UNIVERSE.current
+    return {"status": "ok", "stocks": len(snapshot), "version": snapshot.version}
 
 @app.post("/api/refresh")
-async def refresh():
-    global SP500_DATA
-    companies = fetch_sp500_from_wikipedia()
-    SP500_DATA = generate_stock_data(companies)
-    return {"success": True, "count": len(SP500_DATA)}
+async def refresh(wait: bool = False):
+    """Start a universe rebuild (or join the running one) and return its
+    job at once - 202 with Location: /api/refresh/{id}. ?wait=true answers
+    when the job has finished, in the old synchronous shape."""
+    job, started = start_refresh()
+    if wait:
+        await JOBS.wait(job, timeout=UNIVERSE_TIMEOUT * 2)
+        if job.state == DONE:
+            return {"success": True, **job.result, "job": job.to_dict()}
+        return {"success": False, "error": job.error or "Refresh still running", "job": job.to_dict()}
+    return JSONResponse(
+        status_code=202,
+        content={"success": True, "job": job.to_dict(), "joined": not started},
+        headers={"Location": f"/api/refresh/{job.id}"},
+    )
+
+@app.get("/api/refresh/{job_id}")
+async def refresh_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Unknown refresh job {job_id}"})
+    return {"success": True, "job": job.to_dict()}
@@ -0,0 +1,4 @@
+"""
+Shared market-data helpers for the FastAPI backend (main.py) and the
+Vercel serverless functions in api/
+"""
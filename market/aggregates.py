@@ -0,0 +1,179 @@
+"""
+Sector and index aggregates - cap totals, cap-weighted change, breadth and
+top movers, kept up to date from the snapshot deltas instead of being
+recomputed over the universe per request
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from market.columnar import ColumnarStore
+from market.encoding import EncodedBody, EncodedCache
+from market.snapshot import Snapshot
+
+DEFAULT_MOVERS = 5
+MAX_MOVERS = 25
+
+
+class Aggregates:
+    """Running per-sector sums, updated by a SnapshotStore listener.
+
+    A publish that names its changed tickers costs O(1) per ticker: the old
+    cap/change of each row is subtracted from its sector's sums and the new
+    one added. Index totals and sector weights are sums over the ~11 sectors.
+    Top movers are ranked per sector only when a changed ticker touched that
+    sector, and the index movers merge the sector lists. Full replacements
+    (changed=None, a different ticker layout, a skipped version) rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # encoded() holds it across sectors()/index()
+        self.version = 0
+        self.columns = ColumnarStore.empty()
+        self._cap = np.empty(0)
+        self._change = np.empty(0)
+        self._reset_sums(0)
+        self.updates = 0
+        self.rebuilds = 0
+
+    def _reset_sums(self, sectors: int) -> None:
+        self.cap_total = np.zeros(sectors)
+        self.cap_change = np.zeros(sectors)   # sum(cap * change_percent)
+        self.count = np.zeros(sectors, np.int64)
+        self.advancers = np.zeros(sectors, np.int64)
+        self.decliners = np.zeros(sectors, np.int64)
+        self._rows: List[np.ndarray] = [np.empty(0, np.int64)] * sectors
+        self._positions: Dict[str, int] = {}
+        self._movers: Dict[int, Dict[str, List[Dict]]] = {}
+
+    def on_publish(self, snapshot: Snapshot, changed: Optional[frozenset]) -> None:
+        """SnapshotStore listener"""
+        columns = snapshot.columns
+        with self._lock:
+            same_layout = (columns.tickers is self.columns.tickers and columns.sectors is self.columns.sectors)
+            if changed is None or not same_layout or snapshot.version != self.version + 1:
+                self._rebuild(columns)
+            else:
+                positions = self._positions
+                self._apply(columns, np.fromiter((positions[t] for t in changed), np.int64, len(changed)))
+            self.columns = columns
+            self.version = snapshot.version
+
+    def _rebuild(self, columns: ColumnarStore) -> None:
+        n_sectors = len(columns.sectors)
+        self._reset_sums(n_sectors)
+        codes = columns.sector_codes
+        self._cap = columns.market_cap.copy()
+        self._change = columns.change_percent.copy()
+        self.cap_total = np.bincount(codes, self._cap, n_sectors)
+        self.cap_change = np.bincount(codes, self._cap * self._change, n_sectors)
+        self.count = np.bincount(codes, minlength=n_sectors)
+        self.advancers = np.bincount(codes[self._change > 0], minlength=n_sectors)
+        self.decliners = np.bincount(codes[self._change < 0], minlength=n_sectors)
+        # Rows per sector - the layout is fixed until the next rebuild
+        order = np.argsort(codes, kind="stable")
+        self._rows = np.split(order, np.cumsum(self.count)[:-1])
+        self._positions = columns.positions
+        self.rebuilds += 1
+
+    def _apply(self, columns: ColumnarStore, rows: np.ndarray) -> None:
+        """Move rows from their old to their new values - O(len(rows))"""
+        codes = columns.sector_codes[rows]
+        old_cap, old_change = self._cap[rows], self._change[rows]
+        new_cap, new_change = columns.market_cap[rows], columns.change_percent[rows]
+
+        np.add.at(self.cap_total, codes, new_cap - old_cap)
+        np.add.at(self.cap_change, codes, new_cap * new_change - old_cap * old_change)
+        np.add.at(self.advancers, codes, (new_change > 0).astype(np.int64) - (old_change > 0))
+        np.add.at(self.decliners, codes, (new_change < 0).astype(np.int64) - (old_change < 0))
+        self._cap[rows] = new_cap
+        self._change[rows] = new_change
+        for code in np.unique(codes).tolist():
+            self._movers.pop(code, None)
+        self.updates += len(rows)
+
+    def _sector_movers(self, code: int) -> Dict[str, List[Dict]]:
+        """Up to MAX_MOVERS gainers and losers of one sector (cached until
+        one of its tickers changes)"""
+        movers = self._movers.get(code)
+        if movers is None:
+            rows = self._rows[code]
+            change = self._change[rows]
+            k = min(MAX_MOVERS, len(rows))
+            movers = {"gainers": [], "losers": []}
+            for key, sign in (("gainers", -1), ("losers", 1)):
+                if not k:
+                    break
+                # Partial selection, then order only the k picked rows
+                top = np.argpartition(sign * change, k - 1)[:k] if k < len(rows) else np.arange(k)
+                top = top[np.argsort(sign * change[top], kind="stable")]
+                top = top[sign * change[top] < 0]  # Gainers must be up, losers down
+                movers[key] = [self._mover(i) for i in rows[top].tolist()]
+            self._movers[code] = movers
+        return movers
+
+    def _mover(self, i: int) -> Dict:
+        columns = self.columns
+        return {"ticker": columns.tickers[i], "name": columns.names[i], "sector": columns.sectors[columns.sector_codes[i]],
+                "price": float(columns.price[i]), "change_percent": float(self._change[i])}
+
+    def _summary(self, cap: float, cap_change: float, count: int, advancers: int, decliners: int) -> Dict:
+        return {
+            "count": int(count),
+            "market_cap": int(cap),
+            "change_percent": round(float(cap_change / cap), 4) if cap else 0.0,
+            "advancers": int(advancers),
+            "decliners": int(decliners),
+            "unchanged": int(count - advancers - decliners),
+        }
+
+    def sectors(self, movers: int = DEFAULT_MOVERS) -> Dict:
+        """Per-sector totals, largest sector first"""
+        with self._lock:
+            total = self.cap_total.sum()
+            sectors = []
+            for code in np.argsort(-self.cap_total, kind="stable").tolist():
+                if not self.count[code]:
+                    continue
+                top = self._sector_movers(code)
+                sectors.append({
+                    "sector": self.columns.sectors[code],
+                    **self._summary(self.cap_total[code], self.cap_change[code], self.count[code],
+                                    self.advancers[code], self.decliners[code]),
+                    "weight": round(float(self.cap_total[code] / total * 100), 4) if total else 0.0,
+                    "top_gainers": top["gainers"][:movers],
+                    "top_losers": top["losers"][:movers],
+                })
+            return {"version": self.version, "count": len(sectors), "sectors": sectors}
+
+    def index(self, movers: int = DEFAULT_MOVERS) -> Dict:
+        """Whole-universe totals - sums over sectors, movers merged from the
+        per-sector lists"""
+        with self._lock:
+            gainers, losers = [], []
+            for code in np.flatnonzero(self.count).tolist():
+                top = self._sector_movers(code)
+                gainers.extend(top["gainers"])
+                losers.extend(top["losers"])
+            gainers.sort(key=lambda m: -m["change_percent"])
+            losers.sort(key=lambda m: m["change_percent"])
+            return {
+                "version": self.version,
+                **self._summary(self.cap_total.sum(), self.cap_change.sum(), self.count.sum(),
+                                self.advancers.sum(), self.decliners.sum()),
+                "sectors": int(np.count_nonzero(self.count)),
+                "top_gainers": gainers[:movers],
+                "top_losers": losers[:movers],
+            }
+
+    def encoded(self, kind: str, movers: int, cache: EncodedCache) -> EncodedBody:
+        """Encoded sectors() or index() body from cache, keyed by the version
+        it was built from - a publish cannot slip in between"""
+        build = self.sectors if kind == "sectors" else self.index
+        with self._lock:
+            return cache.get((kind, movers, self.version), lambda: build(movers))
+
+    def stats(self) -> Dict[str, int]:
+        return {"version": self.version, "updates": self.updates, "rebuilds": self.rebuilds}
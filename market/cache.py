@@ -0,0 +1,159 @@
+"""
+Quote cache - size-bounded LRU with per-entry TTL, stale-while-revalidate,
+negative caching and single-flight coalescing of upstream fetches
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+FRESH = "fresh"         # Within TTL - serve as is
+STALE = "stale"         # Past TTL but within stale window - serve and revalidate
+NEGATIVE = "negative"   # Upstream recently had no data for this key
+MISS = "miss"           # Nothing usable - fetch upstream
+
+_MISSING = object()
+
+
+class QuoteCache:
+    """Thread-safe LRU cache with per-entry expiry.
+
+    Entries live for `ttl` seconds as fresh, then `stale_ttl` more seconds as
+    stale (still served while a refresh runs). Negative entries mark keys
+    upstream does not know and expire after `negative_ttl`.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 60, stale_ttl: float = 240,
+                 negative_ttl: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+            "evictions": 0, "expirations": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: Hashable) -> Tuple[str, Any]:
+        """Return (state, value) - value is None for NEGATIVE and MISS"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return MISS, None
+
+            value, stored_at = entry
+            age = now - stored_at
+            if value is _MISSING:
+                if age < self.negative_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["negative_hits"] += 1
+                    return NEGATIVE, None
+            elif age < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return FRESH, value
+            elif age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self._stats["stale_hits"] += 1
+                return STALE, value
+
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return MISS, None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._store(key, value)
+
+    def set_missing(self, key: Hashable) -> None:
+        """Remember that upstream has no data for key (negative entry)"""
+        self._store(key, _MISSING)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+class SingleFlight:
+    """Coalesces concurrent asyncio fetches for the same keys.
+
+    Callers asking for a key that is already being fetched wait for that
+    fetch instead of starting their own. Keys the fetch did not return (or
+    whose fetch failed) resolve to absent in the result dict.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._tasks = set()  # Strong refs - the loop only keeps weak ones
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        async def fetch_one(keys):
+            return {key: await fetch()}
+        result = await self.do_many([key], fetch_one)
+        return result.get(key)
+
+    async def do_many(self, keys: List[Hashable],
+                      fetch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        loop = asyncio.get_running_loop()
+        waiting = {}
+        new_keys = []
+        for key in keys:
+            fut = self._inflight.get(key)
+            if fut is None:
+                fut = loop.create_future()
+                self._inflight[key] = fut
+                new_keys.append(key)
+            else:
+                self.coalesced += 1
+            waiting[key] = fut
+
+        if new_keys:
+            task = loop.create_task(self._run(new_keys, fetch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        results = {}
+        for key, fut in waiting.items():
+            # Shield so one cancelled caller doesn't cancel the shared fetch
+            value = await asyncio.shield(fut)
+            if value is not _MISSING:
+                results[key] = value
+        return results
+
+    async def _run(self, keys: List[Hashable], fetch) -> None:
+        values = {}
+        try:
+            values = await fetch(keys) or {}
+        except Exception as e:
+            print(f"Upstream fetch failed for {len(keys)} keys: {e!r}")
+        finally:
+            for key in keys:
+                fut = self._inflight.pop(key, None)
+                if fut is not None and not fut.done():
+                    fut.set_result(values.get(key, _MISSING))
@@ -0,0 +1,272 @@
+"""
+Columnar universe store - NumPy arrays per numeric field and interned
+categorical codes for sector, instead of one dict per stock
+"""
+
+import json
+import struct
+from dataclasses import dataclass, replace
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FIELDS = ("ticker", "name", "sector", "market_cap", "price", "change_percent", "weight")
+NUMERIC_FIELDS = ("market_cap", "price", "change_percent", "weight")
+
+BINARY_MAGIC = b"SPCOL\x00\x01\x00"   # 8 bytes - format name + version 1
+BINARY_MEDIA_TYPE = "application/vnd.sp500.columns"
+
+
+def _intern_categories(values: Iterable[str]) -> Tuple[Tuple[str, ...], np.ndarray]:
+    """(categories, codes) - categories in first-seen order"""
+    lookup: Dict[str, int] = {}
+    codes = []
+    for value in values:
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(lookup)
+        codes.append(code)
+    dtype = np.uint8 if len(lookup) <= 256 else np.uint16
+    return tuple(lookup), np.asarray(codes, dtype=dtype)
+
+
+@dataclass(frozen=True, eq=False)
+class ColumnarStore:
+    """Immutable column set for one universe state.
+
+    Strings (ticker, name) stay as Python tuples - they are the part of the
+    data that can't shrink. Numeric columns are float64 arrays (market caps
+    stay exact up to 2**53), sector is a uint8 code into `sectors`.
+    """
+    tickers: Tuple[str, ...]
+    names: Tuple[str, ...]
+    sectors: Tuple[str, ...]
+    sector_codes: np.ndarray
+    market_cap: np.ndarray
+    price: np.ndarray
+    change_percent: np.ndarray
+    weight: np.ndarray
+
+    @classmethod
+    def from_records(cls, stocks: Sequence[Dict]) -> "ColumnarStore":
+        sectors, codes = _intern_categories(s["sector"] for s in stocks)
+        return cls(
+            tickers=tuple(s["ticker"] for s in stocks),
+            names=tuple(s["name"] for s in stocks),
+            sectors=sectors,
+            sector_codes=codes,
+            market_cap=np.fromiter((s["market_cap"] for s in stocks), np.float64, len(stocks)),
+            price=np.fromiter((s["price"] for s in stocks), np.float64, len(stocks)),
+            change_percent=np.fromiter((s["change_percent"] for s in stocks), np.float64, len(stocks)),
+            weight=np.fromiter((s["weight"] for s in stocks), np.float64, len(stocks)),
+        )
+
+    @classmethod
+    def empty(cls) -> "ColumnarStore":
+        return cls.from_records([])
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    @cached_property
+    def positions(self) -> Dict[str, int]:
+        """ticker -> row"""
+        return {t: i for i, t in enumerate(self.tickers)}
+
+    @cached_property
+    def cap_order(self) -> np.ndarray:
+        """Rows by market cap, largest first"""
+        return np.argsort(-self.market_cap, kind="stable")
+
+    @cached_property
+    def sector_index(self) -> Dict[str, np.ndarray]:
+        """sector -> its rows, largest market cap first"""
+        codes = self.sector_codes[self.cap_order]
+        return {name: self.cap_order[codes == code] for code, name in enumerate(self.sectors)}
+
+    @cached_property
+    def cap_keys(self) -> Dict[Optional[str], np.ndarray]:
+        """Negated market caps of cap_order (key None) and of each
+        sector_index entry - ascending, so a cap range is two binary searches"""
+        keys = -self.market_cap[self.cap_order]
+        codes = self.sector_codes[self.cap_order]
+        return {None: keys, **{name: keys[codes == code] for code, name in enumerate(self.sectors)}}
+
+    @cached_property
+    def _ranks(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def rank(self, field: str) -> np.ndarray:
+        """Ascending sort position of every row by field (computed once per store)"""
+        ranks = self._ranks.get(field)
+        if ranks is None:
+            values = getattr(self, field) if field in NUMERIC_FIELDS else np.asarray(self._column_values(field))
+            ranks = np.empty(len(self), np.int64)
+            ranks[np.argsort(values, kind="stable")] = np.arange(len(self))
+            self._ranks[field] = ranks
+        return ranks
+
+    def take(self, rows: np.ndarray) -> "ColumnarStore":
+        """Subset store with the given rows in the given order"""
+        rows = np.asarray(rows, np.int64)
+        return replace(
+            self,
+            tickers=tuple(self.tickers[i] for i in rows.tolist()),
+            names=tuple(self.names[i] for i in rows.tolist()),
+            sector_codes=self.sector_codes[rows],
+            market_cap=self.market_cap[rows],
+            price=self.price[rows],
+            change_percent=self.change_percent[rows],
+            weight=self.weight[rows],
+        )
+
+    def with_prices(self, market_cap: np.ndarray, price: np.ndarray,
+                    change_percent: np.ndarray, weight: np.ndarray) -> "ColumnarStore":
+        """New store sharing the string columns, with new numeric columns.
+        The ticker -> row map doesn't depend on prices, so it is shared too."""
+        store = replace(self, market_cap=market_cap, price=price,
+                        change_percent=change_percent, weight=weight)
+        if "positions" in self.__dict__:
+            store.__dict__["positions"] = self.__dict__["positions"]
+        return store
+
+    def record(self, i: int) -> Dict:
+        return {
+            "ticker": self.tickers[i],
+            "name": self.names[i],
+            "sector": self.sectors[self.sector_codes[i]],
+            "market_cap": int(self.market_cap[i]),
+            "price": float(self.price[i]),
+            "change_percent": float(self.change_percent[i]),
+            "weight": float(self.weight[i]),
+        }
+
+    def to_records(self, rows: Optional[Iterable[int]] = None,
+                   fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Row dicts in the classic /api/stocks shape (all rows or a subset,
+        optionally only some fields)"""
+        if rows is None:
+            rows = range(len(self))
+        rows = np.fromiter(rows, np.int64)
+        if fields is not None:
+            return self._project(rows, fields)
+        sectors = self.sectors
+        return [
+            {"ticker": self.tickers[i], "name": self.names[i], "sector": sectors[code],
+             "market_cap": cap, "price": price, "change_percent": change, "weight": weight}
+            for i, code, cap, price, change, weight in zip(
+                rows.tolist(),
+                self.sector_codes[rows].tolist(),
+                self.market_cap[rows].astype(np.int64).tolist(),
+                self.price[rows].tolist(),
+                self.change_percent[rows].tolist(),
+                self.weight[rows].tolist(),
+            )
+        ]
+
+    def _project(self, rows: np.ndarray, fields: Sequence[str]) -> List[Dict]:
+        values = [self._column_values(field, rows) for field in fields]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+    def _column_values(self, field: str, rows: Optional[np.ndarray] = None) -> List:
+        """Plain Python values of one field, as served in JSON"""
+        if field in ("ticker", "name"):
+            values = self.tickers if field == "ticker" else self.names
+            return list(values) if rows is None else [values[i] for i in rows.tolist()]
+        if field == "sector":
+            codes = self.sector_codes if rows is None else self.sector_codes[rows]
+            return [self.sectors[c] for c in codes.tolist()]
+        values = getattr(self, field) if rows is None else getattr(self, field)[rows]
+        if field == "market_cap":
+            values = values.astype(np.int64)
+        return values.tolist()
+
+    def to_columns(self, fields: Sequence[str] = FIELDS) -> Dict:
+        """?format=columnar body - one array per field, sector as codes"""
+        columns = {}
+        for field in fields:
+            columns[field] = self.sector_codes.tolist() if field == "sector" else self._column_values(field)
+        body = {"fields": list(fields), "columns": columns}
+        if "sector" in fields:
+            body["categories"] = {"sector": list(self.sectors)}
+        return body
+
+    def to_binary(self, meta: Optional[Dict] = None) -> bytes:
+        """?format=binary body.
+
+        Layout: 8-byte magic, uint32 LE header length, JSON header, padding
+        to 8 bytes, then the numeric columns as little-endian typed arrays,
+        each 8-byte aligned. The header lists every column's dtype, byte
+        offset (relative to the padded end of the header) and length, plus
+        the string columns and sector categories - a browser reads the
+        numbers straight into Float64Array/Uint8Array views without parsing.
+        """
+        arrays = [
+            ("sector", self.sector_codes.astype(self.sector_codes.dtype.newbyteorder("<"))),
+            ("market_cap", self.market_cap.astype("<f8")),
+            ("price", self.price.astype("<f8")),
+            ("change_percent", self.change_percent.astype("<f8")),
+            ("weight", self.weight.astype("<f8")),
+        ]
+        columns = []
+        cursor = 0
+        for name, array in arrays:
+            columns.append({"name": name, "dtype": array.dtype.str, "offset": cursor, "length": len(array)})
+            cursor = _align(cursor + array.nbytes)
+
+        header = json.dumps({
+            **(meta or {}),
+            "count": len(self),
+            "ticker": list(self.tickers),
+            "name": list(self.names),
+            "categories": {"sector": list(self.sectors)},
+            "columns": columns,
+        }, separators=(",", ":")).encode()
+
+        out = bytearray(BINARY_MAGIC + struct.pack("<I", len(header)) + header)
+        data_start = _align(len(out))
+        for col, (_, array) in zip(columns, arrays):
+            out.extend(b"\x00" * (data_start + col["offset"] - len(out)))
+            out.extend(array.tobytes())
+        return bytes(out)
+
+
+    @classmethod
+    def from_binary(cls, body) -> Tuple["ColumnarStore", Dict]:
+        """(store, header meta) from a to_binary() body. Numeric columns are
+        zero-copy, read-only views - over an mmap they are never read into
+        memory until used."""
+        header, arrays = read_binary(body)
+        store = cls(
+            tickers=tuple(header["ticker"]),
+            names=tuple(header["name"]),
+            sectors=tuple(header["categories"]["sector"]),
+            sector_codes=arrays["sector"],
+            market_cap=arrays["market_cap"],
+            price=arrays["price"],
+            change_percent=arrays["change_percent"],
+            weight=arrays["weight"],
+        )
+        meta = {k: v for k, v in header.items() if k not in ("ticker", "name", "categories", "columns")}
+        return store, meta
+
+
+def _align(n: int, to: int = 8) -> int:
+    return (n + to - 1) // to * to
+
+
+def read_binary(body: bytes) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """Decode a to_binary() body - (header, numeric columns as zero-copy views)"""
+    if body[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError("Not a columnar body")
+    (size,) = struct.unpack_from("<I", body, len(BINARY_MAGIC))
+    start = len(BINARY_MAGIC) + 4
+    header = json.loads(bytes(body[start:start + size]))
+    data_start = _align(start + size)
+    columns = {
+        col["name"]: np.frombuffer(body, dtype=np.dtype(col["dtype"]), count=col["length"],
+                                   offset=data_start + col["offset"])
+        for col in header["columns"]
+    }
+    return header, columns
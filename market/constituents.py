@@ -0,0 +1,131 @@
+"""
+S&P 500 constituents - the Wikipedia fetch and the build-time snapshot that
+ships with the serverless functions, so a request never waits on Wikipedia
+
+    python -m market.constituents              # rebuild from Wikipedia
+    python -m market.constituents --fallback   # rebuild from frontend fallback data
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from market.synthetic import DEFAULT_SEED, companies_universe, estimate_caps
+from market.wikitable import iter_rows
+
+WIKIPEDIA_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "constituents.json")
+FALLBACK_JS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "src", "data", "fallbackData.js"
+)
+
+
+def parse_companies(chunks: Iterable[bytes]) -> List[Dict]:
+    """ticker / name / sector of every constituent from chunks of the Wikipedia page"""
+    return [
+        {"ticker": row['Symbol'].replace('.', '-'), "name": row['Security'], "sector": row['GICS Sector']}
+        for row in iter_rows(chunks)
+        if row.get('Symbol')
+    ]
+
+
+def fetch_companies(timeout: float = 8) -> List[Dict]:
+    """Constituents straight from Wikipedia (via the default provider) - rows
+    are parsed while the page streams in, and the download stops once the
+    table is complete"""
+    from market.providers import default_provider
+    return default_provider().companies(timeout)
+
+
+def build_stocks(companies: List[Dict], seed: Optional[int] = DEFAULT_SEED) -> List[Dict]:
+    """Stock records with known or estimated market caps and reference prices -
+    the same seeded universe the API builds for these companies"""
+    return companies_universe(estimate_caps(companies, seed), seed).to_records()
+
+
+def fetch_sp500() -> Optional[List[Dict]]:
+    """Fresh stock list from Wikipedia, or None when it can't be fetched"""
+    try:
+        return build_stocks(fetch_companies())
+    except Exception as e:
+        print(f"Wikipedia fetch failed: {e}")
+        return None
+
+
+_JS_ROW = re.compile(
+    r'ticker: ("(?:[^"\\]|\\.)*"), name: ("(?:[^"\\]|\\.)*"), sector: ("(?:[^"\\]|\\.)*"), '
+    r'market_cap: (\d+), price: ([-\d.]+), change_percent: ([-\d.]+), weight: ([-\d.]+)'
+)
+
+
+def _js_string(literal: str) -> str:
+    return re.sub(r'\\(.)', r'\1', literal[1:-1])
+
+
+def parse_fallback_js(text: str) -> List[Dict]:
+    """Stock records from frontend/src/data/fallbackData.js"""
+    return [
+        {
+            "ticker": _js_string(m[1]), "name": _js_string(m[2]), "sector": _js_string(m[3]),
+            "market_cap": int(m[4]), "price": float(m[5]),
+            "change_percent": float(m[6]), "weight": float(m[7])
+        }
+        for m in _JS_ROW.finditer(text)
+    ]
+
+
+def load_snapshot(path: str = SNAPSHOT_FILE) -> Optional[Dict]:
+    """{"stocks", "generated_at", "source"} or None when missing/unreadable"""
+    try:
+        with open(path, 'rb') as f:
+            snapshot = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        print(f"Constituents snapshot unavailable: {e}")
+        return None
+    return snapshot if snapshot.get("stocks") else None
+
+
+def write_snapshot(stocks: List[Dict], source: str, path: str = SNAPSHOT_FILE) -> None:
+    """Write the snapshot atomically - readers never see a half-written file"""
+    snapshot = {"generated_at": datetime.now().isoformat(), "source": source, "count": len(stocks), "stocks": stocks}
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the constituents snapshot")
+    parser.add_argument("--fallback", action="store_true", help="build from the frontend fallback data")
+    parser.add_argument("--out", default=SNAPSHOT_FILE)
+    args = parser.parse_args(argv)
+
+    if args.fallback:
+        with open(FALLBACK_JS) as f:
+            stocks, source = parse_fallback_js(f.read()), "fallback"
+    else:
+        stocks, source = fetch_sp500(), "wikipedia"
+    if not stocks or len(stocks) < 400:
+        print(f"Refusing to write a snapshot with {len(stocks or [])} stocks")
+        return 1
+
+    write_snapshot(stocks, source, args.out)
+    print(f"Wrote {len(stocks)} stocks ({source}) to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Rolling return correlations - each ticker's k most correlated peers over
+the last `window` daily log returns from the history store.
+
+The co-moment matrix is kept as running sums, so a new daily bar costs two
+rank-1 updates (add the new return vector, drop the oldest) instead of a
+recomputation over the whole window. Correlations are formed and ranked a
+block of rows at a time, with argpartition instead of a full sort.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market.history import HistoryStore
+
+DEFAULT_K = 5
+MAX_K = 50
+DEFAULT_WINDOW = 60       # Trading days, ~3 months
+MIN_WINDOW, MAX_WINDOW = 5, 1260
+BLOCK = 512               # Rows of the correlation matrix formed at once
+INCREMENTAL_LIMIT = 3000  # Tickers up to which the n x n co-moment matrix is kept
+PAD = 5                   # Extra bars read per ticker when building the calendar
+
+
+def aligned_closes(store: HistoryStore, tickers: Sequence[str], dates: np.ndarray) -> np.ndarray:
+    """(len(dates), n) closes, each the ticker's last close at or before the
+    date (NaN before its first bar) - tickers missing a day keep the
+    previous close, i.e. a zero return"""
+    closes = np.full((len(dates), len(tickers)), np.nan)
+    for c, ticker in enumerate(tickers):
+        bars = store.load(ticker)
+        if bars is None or not len(bars):
+            continue
+        idx = np.searchsorted(bars["t"], dates, "right") - 1
+        found = idx >= 0
+        closes[found, c] = bars["close"][idx[found]]
+    return closes
+
+
+def recent_dates(store: HistoryStore, tickers: Sequence[str], count: int) -> np.ndarray:
+    """The last `count` bar times across all tickers"""
+    recent = []
+    for ticker in tickers:
+        bars = store.load(ticker)
+        if bars is not None and len(bars):
+            recent.append(np.asarray(bars["t"][-(count + PAD):]))
+    if not recent:
+        return np.empty(0, np.int64)
+    return np.unique(np.concatenate(recent))[-count:]
+
+
+class RollingCorrelation:
+    """Correlations of n return series over a rolling window.
+
+    Returns live in a (window, n) ring buffer next to their running sums,
+    sums of squares and - up to INCREMENTAL_LIMIT tickers - the n x n sum
+    of cross products. Larger universes recompute cross products per row
+    block from the buffer when ranking.
+    """
+
+    def __init__(self, tickers: Sequence[str], window: int):
+        self.tickers = tuple(tickers)
+        self.window = window
+        n = len(self.tickers)
+        self.returns = np.zeros((window, n))
+        self.head = 0                # Ring slot of the oldest return
+        self.sum = np.zeros(n)
+        self.sq = np.zeros(n)
+        self.cross: Optional[np.ndarray] = None
+        self.valid = np.zeros(n, bool)
+        self.last_t: Optional[int] = None
+        self.last_close = np.full(n, np.nan)
+        self.version = 0
+        self.appends = 0
+        self.rebuilds = 0
+
+    def reset(self, dates: np.ndarray, closes: np.ndarray) -> None:
+        """Start over from window + 1 aligned closes"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.log(closes[1:] / closes[:-1])
+        # A ticker needs a close on every date of the window to take part
+        self.valid = ~np.isnan(returns).any(axis=0)
+        self.returns = np.where(self.valid, returns, 0.0)
+        self.head = 0
+        self.last_t = int(dates[-1])
+        self.last_close = closes[-1].copy()
+        self._rebase()
+        self.rebuilds += 1
+        self.version += 1
+
+    def _rebase(self) -> None:
+        """Sums from the buffer - also undoes float drift of the updates"""
+        self.sum = self.returns.sum(axis=0)
+        self.sq = (self.returns * self.returns).sum(axis=0)
+        self.cross = self.returns.T @ self.returns if len(self.tickers) <= INCREMENTAL_LIMIT else None
+
+    def append(self, t: int, close: np.ndarray) -> None:
+        """Slide the window by one bar - O(n^2) instead of O(window * n^2)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.log(close / self.last_close)
+        self.valid &= ~np.isnan(r)
+        r = np.where(self.valid, r, 0.0)
+        old = self.returns[self.head].copy()
+        self.returns[self.head] = r
+        self.head = (self.head + 1) % self.window
+
+        self.sum += r - old
+        self.sq += r * r - old * old
+        if self.cross is not None:
+            # Rank-2 update in one matmul: + r r^T - old old^T
+            self.cross += np.column_stack([r, old]) @ np.vstack([r, -old])
+        self.last_t = int(t)
+        self.last_close = np.where(np.isnan(close), self.last_close, close)
+        self.appends += 1
+        if self.appends % self.window == 0:
+            self._rebase()
+        self.version += 1
+
+    def correlation_rows(self, lo: int, hi: int) -> np.ndarray:
+        """Rows lo:hi of the correlation matrix (NaN for invalid tickers)"""
+        w = self.window
+        if self.cross is not None:
+            cross = self.cross[lo:hi]
+        else:
+            cross = self.returns[:, lo:hi].T @ self.returns
+        cov = cross - np.outer(self.sum[lo:hi], self.sum) / w
+        var = np.maximum(self.sq - self.sum * self.sum / w, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.sqrt(np.outer(var[lo:hi], var))
+        corr[~self.valid[lo:hi]] = np.nan
+        corr[:, ~self.valid] = np.nan
+        return corr
+
+    def top_k(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(peers, correlations), both (n, k) and best first. Rows of
+        invalid tickers (and missing peers) have peer -1 and NaN."""
+        n = len(self.tickers)
+        k = max(0, min(k, n - 1))
+        peers = np.full((n, k), -1, np.int64)
+        values = np.full((n, k), np.nan)
+        if not k:
+            return peers, values
+        for lo in range(0, n, BLOCK):
+            hi = min(lo + BLOCK, n)
+            corr = self.correlation_rows(lo, hi)
+            corr[np.arange(hi - lo), np.arange(lo, hi)] = np.nan  # Not your own peer
+            score = np.where(np.isnan(corr), -np.inf, corr)
+            # Partial selection of the k best per row, then order just those
+            part = np.argpartition(-score, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(score, part, axis=1)
+            order = np.argsort(-best, axis=1, kind="stable")
+            part = np.take_along_axis(part, order, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            found = np.isfinite(best)
+            peers[lo:hi] = np.where(found, part, -1)
+            values[lo:hi] = np.where(found, best, np.nan)
+        return peers, values
+
+    def payload(self, k: int) -> Dict:
+        peers, values = self.top_k(k)
+        neighbours = {}
+        links = {}
+        for i, ticker in enumerate(self.tickers):
+            row = [(int(p), round(float(v), 4)) for p, v in zip(peers[i], values[i]) if p >= 0]
+            if not row:
+                continue
+            neighbours[ticker] = [{"ticker": self.tickers[p], "corr": v} for p, v in row]
+            for p, v in row:
+                links[(min(i, p), max(i, p))] = v
+        return {
+            "window": self.window,
+            "k": k,
+            "as_of": self.last_t,
+            "count": len(neighbours),
+            "neighbours": neighbours,
+            "links": [{"source": self.tickers[a], "target": self.tickers[b], "corr": v}
+                      for (a, b), v in sorted(links.items())],
+        }
+
+    def stats(self) -> Dict:
+        return {"tickers": len(self.tickers), "valid": int(self.valid.sum()), "as_of": self.last_t,
+                "appends": self.appends, "rebuilds": self.rebuilds, "incremental": self.cross is not None}
+
+
+class CorrelationIndex:
+    """One RollingCorrelation per window, kept in step with the history
+    store: bars newer than the engine's last date are appended one by one,
+    anything else (other tickers, a rewritten past) rebuilds it."""
+
+    def __init__(self, store: HistoryStore, maxsize: int = 8):
+        self.store = store
+        self.maxsize = maxsize
+        self._engines: "OrderedDict[int, Tuple[Tuple, RollingCorrelation]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def engine(self, tickers: Sequence[str], window: int) -> RollingCorrelation:
+        """The window's engine, up to date with the store - blocking. The
+        engine keeps changing under later calls; read it through use()."""
+        with self._lock:
+            return self._update(tickers, window)
+
+    def use(self, tickers: Sequence[str], window: int, fn: Callable[[RollingCorrelation], Any]) -> Any:
+        """fn(engine) on the up-to-date engine with the index lock held, so
+        no other request appends bars while fn reads it - blocking"""
+        with self._lock:
+            return fn(self._update(tickers, window))
+
+    def _update(self, tickers: Sequence[str], window: int) -> RollingCorrelation:
+        tickers = tuple(t for t in tickers if self.store.has(t))
+        versions = tuple(self.store.version(t) for t in tickers)
+        signature, engine = self._engines.get(window, (None, None))
+        if engine is not None and signature == versions and engine.tickers == tickers:
+            self._engines.move_to_end(window)
+            return engine
+
+        dates = recent_dates(self.store, tickers, window + 1)
+        if engine is not None and engine.tickers == tickers and engine.last_t is not None:
+            new = dates[dates > engine.last_t]
+            if 0 < len(new) < window and engine.last_t in dates:
+                for t in new.tolist():
+                    engine.append(t, aligned_closes(self.store, tickers, np.array([t]))[0])
+            else:
+                engine = None
+        else:
+            engine = None
+
+        if engine is None:
+            engine = RollingCorrelation(tickers, window)
+            if len(dates) == window + 1:
+                engine.reset(dates, aligned_closes(self.store, tickers, dates))
+        self._engines[window] = (versions, engine)
+        self._engines.move_to_end(window)
+        while len(self._engines) > self.maxsize:
+            self._engines.popitem(last=False)
+        return engine
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {str(window): engine.stats() for window, (_, engine) in self._engines.items()}
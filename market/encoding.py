@@ -0,0 +1,134 @@
+"""
+Pre-encoded JSON responses - encode a payload once, keep gzip/brotli
+variants and a strong ETag next to it, and answer conditional requests
+with 304 without touching the payload again
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional - br is simply not offered without it
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(payload: Any) -> bytes:
+    """Compact JSON bytes - orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), default=str).encode()
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    """One payload in every content-coding we serve, plus its ETag"""
+    identity: bytes
+    gzip: bytes
+    br: Optional[bytes]
+    etag: str
+
+    def variant(self, accept_encoding: str) -> Tuple[bytes, Optional[str], str]:
+        """(body, content-encoding, etag) best matching the Accept-Encoding header.
+
+        Each coding gets its own strong ETag (suffix inside the quotes) as
+        RFC 9110 requires; matches_etag() accepts any of them.
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        if self.br is not None and accepted.get("br", 0) > 0:
+            return self.br, "br", self.etag[:-1] + '-br"'
+        if accepted.get("gzip", 0) > 0:
+            return self.gzip, "gzip", self.etag[:-1] + '-gzip"'
+        return self.identity, None, self.etag
+
+    def matches_etag(self, if_none_match: Optional[str]) -> bool:
+        """True when If-None-Match names this payload (any coding variant)"""
+        if not if_none_match:
+            return False
+        base = self.etag[1:-1]
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag == base or tag.startswith(base + "-"):
+                return True
+        return False
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """{coding: q} from an Accept-Encoding header"""
+    codings = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[name] = q
+    return codings
+
+
+def encode_payload(payload: Any) -> EncodedBody:
+    """Encode payload (JSON-able object, or ready bytes) in every coding"""
+    identity = payload if isinstance(payload, bytes) else dumps(payload)
+    etag = '"' + hashlib.blake2b(identity, digest_size=16).hexdigest() + '"'
+    return EncodedBody(
+        identity=identity,
+        # mtime=0 keeps the gzip bytes identical for identical payloads
+        gzip=gzip.compress(identity, compresslevel=GZIP_LEVEL, mtime=0),
+        br=brotli.compress(identity, quality=BROTLI_QUALITY) if brotli is not None else None,
+        etag=etag
+    )
+
+
+class EncodedCache:
+    """Small LRU of EncodedBody keyed by e.g. (route, snapshot version)"""
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, EncodedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> EncodedBody:
+        """Cached encoding for key - build() returns the payload on a miss"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+
+        body = encode_payload(build())
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return body
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,82 @@
+"""
+Bounded executor for blocking upstream I/O (yfinance, Wikipedia) so slow
+responses never stall the asyncio event loop
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class UpstreamExecutor:
+    """Runs blocking calls on a dedicated thread pool.
+
+    At most `max_concurrency` calls are running or queued at once; callers
+    beyond that wait for a slot. Every call has a deadline - when it passes
+    the caller gets TimeoutError while the thread finishes in the background
+    (its slot is only released once it really completes, so hung upstream
+    calls can't pile up unbounded threads).
+    """
+
+    def __init__(self, max_workers: int = 8, max_concurrency: Optional[int] = None,
+                 timeout: float = 10.0):
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.timeouts = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = loop.time() + timeout
+        slots = self._semaphore()
+
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+        def release_slot():
+            self.running -= 1
+            slots.release()
+
+        def release(_):
+            # Runs on the worker thread - hand the bookkeeping back to the loop
+            try:
+                loop.call_soon_threadsafe(release_slot)
+            except RuntimeError:
+                pass  # Loop already closed (shutdown)
+
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        self.running += 1
+        future.add_done_callback(release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "timeouts": self.timeouts
+        }
@@ -0,0 +1,374 @@
+"""
+Constellation graph - the nodes, sector links and log-scaled sizes that
+ConstellationGraph.jsx builds, laid out server-side by a vectorised force
+simulation so clients can render without any warmup ticks
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from market.columnar import ColumnarStore
+
+LARGE_GRAPH = 100         # Node count above which the frontend switches to "full index" styling
+HUB_LINKS = 8             # Star links per sector hub in a large graph
+ALPHA_MIN = 0.001
+ALPHA_DECAY = 0.05        # d3AlphaDecay in the frontend
+VELOCITY_DECAY = 0.4      # d3VelocityDecay
+COLD_TICKS = 150          # The frontend's warmupTicks for a large graph
+WARM_TICKS = 30           # Re-settle after a price update from the previous layout
+WARM_ALPHA = 0.1
+INITIAL_RADIUS = 10       # d3's phyllotaxis placement for nodes without a position
+INITIAL_ANGLE = np.pi * (3 - np.sqrt(5))
+EXACT_LIMIT = 1000        # Nodes above which distant charge is approximated per grid cell
+FAR_CELL = 40             # Grid cell side for that approximation
+SKIN = 20                 # Neighbour list margin - rebuilt after a node moves SKIN / 2
+
+
+@dataclass(frozen=True)
+class Forces:
+    """Force parameters - the values the frontend configured on d3-force"""
+    charge: float
+    distance_max: Optional[float]  # Charge cutoff, None = every pair
+    collide_padding: float
+    collide_strength: float
+    center: float
+    link_distance: float
+    link_strength: float
+
+    @classmethod
+    def for_size(cls, n: int) -> "Forces":
+        if n > LARGE_GRAPH:
+            return cls(-60, 200, 1, 0.95, 0.02, 60, 0.02)
+        return cls(-30, None, 2, 0.95, 0.015, 80, 0.03)
+
+
+@dataclass(frozen=True, eq=False)
+class Graph:
+    """Nodes are universe rows; links index into `rows`"""
+    rows: np.ndarray
+    size: np.ndarray
+    source: np.ndarray
+    target: np.ndarray
+    opacity: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def build_graph(columns: ColumnarStore, sector: Optional[str] = None) -> Graph:
+    """Nodes and links for the universe or one sector.
+
+    Sizes are log-scaled between the smallest and largest cap. In every
+    sector the largest company links to the next ones (star) and those are
+    chained by a few cross-links - the same pattern the frontend draws.
+    """
+    if sector is None:
+        rows = np.arange(len(columns))
+    else:
+        rows = np.sort(columns.sector_index.get(sector, np.empty(0, np.int64)))
+    caps = columns.market_cap[rows]
+    positive = caps[caps > 0]
+    if not len(positive):
+        empty = np.empty(0, np.int64)
+        return Graph(empty, np.empty(0), empty, empty, np.empty(0))
+
+    large = len(rows) > LARGE_GRAPH
+    log_min, log_max = np.log(positive.min()), np.log(positive.max())
+    log_cap = np.log(np.where(caps > 0, caps, 1))
+    scaled = (log_cap - log_min) / (log_max - log_min) if log_max > log_min else np.full(len(rows), 0.5)
+    min_size, max_size = (2, 18) if large else (3, 32)
+    size = min_size + scaled * (max_size - min_size)
+
+    # Nodes grouped by sector, cap descending within each group
+    codes = columns.sector_codes[rows]
+    order = np.lexsort((-caps, codes))
+    starts = np.flatnonzero(np.r_[True, codes[order][1:] != codes[order][:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+    count = np.repeat(counts, counts)
+    hub = order[np.repeat(starts, counts)]
+
+    star = (rank >= 1) & (rank <= (np.minimum(count - 1, HUB_LINKS) if large else count - 1))
+    cross = (rank >= 1) & (rank < np.minimum(count - 1, (2 if large else 4) + 1))
+    source = np.r_[hub[star], order[cross]]
+    target = np.r_[order[star], order[np.flatnonzero(cross) + 1]]
+    opacity = np.r_[np.full(star.sum(), 0.35), np.full(cross.sum(), 0.2)]
+    return Graph(rows, size, source, target, opacity)
+
+
+def initial_positions(n: int) -> np.ndarray:
+    """d3's default placement - a phyllotaxis spiral around the origin"""
+    i = np.arange(n)
+    radius = INITIAL_RADIUS * np.sqrt(0.5 + i)
+    angle = i * INITIAL_ANGLE
+    return np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+
+
+def _cell_pairs(pos: np.ndarray, cutoff: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs (i, j), i < j, in the same or adjacent grid cells of side
+    `cutoff` - a superset of the pairs closer than cutoff, found without
+    looking at all n^2 pairs"""
+    cell = np.floor(pos / cutoff).astype(np.int64)
+    cell -= cell.min(axis=0)
+    height = int(cell[:, 1].max()) + 3
+    ids = (cell[:, 0] + 1) * height + cell[:, 1] + 1  # Border of empty cells all round
+
+    order = np.argsort(ids, kind="stable")
+    occupied, starts, counts = np.unique(ids[order], return_index=True, return_counts=True)
+    first, second = [], []
+    # Half of the 8 neighbours - every adjacent cell pair is visited once
+    for offset in (0, 1, height - 1, height, height + 1):
+        j = np.minimum(np.searchsorted(occupied, occupied + offset), len(occupied) - 1)
+        found = occupied[j] == occupied + offset
+        a_start, b_start, b_count = starts[found], starts[j[found]], counts[j[found]]
+        sizes = counts[found] * b_count
+
+        # Cartesian product of the members of each cell pair
+        cell_pair = np.repeat(np.arange(len(sizes)), sizes)
+        local = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        a = order[a_start[cell_pair] + local // b_count[cell_pair]]
+        b = order[b_start[cell_pair] + local % b_count[cell_pair]]
+        if offset == 0:
+            keep = a < b
+            a, b = a[keep], b[keep]
+        first.append(a)
+        second.append(b)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def _far_field(pos: np.ndarray, side: float, cutoff: float) -> np.ndarray:
+    """Barnes-Hut style approximation of sum_j (p_j - p_i) / |p_j - p_i|^2
+    over the nodes j within cutoff that are not in i's or an adjacent cell:
+    every grid cell acts as one body of its node count at its centroid, and
+    all nodes of a cell share the result computed at their centroid."""
+    cell = np.floor(pos / side).astype(np.int64)
+    cell -= cell.min(axis=0)
+    ring = int(np.ceil(cutoff / side)) + 1
+    height = int(cell[:, 1].max()) + 2 * ring + 1
+    ids = (cell[:, 0] + ring) * height + cell[:, 1] + ring
+    occupied, inverse, counts = np.unique(ids, return_inverse=True, return_counts=True)
+    centroid = np.column_stack([np.bincount(inverse, pos[:, 0]), np.bincount(inverse, pos[:, 1])]) / counts[:, None]
+
+    dx, dy = np.meshgrid(np.arange(-ring, ring + 1), np.arange(-ring, ring + 1))
+    far = np.maximum(np.abs(dx), np.abs(dy)) >= 2
+    offsets = (dx * height + dy)[far]
+    targets = occupied[:, None] + offsets[None, :]
+    index = np.minimum(np.searchsorted(occupied, targets), len(occupied) - 1)
+    a, k = np.nonzero(occupied[index] == targets)
+    b = index[a, k]
+
+    d = centroid[b] - centroid[a]
+    d2 = (d * d).sum(axis=1)
+    within = d2 < cutoff * cutoff
+    a, b, d, d2 = a[within], b[within], d[within], d2[within]
+    w = counts[b] / d2
+    m = len(occupied)
+    field = np.column_stack([np.bincount(a, d[:, 0] * w, m), np.bincount(a, d[:, 1] * w, m)])
+    return field[inverse]
+
+
+def _neighbours(pos: np.ndarray, reach: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs closer than reach (every pair when reach is None)"""
+    n = len(pos)
+    if reach is None or n <= 2 * LARGE_GRAPH:
+        i, j = np.triu_indices(n, 1)
+    else:
+        i, j = _cell_pairs(pos, reach)
+    if reach is not None:
+        d = pos[j] - pos[i]
+        near = (d * d).sum(axis=1) < reach * reach
+        i, j = i[near], j[near]
+    return i, j
+
+
+def simulate(graph: Graph, pos: np.ndarray, ticks: int, alpha: float = 1.0,
+             forces: Optional[Forces] = None) -> np.ndarray:
+    """Run up to `ticks` iterations of the frontend's d3-force setup (link,
+    charge with cutoff, collide, x/y centering) on all nodes at once.
+
+    Up to EXACT_LIMIT nodes, charge and collision use a neighbour list built
+    with a cell grid at cutoff + SKIN and rebuilt once some node has moved
+    more than SKIN / 2 - exact for the cutoff. Larger graphs take exact
+    pairs only from adjacent FAR_CELL-sized cells and the rest of the
+    charge from _far_field. Stops early once alpha falls below ALPHA_MIN.
+    """
+    n = len(graph)
+    forces = forces or Forces.for_size(n)
+    pos = np.array(pos, np.float64)
+    if n < 2:
+        return pos
+    x, y = pos[:, 0].copy(), pos[:, 1].copy()
+    vx, vy = np.zeros(n), np.zeros(n)
+
+    s, t = graph.source, graph.target
+    degree = np.bincount(s, minlength=n) + np.bincount(t, minlength=n)
+    bias = degree[s] / (degree[s] + degree[t])
+    radius = graph.size + forces.collide_padding
+    area = radius ** 2
+    cutoff = forces.distance_max
+    cutoff2 = np.inf if cutoff is None else cutoff ** 2
+    approximate = cutoff is not None and n > EXACT_LIMIT
+    if approximate:
+        side = max(FAR_CELL, 2 * radius.max() + SKIN)
+    else:
+        # The list has to cover the charge cutoff and the largest collision distance
+        reach = None if cutoff is None else max(cutoff, 2 * radius.max()) + SKIN
+    anchor_x, anchor_y, i, j = x, y, None, None
+
+    for _ in range(ticks):
+        if alpha < ALPHA_MIN:
+            break
+        alpha += -alpha * ALPHA_DECAY
+
+        if approximate:
+            pos = np.column_stack([x, y])
+            i, j = _cell_pairs(pos, side)
+            cx, cy = (_far_field(pos, side, cutoff) * (forces.charge * alpha)).T
+        else:
+            if i is None or (reach is not None and
+                             np.max((x - anchor_x) ** 2 + (y - anchor_y) ** 2) > (SKIN / 2) ** 2):
+                anchor_x, anchor_y = x.copy(), y.copy()
+                i, j = _neighbours(np.column_stack([x, y]), reach)
+            cx = cy = 0.0
+        rsum = radius[i] + radius[j]
+        weight_i = area[j] / (area[i] + area[j])
+
+        # Links pull towards link_distance, split by node degree like d3
+        dx = x[t] + vx[t] - x[s] - vx[s]
+        dy = y[t] + vy[t] - y[s] - vy[s]
+        k = (1 - forces.link_distance / np.maximum(np.hypot(dx, dy), 1e-6)) * alpha * forces.link_strength
+        dx *= k
+        dy *= k
+        vx += np.bincount(s, dx * (1 - bias), n) - np.bincount(t, dx * bias, n)
+        vy += np.bincount(s, dy * (1 - bias), n) - np.bincount(t, dy * bias, n)
+
+        # Repulsion ~ 1/distance within the cutoff (d3's distanceMin = 1)
+        dx = x[j] - x[i]
+        dy = y[j] - y[i]
+        d2 = np.maximum(dx * dx + dy * dy, 1.0)
+        k = np.where(d2 < cutoff2, forces.charge * alpha / d2, 0.0)
+        fx, fy = dx * k, dy * k
+        cx = cx + np.bincount(i, fx, n) - np.bincount(j, fx, n)
+        cy = cy + np.bincount(i, fy, n) - np.bincount(j, fy, n)
+
+        # Collisions on predicted positions, weighted by the other node's area
+        ax, ay = x + vx, y + vy
+        dx = ax[i] - ax[j]
+        dy = ay[i] - ay[j]
+        dist = np.hypot(dx, dy)
+        hit = np.flatnonzero(dist < rsum)
+        if len(hit):
+            hi, hj, wi = i[hit], j[hit], weight_i[hit]
+            k = (rsum[hit] - np.maximum(dist[hit], 1e-6)) / np.maximum(dist[hit], 1e-6) * forces.collide_strength
+            px, py = dx[hit] * k, dy[hit] * k
+            cx += np.bincount(hi, px * wi, n) - np.bincount(hj, px * (1 - wi), n)
+            cy += np.bincount(hi, py * wi, n) - np.bincount(hj, py * (1 - wi), n)
+
+        vx = (vx + cx - x * (forces.center * alpha)) * (1 - VELOCITY_DECAY)
+        vy = (vy + cy - y * (forces.center * alpha)) * (1 - VELOCITY_DECAY)
+        x = x + vx
+        y = y + vy
+    return np.column_stack([x, y])
+
+
+def node_colors(change_percent: np.ndarray) -> List[str]:
+    """Green/red by daily change, brighter up to +-3% (as in the frontend)"""
+    shade = np.floor(150 + np.minimum(np.abs(change_percent) / 3, 1) * 105).astype(int).tolist()
+    return [
+        f"rgb(0, {c}, 0)" if p > 0 else f"rgb({c}, 0, 0)" if p < 0 else "#808080"
+        for p, c in zip(change_percent.tolist(), shade)
+    ]
+
+
+def graph_payload(columns: ColumnarStore, graph: Graph, pos: np.ndarray) -> Dict:
+    """Nodes (with x/y) and links in the shape react-force-graph takes"""
+    rows = graph.rows
+    tickers = [columns.tickers[i] for i in rows.tolist()]
+    codes = columns.sector_codes[rows].tolist()
+    change = columns.change_percent[rows]
+    nodes = [
+        {"id": ticker, "name": columns.names[i], "ticker": ticker, "sector": columns.sectors[code],
+         "marketCap": cap, "price": price, "changePercent": pct, "weight": weight,
+         "size": round(size, 2), "color": color, "x": round(x, 2), "y": round(y, 2)}
+        for ticker, i, code, cap, price, pct, weight, size, color, (x, y) in zip(
+            tickers, rows.tolist(), codes, columns.market_cap[rows].tolist(),
+            columns.price[rows].tolist(), change.tolist(), columns.weight[rows].tolist(),
+            graph.size.tolist(), node_colors(change), pos.tolist(),
+        )
+    ]
+    links = [
+        {"source": tickers[s], "target": tickers[t], "sector": columns.sectors[codes[s]], "opacity": o}
+        for s, t, o in zip(graph.source.tolist(), graph.target.tolist(), graph.opacity.tolist())
+    ]
+    return {"nodes": nodes, "links": links}
+
+
+class LayoutCache:
+    """Latest layout per sector filter, used as the starting point for the
+    next snapshot version - after a price update only sizes, colours and
+    maybe a hub link change, so a few ticks from the old positions settle
+    the graph instead of a cold start from the spiral.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._layouts: "OrderedDict[Hashable, Tuple[int, Dict[str, Tuple[float, float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cold = 0
+        self.warm = 0
+        self.ticks = 0
+
+    def layout(self, columns: ColumnarStore, version: int, sector: Optional[str]) -> Tuple[Graph, np.ndarray, bool]:
+        """(graph, positions, warm_started) for the universe or one sector"""
+        graph = build_graph(columns, sector)
+        tickers = [columns.tickers[i] for i in graph.rows.tolist()]
+        with self._lock:
+            previous = self._layouts.get(sector)
+
+        pos = initial_positions(len(graph))
+        warm = previous is not None and len(graph) > 0
+        if warm:
+            known = previous[1]
+            hit = np.fromiter((t in known for t in tickers), bool, len(tickers))
+            warm = bool(hit.mean() >= 0.5)
+            if warm:
+                # New tickers start at the spiral slot of their row - near the centre
+                pos[hit] = [known[t] for t, h in zip(tickers, hit.tolist()) if h]
+        if not warm:
+            ticks = COLD_TICKS
+        elif previous[0] == version and hit.all():
+            ticks = 0  # Same snapshot, e.g. evicted from the encoded cache
+        else:
+            ticks = WARM_TICKS
+        pos = simulate(graph, pos, ticks, alpha=WARM_ALPHA if warm else 1.0)
+
+        with self._lock:
+            current = self._layouts.get(sector)
+            if current is None or current[0] <= version:
+                self._layouts[sector] = (version, dict(zip(tickers, map(tuple, pos.tolist()))))
+                self._layouts.move_to_end(sector)
+                while len(self._layouts) > self.maxsize:
+                    self._layouts.popitem(last=False)
+            self.ticks += ticks
+            if warm:
+                self.warm += 1
+            else:
+                self.cold += 1
+        return graph, pos, warm
+
+    def payload(self, columns: ColumnarStore, version: int, sector: Optional[str]) -> Dict:
+        graph, pos, warm = self.layout(columns, version, sector)
+        return {
+            **graph_payload(columns, graph, pos),
+            "sector": sector or "All",
+            "count": len(graph),
+            "version": version,
+            "warm_start": warm,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"layouts": len(self._layouts), "cold": self.cold, "warm": self.warm, "ticks": self.ticks}
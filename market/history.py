@@ -0,0 +1,341 @@
+"""
+Historical OHLCV store - one memory-mapped .npy file per ticker, sorted by
+time, so a date range is two binary searches and a slice; charts get an
+LTTB-downsampled series instead of every bar
+
+    python -m market.history ingest AAPL MSFT      # yf.download into HISTORY_DIR
+    python -m market.history ingest --all --stub   # offline: seeded random walks
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from market.quotes import closes_for, parse_tickers
+
+BAR = np.dtype([
+    ("t", "<i8"),        # Bar open, unix seconds (UTC)
+    ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+    ("volume", "<f8"),
+])
+FIELDS = BAR.names
+
+INTERVALS = {"1d": None, "1wk": "W", "1mo": "M"}
+DEFAULT_PERIOD = "10y"
+TOP_UP_PERIOD = "1mo"  # Fetched for tickers whose stored bars fell behind
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+CHUNK_SIZE = 50  # Tickers per yf.download call - 10y of bars each
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets - indices of `threshold` points that
+    keep the visual shape of (x, y). First and last point are always kept."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # threshold-2 inner buckets
+    selected = np.empty(threshold, np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def resample(bars: np.ndarray, interval: str) -> np.ndarray:
+    """Daily bars aggregated to weeks or months (open first, close last)"""
+    rule = INTERVALS[interval]
+    if rule is None or not len(bars):
+        return bars
+    days = bars["t"].astype("datetime64[s]").astype("datetime64[D]")
+    if rule == "W":
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        keys = (days.astype(np.int64) + 3) // 7
+    else:
+        keys = days.astype("datetime64[M]").astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), BAR)
+    out["t"] = bars["t"][starts]
+    out["open"] = bars["open"][starts]
+    out["close"] = bars["close"][ends]
+    out["high"] = np.maximum.reduceat(bars["high"], starts)
+    out["low"] = np.minimum.reduceat(bars["low"], starts)
+    out["volume"] = np.add.reduceat(bars["volume"], starts)
+    return out
+
+
+def bars_from_frame(df, ticker: str, single: bool) -> Optional[np.ndarray]:
+    """BAR array for one ticker from a yf.download frame"""
+    closes = closes_for(df, ticker, single)
+    if closes is None:
+        return None
+    frame = df[ticker] if getattr(df.columns, "nlevels", 1) > 1 else df
+    frame = frame.dropna(subset=["Close"])
+    if frame.empty:
+        return None
+    bars = np.empty(len(frame), BAR)
+    index = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+    bars["t"] = index.values.astype("datetime64[s]").astype(np.int64)
+    for field, column in (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"), ("volume", "Volume")):
+        bars[field] = frame[column].to_numpy(np.float64, na_value=np.nan)
+    return bars
+
+
+def fetch_history(tickers: List[str], period: str = DEFAULT_PERIOD,
+                  chunk_size: int = CHUNK_SIZE) -> Dict[str, Optional[np.ndarray]]:
+    """Daily bars per ticker in chunked bulk downloads via the default
+    provider - None for tickers without data, absent when their chunk failed"""
+    from market.providers import default_provider
+    return default_provider().history(tickers, period, chunk_size)
+
+
+def stub_history(ticker: str, last_price: float = 100.0, days: int = 2520,
+                 end: Optional[float] = None) -> np.ndarray:
+    """Offline stand-in: a seeded random walk of weekday bars ending at
+    last_price. The same ticker always gets the same series."""
+    rng = np.random.default_rng(int.from_bytes(ticker.encode()[:8].ljust(8, b"\0"), "little"))
+    end_day = np.datetime64(int((end or time.time()) // 86400), "D")
+    calendar = np.arange(end_day - int(days * 7 / 5) - 7, end_day + 1)
+    weekdays = calendar[np.is_busday(calendar)][-days:]
+    n = len(weekdays)
+
+    returns = rng.normal(0.0003, 0.015, n)
+    close = np.exp(np.cumsum(returns))
+    close *= last_price / close[-1]
+    open_ = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.003, n))
+    spread = np.abs(rng.normal(0, 0.008, n))
+
+    bars = np.empty(n, BAR)
+    bars["t"] = weekdays.astype("datetime64[s]").astype(np.int64)
+    bars["open"] = np.round(open_, 2)
+    bars["close"] = np.round(close, 2)
+    bars["high"] = np.round(np.maximum(open_, close) * (1 + spread), 2)
+    bars["low"] = np.round(np.minimum(open_, close) * (1 - spread), 2)
+    bars["volume"] = np.floor(rng.lognormal(15, 0.5, n))
+    return bars
+
+
+def last_trading_day(now: Optional[float] = None) -> int:
+    """Midnight (unix seconds) of the last weekday before today - the newest
+    daily bar that should be complete. Exchange holidays are not known."""
+    today = np.datetime64(int((now or time.time()) // 86400), "D")
+    day = np.busday_offset(today, -1, roll="forward")
+    return int(day.astype("datetime64[s]").astype(np.int64))
+
+
+class HistoryStore:
+    """Directory of <TICKER>.npy bar files.
+
+    Files are opened with mmap_mode="r" and kept open (re-opened when the
+    file changes), so a range query reads only the pages of the bars it
+    returns. Writes merge with the existing file and replace it atomically.
+    Tickers upstream had no bars for are remembered for `missing_ttl`
+    seconds, so they are not fetched again on every request; a ticker whose
+    bars fell behind is asked for again at most every `refetch_after`
+    seconds (holidays have no new bar to fetch).
+    """
+
+    def __init__(self, root: str, missing_ttl: float = 3600, refetch_after: float = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        self.root = root
+        self.missing_ttl = missing_ttl
+        self.refetch_after = refetch_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._open: Dict[str, Tuple[float, np.ndarray]] = {}
+        self._missing: Dict[str, float] = {}  # ticker -> when upstream had no data
+        self._fetched: Dict[str, float] = {}  # ticker -> when upstream was last asked
+        self.writes = 0
+
+    def path(self, ticker: str) -> str:
+        return os.path.join(self.root, f"{ticker}.npy")
+
+    def has(self, ticker: str) -> bool:
+        return os.path.exists(self.path(ticker))
+
+    def is_missing(self, ticker: str) -> bool:
+        """Upstream had no bars for ticker within the last missing_ttl seconds"""
+        marked = self._missing.get(ticker)
+        return marked is not None and self._clock() - marked < self.missing_ttl
+
+    def behind(self, ticker: str, now: Optional[float] = None) -> bool:
+        """Stored bars end before the last trading day and upstream was not
+        asked within refetch_after seconds"""
+        fetched = self._fetched.get(ticker)
+        if fetched is not None and self._clock() - fetched < self.refetch_after:
+            return False
+        bars = self.load(ticker)
+        return bars is not None and len(bars) > 0 and int(bars["t"][-1]) < last_trading_day(now)
+
+    def mark_fetched(self, tickers: Iterable[str]) -> None:
+        now = self._clock()
+        with self._lock:
+            for ticker in tickers:
+                self._fetched[ticker] = now
+
+    def mark_missing(self, tickers: Iterable[str]) -> None:
+        now = self._clock()
+        with self._lock:
+            for ticker in tickers:
+                self._missing[ticker] = now
+            if len(self._missing) > 10_000:  # Drop expired entries once the set grows
+                self._missing = {t: m for t, m in self._missing.items() if now - m < self.missing_ttl}
+
+    def tickers(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.root) if name.endswith(".npy"))
+
+    def load(self, ticker: str) -> Optional[np.ndarray]:
+        """Memory-mapped bars, or None when the ticker has no file"""
+        path = self.path(ticker)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._open.get(ticker)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        bars = np.load(path, mmap_mode="r")
+        if bars.dtype != BAR:
+            raise ValueError(f"{path} has dtype {bars.dtype}, expected {BAR}")
+        with self._lock:
+            self._open[ticker] = (mtime, bars)
+        return bars
+
+    def version(self, ticker: str) -> Optional[int]:
+        """Changes whenever the ticker's file is rewritten (for cache keys)"""
+        try:
+            return os.stat(self.path(ticker)).st_mtime_ns
+        except OSError:
+            return None
+
+    def write(self, ticker: str, bars: np.ndarray) -> int:
+        """Merge bars into the ticker's file (new bars win on equal t) and
+        replace it atomically. Returns the number of stored bars."""
+        existing = self.load(ticker)
+        if existing is not None and len(existing):
+            merged = np.concatenate([np.asarray(bars, BAR), np.asarray(existing)])
+        else:
+            merged = np.asarray(bars, BAR)
+        # Stable sort + first occurrence keeps the new bar for duplicate t
+        merged = merged[np.argsort(merged["t"], kind="stable")]
+        _, first = np.unique(merged["t"], return_index=True)
+        merged = merged[first]
+
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f".{ticker}-", suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, merged)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path(ticker))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.writes += 1
+        self._missing.pop(ticker, None)
+        return len(merged)
+
+    def query(self, ticker: str, start: Optional[float] = None, end: Optional[float] = None,
+              interval: str = "1d", max_points: int = DEFAULT_POINTS) -> Optional[Dict]:
+        """Bars in [start, end] (unix seconds), resampled to interval and
+        LTTB-downsampled on close to at most max_points"""
+        bars = self.load(ticker)
+        if bars is None:
+            return None
+        t = bars["t"]
+        lo = 0 if start is None else int(np.searchsorted(t, start, "left"))
+        hi = len(t) if end is None else int(np.searchsorted(t, end, "right"))
+        window = resample(np.asarray(bars[lo:hi]), interval)
+
+        total = len(window)
+        if total > max_points:
+            window = window[lttb(window["t"], window["close"], max_points)]
+        return {
+            "ticker": ticker,
+            "interval": interval,
+            "total": total,
+            "count": len(window),
+            "downsampled": len(window) < total,
+            "fields": list(FIELDS),
+            **{field: window[field].tolist() for field in FIELDS},
+        }
+
+    def stats(self) -> Dict:
+        missing = sum(1 for ticker in list(self._missing) if self.is_missing(ticker))
+        return {"root": self.root, "open_files": len(self._open), "writes": self.writes, "missing": missing}
+
+
+def ingest(store: HistoryStore, tickers: Iterable[str],
+           fetch: Callable[[List[str]], Dict[str, Optional[np.ndarray]]]) -> int:
+    """fetch(tickers) -> {ticker: bars or None} and merge every result into
+    the store; None marks a ticker without a file missing. Returns tickers
+    stored."""
+    history = fetch(list(tickers))
+    stored = 0
+    empty = []
+    for ticker, bars in history.items():
+        if bars is None or not len(bars):
+            empty.append(ticker)
+            continue
+        store.write(ticker, bars)
+        stored += 1
+    store.mark_fetched(history)
+    store.mark_missing(t for t in empty if not store.has(t))
+    return stored
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest daily bars into the history store")
+    parser.add_argument("command", choices=["ingest"])
+    parser.add_argument("tickers", nargs="*")
+    parser.add_argument("--all", action="store_true", help="every ticker in the constituents snapshot")
+    parser.add_argument("--stub", action="store_true", help="seeded random walks instead of Yahoo")
+    parser.add_argument("--dir", default=os.environ.get("HISTORY_DIR", "history"))
+    parser.add_argument("--period", default=DEFAULT_PERIOD)
+    args = parser.parse_args(argv)
+
+    prices = {}
+    if args.all:
+        from market.constituents import load_snapshot
+        snapshot = load_snapshot() or {"stocks": []}
+        prices = {s["ticker"]: s["price"] for s in snapshot["stocks"]}
+    tickers = parse_tickers(",".join(args.tickers), limit=100_000) or list(prices)
+    if not tickers:
+        parser.error("no tickers given")
+
+    store = HistoryStore(args.dir)
+    if args.stub:
+        fetch = lambda ts: {t: stub_history(t, prices.get(t, 100.0)) for t in ts}
+    else:
+        fetch = lambda ts: fetch_history(ts, period=args.period)
+    start = time.perf_counter()
+    stored = ingest(store, tickers, fetch)
+    print(f"Stored history for {stored}/{len(tickers)} tickers in {args.dir} ({time.perf_counter() - start:.1f}s)")
+    return 0 if stored else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
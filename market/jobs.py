@@ -0,0 +1,121 @@
+"""
+Background jobs - long-running work (universe refresh) runs as an asyncio
+task with an id the client can poll, and concurrent submissions of the same
+kind join the job that is already running instead of starting another
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+@dataclass(eq=False)
+class Job:
+    id: str
+    kind: str
+    state: str = PENDING
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    joined: int = 0  # Submissions collapsed onto this job
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id, "kind": self.kind, "state": self.state,
+            "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            "duration": round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None,
+            "joined": self.joined, "result": self.result, "error": self.error,
+        }
+
+
+class JobRegistry:
+    """Jobs by id, at most one unfinished job per kind.
+
+    submit() starts run() as a task, or returns the unfinished job of that
+    kind. The last `keep` jobs stay queryable after they finish. A job's
+    result is whatever run() returned; an exception marks it failed with
+    its message (or, when empty, its type name) as the error.
+    """
+
+    def __init__(self, keep: int = 50):
+        self.keep = keep
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self.started = 0
+        self.joined = 0
+        self.failed = 0
+
+    def submit(self, kind: str, run: Callable[[], Awaitable[Any]]) -> Tuple[Job, bool]:
+        """(job, started) - started is False when an unfinished job was joined"""
+        job = self._active.get(kind)
+        if job is not None:
+            job.joined += 1
+            self.joined += 1
+            return job, False
+
+        job = Job(id=uuid.uuid4().hex[:16], kind=kind)
+        self._active[kind] = job
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished:
+                break
+            self._jobs.popitem(last=False)
+        job.task = asyncio.get_running_loop().create_task(self._run(job, run))
+        self.started += 1
+        return job, True
+
+    async def _run(self, job: Job, run: Callable[[], Awaitable[Any]]) -> None:
+        job.state = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = await run()
+            job.state = DONE
+        except asyncio.CancelledError:
+            job.state, job.error = FAILED, "cancelled"
+            raise
+        except Exception as e:
+            job.state, job.error = FAILED, str(e) or type(e).__name__
+            self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            if self._active.get(job.kind) is job:
+                del self._active[job.kind]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def active(self, kind: str) -> Optional[Job]:
+        return self._active.get(kind)
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        """Wait for the job to finish - shielded, so a caller giving up
+        never cancels the job itself"""
+        if job.task is not None and not job.finished:
+            try:
+                await asyncio.wait_for(asyncio.shield(job.task), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def cancel_all(self) -> None:
+        tasks = [job.task for job in self._active.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "joined": self.joined, "failed": self.failed,
+                "active": len(self._active), "kept": len(self._jobs)}
@@ -0,0 +1,316 @@
+"""
+Prometheus metrics - counters, histograms and scrape-time gauges in the
+text exposition format, an event-loop lag monitor and an opt-in stack
+sampling profiler for single requests.
+
+No client library: recording is a dict lookup, a bisect and two increments
+under an uncontended lock, so the instrumentation stays on permanently.
+Everything that already keeps its own counters (caches, executor, snapshot)
+is read through callbacks at scrape time instead of being double-counted.
+"""
+
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter as Tally, OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[str, ...]
+Sample = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {_number(v)}" for key, v in values)
+        return lines
+
+
+class Histogram:
+    """Fixed buckets per label set - observe() is O(log buckets)"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, list] = {}  # labels -> [counts per bucket + overflow, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Callback:
+    """Gauge or counter whose value is read at scrape time - fn() returns a
+    number or {label values: number}"""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], Sample], labels: Sequence[str] = ()):
+        self.name, self.help, self.kind, self.fn, self.labels = name, help, kind, fn, tuple(labels)
+
+    def render(self) -> List[str]:
+        try:
+            sample = self.fn()
+        except Exception as e:  # A broken callback must not take the scrape down
+            return [f"# {self.name} unavailable: {e!r}"]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        values = sample.items() if isinstance(sample, dict) else [((), sample)]
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {_number(v)}" for key, v in values if v is not None)
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: "OrderedDict[str, object]" = OrderedDict()
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name: str, help: str, fn: Callable[[], Sample], labels: Sequence[str] = ()) -> Callback:
+        return self._add(Callback(name, help, "gauge", fn, labels))
+
+    def counter_callback(self, name: str, help: str, fn: Callable[[], Sample], labels: Sequence[str] = ()) -> Callback:
+        return self._add(Callback(name, help, "counter", fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()  # Process-wide - modules register their metrics at import time
+
+
+class LoopLagMonitor:
+    """Sleeps `interval` on the event loop and records how late it wakes
+    up - anything blocking the loop shows up as lag"""
+
+    def __init__(self, histogram: Histogram, interval: float = 0.25):
+        self.histogram = histogram
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.histogram.observe(lag)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class StackSampler:
+    """Samples the Python stacks of all threads every `interval` seconds
+    from a helper thread. Stacks come out in collapsed (flamegraph) format,
+    rooted at the thread name.
+
+    A request's work is split between the event loop and the worker threads
+    it hands blocking calls to, so every thread is sampled. Whatever else
+    ran meanwhile shows up as well - concurrent requests included - which
+    is the point: it shows what kept the process busy.
+    """
+
+    def __init__(self, interval: float = 0.001, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Tally = Tally()
+        self.samples = 0
+        self._names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _frame_stack(self, thread_id: int, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if thread_id not in self._names:
+            self._names = {t.ident: t.name for t in threading.enumerate()}
+        names.append(self._names.get(thread_id, str(thread_id)))
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self.stacks[self._frame_stack(thread_id, frame)] += 1
+            self.samples += 1
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class ProfileStore:
+    """The last `maxsize` request profiles by id"""
+
+    def __init__(self, maxsize: int = 20):
+        self.maxsize = maxsize
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def add(self, profile_id: str, profile: Dict) -> None:
+        self._profiles[profile_id] = profile
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        return self._profiles.get(profile_id)
+
+
+class MetricsMiddleware:
+    """ASGI middleware - per-route latency and response size histograms.
+
+    Routes are labelled by their template (/api/stock/{ticker}), so the
+    series count stays bounded. With `profiles` set, a request carrying an
+    `X-Profile: 1` header is stack-sampled; the response gets an
+    X-Profile-Id to fetch the collapsed stacks with.
+    """
+
+    def __init__(self, app, latency: Histogram, sizes: Histogram,
+                 profiles: Optional[ProfileStore] = None, interval: float = 0.001):
+        self.app = app
+        self.latency = latency
+        self.sizes = sizes
+        self.profiles = profiles
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+        sampler = profile_id = None
+        if self.profiles is not None and (b"x-profile", b"1") in scope.get("headers", ()):
+            profile_id = uuid.uuid4().hex[:16]
+            sampler = StackSampler(self.interval).start()
+
+        async def send_measured(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_id:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"x-profile-id", profile_id.encode())]}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.latency.observe(elapsed, scope["method"], path, str(status))
+            self.sizes.observe(size, path)
+            if sampler is not None:
+                sampler.stop()
+                self.profiles.add(profile_id, {
+                    "path": scope["path"], "duration": elapsed, "samples": sampler.samples,
+                    "collapsed": sampler.collapsed(),
+                })
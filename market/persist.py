@@ -0,0 +1,169 @@
+"""
+On-disk universe snapshots - a checksummed binary file that is written
+atomically and loaded with mmap, replacing the ad-hoc JSON cache
+
+    python -m market.persist export sp500_snapshot.bin universe.json
+    python -m market.persist import universe.json sp500_snapshot.bin
+    python -m market.persist info sp500_snapshot.bin
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from market.columnar import ColumnarStore
+
+MAGIC = b"SPSNAP\x00\x00"
+SCHEMA_VERSION = 1
+# magic, schema, reserved, row count, created_at (unix), body length, blake2b-128 of body
+HEADER = struct.Struct("<8sHHIdQ16s")  # 48 bytes - keeps the body 8-byte aligned
+
+
+class SnapshotFileError(ValueError):
+    """Missing, truncated, corrupt or incompatible snapshot file"""
+
+
+@dataclass(frozen=True)
+class SnapshotInfo:
+    path: str
+    schema: int
+    count: int
+    created_at: float
+    source: str
+    meta: Dict = field(default_factory=dict, compare=False)  # Extra header fields given to write_snapshot
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def is_stale(self, max_age: Optional[float]) -> bool:
+        return max_age is not None and max_age > 0 and self.age > max_age
+
+
+def _checksum(body) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def write_snapshot(path: str, columns: ColumnarStore, source: str, meta: Optional[Dict] = None,
+                   durable: bool = True) -> SnapshotInfo:
+    """Write columns to path via a temp file + fsync + rename, so readers see
+    either the old file or the complete new one - never a partial write.
+    `durable=False` skips the fsyncs (files on tmpfs, handed between processes)."""
+    created_at = time.time()
+    meta = {**(meta or {}), "source": source, "created_at": created_at}
+    body = columns.to_binary(meta)
+    header = HEADER.pack(MAGIC, SCHEMA_VERSION, 0, len(columns), created_at, len(body), _checksum(body))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    if not durable:
+        return SnapshotInfo(path, SCHEMA_VERSION, len(columns), created_at, source, meta)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        pass  # Directory fsync is best effort (not available everywhere)
+    else:
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+    return SnapshotInfo(path, SCHEMA_VERSION, len(columns), created_at, source, meta)
+
+
+def _open_header(path: str) -> Tuple[mmap.mmap, Tuple]:
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:  # ValueError: empty file
+        raise SnapshotFileError(f"Cannot map {path}: {e}") from e
+    if len(mm) < HEADER.size:
+        raise SnapshotFileError(f"{path} is truncated")
+    fields = HEADER.unpack_from(mm, 0)
+    magic, schema, _, _, _, body_len, _ = fields
+    if magic != MAGIC:
+        raise SnapshotFileError(f"{path} is not a snapshot file")
+    if schema != SCHEMA_VERSION:
+        raise SnapshotFileError(f"{path} has schema {schema}, expected {SCHEMA_VERSION}")
+    if len(mm) != HEADER.size + body_len:
+        raise SnapshotFileError(f"{path} is truncated")
+    return mm, fields
+
+
+def load_snapshot(path: str, verify: bool = True) -> Tuple[ColumnarStore, SnapshotInfo]:
+    """Map path and return its store - numeric columns stay views onto the
+    mapping. `verify` checks the body checksum first (one pass over the file)."""
+    mm, (_, schema, _, count, created_at, _, checksum) = _open_header(path)
+    body = memoryview(mm)[HEADER.size:]
+    if verify and _checksum(body) != checksum:
+        raise SnapshotFileError(f"{path} failed its checksum")
+    try:
+        columns, meta = ColumnarStore.from_binary(body)
+    except (KeyError, ValueError, struct.error) as e:
+        raise SnapshotFileError(f"{path} has a malformed body: {e!r}") from e
+    if len(columns) != count:
+        raise SnapshotFileError(f"{path} header says {count} rows, body has {len(columns)}")
+    return columns, SnapshotInfo(path, schema, count, created_at, meta.get("source", "unknown"), meta)
+
+
+def read_info(path: str) -> SnapshotInfo:
+    """Header and metadata without the checksum pass - cheap enough to poll"""
+    return load_snapshot(path, verify=False)[1]
+
+
+def export_json(columns: ColumnarStore, path: str, meta: Optional[Dict] = None) -> None:
+    """Plain JSON export in the old cache shape ({"stocks": [...], ...})"""
+    with open(path, "w") as f:
+        json.dump({"stocks": columns.to_records(), **(meta or {})}, f)
+
+
+def import_json(path: str) -> List[Dict]:
+    """Stock records from a JSON export (or the old sp500_full_cache.json)"""
+    with open(path) as f:
+        data = json.load(f)
+    stocks = data.get("stocks") if isinstance(data, dict) else data
+    if not isinstance(stocks, list):
+        raise SnapshotFileError(f"{path} has no stock list")
+    return stocks
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 3 and argv[0] == "export":
+        columns, info = load_snapshot(argv[1])
+        export_json(columns, argv[2], {"source": info.source, "updated": info.created_at})
+        print(f"Exported {info.count} stocks to {argv[2]}")
+    elif len(argv) == 3 and argv[0] == "import":
+        info = write_snapshot(argv[2], ColumnarStore.from_records(import_json(argv[1])), source="import")
+        print(f"Imported {info.count} stocks into {argv[2]}")
+    elif len(argv) == 2 and argv[0] == "info":
+        info = read_info(argv[1])
+        print(f"{info.path}: schema {info.schema}, {info.count} stocks, source {info.source}, age {info.age:.0f}s")
+    else:
+        print(__doc__.strip().split("\n\n")[-1])
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+"""
+Market data providers - constituents, quotes and daily bars behind one
+interface, so every upstream call goes through a pooled HTTP session, a
+token-bucket rate limit and a circuit breaker. StubProvider answers the
+same calls offline from seeded data (tests, benchmarks, load runs).
+
+    MARKET_PROVIDER=yahoo   # Yahoo Finance quotes/bars, Wikipedia constituents
+    MARKET_PROVIDER=stub    # deterministic, no network
+"""
+
+import os
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market.history import CHUNK_SIZE as HISTORY_CHUNK_SIZE, DEFAULT_PERIOD, bars_from_frame, stub_history
+from market.metrics import REGISTRY
+from market.quotes import CHUNK_SIZE, build_quote, chunked, quotes_from_frame
+from market.reference import REAL_PRICES
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+USER_AGENT = "Mozilla/5.0"
+POOL_SIZE = 16          # Keep-alive connections per host
+RATE = 2.0              # Upstream calls per second (a bulk chunk is one call)
+BURST = 5
+MAX_WAIT = 5.0          # seconds a call may queue for a token before giving up
+FAILURES = 5            # Consecutive failures that open the circuit
+RESET_AFTER = 30.0      # seconds open before one half-open probe is let through
+# yfinance's per-ticker messages for symbols Yahoo answered without data
+NO_DATA = ("No data found", "No price data found", "No timezone found", "possibly delisted")
+
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "upstream_call_seconds", "Upstream call latency by upstream host", ["upstream"])
+UPSTREAM_CALLS = REGISTRY.counter(
+    "upstream_calls_total", "Upstream calls by host and outcome (ok, error, circuit_open, rate_limited)",
+    ["upstream", "outcome"])
+
+
+class ProviderError(Exception):
+    """An upstream call failed - callers fall back to local data"""
+
+
+class UpstreamUnavailable(ConnectionError):
+    """Transport failure the client library swallowed and reported as
+    missing data - an OSError, so the breaker counts it"""
+
+
+class RateLimited(ProviderError):
+    pass
+
+
+class CircuitOpen(ProviderError):
+    pass
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst` saved up. acquire() blocks
+    (on the calling worker thread) until a token is free or max_wait passes."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._stamp = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        self.rejected = 0
+
+    def _reserve(self) -> float:
+        """Take a token (possibly going into debt) - seconds until it is ours"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def _refund(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def acquire(self, max_wait: float = MAX_WAIT) -> bool:
+        wait = self._reserve()
+        if wait > max_wait:
+            self._refund()
+            self.rejected += 1
+            return False
+        if wait:
+            self.waited += wait
+            time.sleep(wait)
+        return True
+
+    def stats(self) -> Dict:
+        return {"rate": self.rate, "burst": self.burst, "waited": round(self.waited, 3), "rejected": self.rejected}
+
+
+class CircuitBreaker:
+    """Closed until `failures` calls fail in a row, then open: calls fail
+    fast for `reset_after` seconds. After that one probe is let through
+    (half-open) - its success closes the circuit, its failure re-opens it."""
+
+    def __init__(self, failures: int = FAILURES, reset_after: float = RESET_AFTER,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.opens = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and self._clock() - self.opened_at >= self.reset_after:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def cancel(self) -> None:
+        """The allowed call never reached upstream - free the probe slot"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            if self.state == HALF_OPEN or self.consecutive >= self.failures:
+                if self.state != OPEN:
+                    self.opens += 1
+                self.state = OPEN
+                self.opened_at = self._clock()
+            self._probing = False
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive,
+                "opens": self.opens, "short_circuited": self.short_circuited}
+
+
+class Guard:
+    """Rate limit + circuit breaker for one upstream host. Only `transient`
+    errors (transport, HTTP status, timeout - requests' exceptions are
+    OSErrors too) count against the breaker: any other exception means the
+    host answered, just not with something usable."""
+
+    def __init__(self, name: str, rate: float = RATE, burst: int = BURST,
+                 failures: int = FAILURES, reset_after: float = RESET_AFTER, max_wait: float = MAX_WAIT,
+                 transient: Tuple[type, ...] = (OSError,)):
+        self.name = name
+        self.transient = transient
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failures, reset_after)
+        self.max_wait = max_wait
+        self.calls = 0
+        self.errors = 0
+
+    def call(self, fn: Callable, *args):
+        """fn(*args) - ProviderError when the circuit is open, no token came
+        in time or fn raised"""
+        if not self.breaker.allow():
+            UPSTREAM_CALLS.inc(self.name, "circuit_open")
+            raise CircuitOpen(f"{self.name} circuit open")
+        if not self.bucket.acquire(self.max_wait):
+            self.breaker.cancel()
+            UPSTREAM_CALLS.inc(self.name, "rate_limited")
+            raise RateLimited(f"{self.name} rate limit")
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.errors += 1
+            if isinstance(e, self.transient):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, self.name)
+            UPSTREAM_CALLS.inc(self.name, "error")
+            raise ProviderError(f"{self.name}: {e!r}") from e
+        self.breaker.record_success()
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, self.name)
+        UPSTREAM_CALLS.inc(self.name, "ok")
+        return result
+
+    def stats(self) -> Dict:
+        return {"calls": self.calls, "errors": self.errors, **self.breaker.stats(), "bucket": self.bucket.stats()}
+
+
+class Provider:
+    """Upstream market data. quotes() and history() run chunked: a failed
+    chunk only loses its own tickers, and once the circuit opens the
+    remaining chunks are skipped instead of hammering a dead upstream."""
+
+    name = "base"
+    companies_source = "base"  # Snapshot source label of companies() data
+
+    def __init__(self, guards: Sequence[Guard]):
+        self.guards = {guard.name: guard for guard in guards}
+
+    def companies(self, timeout: float = 8) -> List[Dict]:
+        """ticker / name / sector of every constituent"""
+        raise NotImplementedError
+
+    def quote(self, ticker: str) -> Optional[Dict]:
+        """Live quote with market cap - None when upstream has no price"""
+        raise NotImplementedError
+
+    def quotes(self, tickers: List[str]) -> Dict[str, Optional[Dict]]:
+        """{ticker: quote} for priced tickers, {ticker: None} for tickers
+        upstream answered without data (no market cap)"""
+        raise NotImplementedError
+
+    def history(self, tickers: List[str], period: str = DEFAULT_PERIOD) -> Dict[str, Optional[np.ndarray]]:
+        """Daily BAR arrays, None for tickers upstream answered without bars -
+        tickers of a failed chunk are absent"""
+        raise NotImplementedError
+
+    def _chunked(self, guard: Guard, fetch: Callable[[List[str]], Dict], tickers: List[str], size: int) -> Dict:
+        results = {}
+        tickers = list(tickers)
+        for start, chunk in zip(range(0, len(tickers), size), chunked(tickers, size)):
+            try:
+                results.update(guard.call(fetch, chunk))
+            except CircuitOpen as e:
+                print(f"Skipping {len(tickers) - start} tickers: {e}")
+                break
+            except ProviderError as e:
+                print(f"Fetch failed for {len(chunk)} tickers: {e}")
+        return results
+
+    def stats(self) -> Dict:
+        return {"name": self.name, **{name: guard.stats() for name, guard in self.guards.items()}}
+
+
+# yf.download collects results in module globals (shared._DFS, _ERRORS), so
+# concurrent downloads from the upstream threads would mix their results
+_YF_DOWNLOAD_LOCK = threading.Lock()
+
+
+class YahooProvider(Provider):
+    """Yahoo Finance via yfinance for quotes and bars, Wikipedia for the
+    constituents - both over one pooled keep-alive requests.Session"""
+
+    name = "yahoo"
+    companies_source = "wikipedia"
+
+    def __init__(self, rate: float = RATE, burst: int = BURST, pool_size: int = POOL_SIZE):
+        self.yahoo = Guard("yahoo", rate, burst)
+        self.wikipedia = Guard("wikipedia", rate=0.2, burst=2, failures=2)
+        super().__init__((self.yahoo, self.wikipedia))
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers["User-Agent"] = USER_AGENT
+                    self._session = session
+        return self._session
+
+    def companies(self, timeout: float = 8) -> List[Dict]:
+        return self.wikipedia.call(self._fetch_companies, timeout)
+
+    def _fetch_companies(self, timeout: float) -> List[Dict]:
+        """Rows are parsed while the page streams in, and the download stops
+        once the table is complete"""
+        from market.constituents import WIKIPEDIA_URL, parse_companies
+        from market.wikitable import CHUNK_SIZE as PAGE_CHUNK
+
+        with self.session.get(WIKIPEDIA_URL, stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            companies = parse_companies(resp.iter_content(PAGE_CHUNK))
+        if not companies:
+            raise ValueError("No constituents table found")
+        return companies
+
+    def quote(self, ticker: str) -> Optional[Dict]:
+        return self.yahoo.call(self._fetch_quote, ticker)
+
+    def _fetch_quote(self, ticker: str) -> Optional[Dict]:
+        import yfinance as yf
+
+        fi = yf.Ticker(ticker, session=self.session).fast_info
+        try:
+            price = getattr(fi, 'last_price', 0) or 0
+            if not price:
+                return None
+            prev = getattr(fi, 'previous_close', price) or price
+            mc = getattr(fi, 'market_cap', 0) or 0
+        except OSError:
+            raise
+        except Exception as e:
+            # fast_info fetches with errors suppressed and then fails on the
+            # empty answer (KeyError and the like) - during an outage as well
+            # as for unknown symbols, so it has to count as unavailable
+            raise UpstreamUnavailable(f"{ticker}: no quote data ({e!r})") from e
+        return build_quote(ticker, price, prev, mc)
+
+    def _download(self, tickers: List[str], period: str):
+        """(frame, tickers whose fetch failed). yfinance catches transport
+        errors per ticker and hands back an empty frame, so its error table
+        is read as well: UpstreamUnavailable when nothing came back at all
+        (an outage and a chunk of unknown symbols look the same then), the
+        failed tickers otherwise so they are neither priced nor cached as
+        missing."""
+        import yfinance as yf
+        from yfinance import shared
+
+        with _YF_DOWNLOAD_LOCK:
+            df = yf.download(
+                tickers, period=period, interval="1d", group_by="ticker",
+                auto_adjust=False, progress=False, threads=True, session=self.session
+            )
+            errors = dict(shared._ERRORS)
+        if df is None or df.empty:
+            sample = next(iter(errors.values()), "empty frame")
+            raise UpstreamUnavailable(f"no data for {len(tickers)} tickers: {sample[:200]}")
+        failed = {t for t in tickers if t in errors and not any(m in errors[t] for m in NO_DATA)}
+        return df, failed
+
+    def quotes(self, tickers: List[str], chunk_size: int = CHUNK_SIZE) -> Dict[str, Optional[Dict]]:
+        def fetch(chunk):
+            df, failed = self._download(chunk, "5d")
+            return {t: q for t, q in quotes_from_frame(df, chunk).items() if t not in failed}
+        return self._chunked(self.yahoo, fetch, tickers, chunk_size)
+
+    def history(self, tickers: List[str], period: str = DEFAULT_PERIOD,
+                chunk_size: int = HISTORY_CHUNK_SIZE) -> Dict[str, Optional[np.ndarray]]:
+        def fetch(chunk):
+            df, failed = self._download(chunk, period)
+            return {t: bars_from_frame(df, t, len(chunk) == 1) for t in chunk if t not in failed}
+        return self._chunked(self.yahoo, fetch, tickers, chunk_size)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser - uniform [0, 1) floats from uint64 seeds"""
+    z = values.astype(np.uint64)
+    with np.errstate(over="ignore"):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class StubProvider(Provider):
+    """Deterministic offline provider.
+
+    Constituents come from the shipped snapshot (synthetic names if it is
+    missing). Quote n for a ticker is a pure function of (seed, ticker, n):
+    previous close is the reference price, the change a seeded draw within
+    +-3%. Bars are stub_history() walks ending at the reference price.
+    Setting `down` makes every call fail, `latency` delays each call -
+    enough to drive the rate limiter and circuit breaker in a benchmark.
+    """
+
+    name = "stub"
+    companies_source = "stub"
+
+    def __init__(self, seed: int = 500, price_of: Optional[Callable[[str], Optional[float]]] = None,
+                 rate: float = 100_000.0, burst: int = 10_000, latency: float = 0.0,
+                 failures: int = FAILURES, reset_after: float = RESET_AFTER):
+        self.upstream = Guard("stub", rate, burst, failures, reset_after)
+        super().__init__((self.upstream,))
+        self.seed = seed
+        self.price_of = price_of
+        self.latency = latency
+        self.down = False
+        self.step = 0
+        self._step_lock = threading.Lock()
+
+    def _enter(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.down:
+            raise ConnectionError("stub upstream is down")
+
+    def reference_price(self, ticker: str) -> float:
+        price = self.price_of(ticker) if self.price_of else None
+        if price:
+            return float(price)
+        if ticker in REAL_PRICES:
+            return REAL_PRICES[ticker]
+        return round(20 + 480 * float(_mix(np.array([zlib.crc32(ticker.encode()) ^ self.seed]))[0]), 2)
+
+    def companies(self, timeout: float = 8) -> List[Dict]:
+        def fetch():
+            self._enter()
+            from market.constituents import load_snapshot
+            from market.synthetic import synthetic_universe
+
+            snapshot = load_snapshot()
+            if snapshot:
+                return [{"ticker": s["ticker"], "name": s["name"], "sector": s["sector"]} for s in snapshot["stocks"]]
+            return synthetic_universe(500, self.seed).to_records(fields=("ticker", "name", "sector"))
+        return self.upstream.call(fetch)
+
+    def _draw(self, tickers: List[str]) -> Dict[str, Dict]:
+        self._enter()
+        with self._step_lock:
+            self.step += 1
+            step = self.step
+        keys = np.fromiter((zlib.crc32(t.encode()) for t in tickers), np.uint64, len(tickers))
+        u = _mix(keys * np.uint64(0x9E3779B1) + np.uint64(step << 32) + np.uint64(self.seed))
+        quotes = {}
+        for ticker, draw in zip(tickers, ((u - 0.5) * 6).tolist()):
+            prev = self.reference_price(ticker)
+            quotes[ticker] = build_quote(ticker, prev * (1 + draw / 100), prev)
+        return quotes
+
+    def quote(self, ticker: str) -> Optional[Dict]:
+        return self.upstream.call(lambda: self._draw([ticker])[ticker])
+
+    def quotes(self, tickers: List[str], chunk_size: int = CHUNK_SIZE) -> Dict[str, Optional[Dict]]:
+        return self._chunked(self.upstream, self._draw, tickers, chunk_size)
+
+    def history(self, tickers: List[str], period: str = DEFAULT_PERIOD,
+                chunk_size: int = HISTORY_CHUNK_SIZE) -> Dict[str, np.ndarray]:
+        def fetch(chunk):
+            self._enter()
+            return {t: stub_history(t, self.reference_price(t)) for t in chunk}
+        return self._chunked(self.upstream, fetch, tickers, chunk_size)
+
+
+PROVIDERS = {"yahoo": YahooProvider, "stub": StubProvider}
+
+_DEFAULT: Dict[str, Provider] = {}
+_DEFAULT_LOCK = threading.Lock()
+
+
+def make_provider(name: str, **options) -> Provider:
+    """New provider by name - ValueError for unknown names"""
+    cls = PROVIDERS.get(name)
+    if cls is None:
+        raise ValueError(f"Unknown market data provider {name!r} (expected one of {', '.join(PROVIDERS)})")
+    return cls(**options)
+
+
+def default_provider() -> Provider:
+    """Process-wide provider from MARKET_PROVIDER (yahoo) - shared so its
+    session pool, rate limit and breaker cover every caller"""
+    provider = _DEFAULT.get("provider")
+    if provider is None:
+        with _DEFAULT_LOCK:
+            provider = _DEFAULT.get("provider")
+            if provider is None:
+                provider = _DEFAULT["provider"] = make_provider(os.environ.get("MARKET_PROVIDER", "yahoo"))
+    return provider
@@ -0,0 +1,124 @@
+"""
+Server-side filtering for /api/stocks - sector / market cap range, sort,
+pagination and field projection on top of the per-snapshot indexes
+"""
+
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from market.columnar import FIELDS, ColumnarStore
+
+SORT_FIELDS = ("market_cap", "weight", "price", "change_percent", "ticker", "name", "sector")
+DEFAULT_SORT = "-market_cap"
+MAX_LIMIT = 1000
+
+
+class QueryError(ValueError):
+    """Invalid query parameter - reported to the client as a 400"""
+
+
+@dataclass(frozen=True)
+class StockQuery:
+    """Parsed /api/stocks query - hashable, so it can key the response cache"""
+    sector: Optional[str] = None
+    min_cap: Optional[float] = None
+    max_cap: Optional[float] = None
+    sort: str = DEFAULT_SORT
+    limit: Optional[int] = None
+    offset: int = 0
+    fields: Optional[Tuple[str, ...]] = None
+
+    @classmethod
+    def parse(cls, sector: Optional[str] = None, min_cap: Optional[float] = None,
+              max_cap: Optional[float] = None, sort: Optional[str] = None,
+              limit: Optional[int] = None, offset: Optional[int] = None,
+              fields: Optional[str] = None) -> Optional["StockQuery"]:
+        """StockQuery from raw parameters, or None when none were given"""
+        if all(v is None for v in (sector, min_cap, max_cap, sort, limit, offset, fields)):
+            return None
+
+        sort = sort or DEFAULT_SORT
+        if sort.lstrip("-") not in SORT_FIELDS:
+            raise QueryError(f"Unknown sort field {sort.lstrip('-')}")
+        if limit is not None and not 0 <= limit <= MAX_LIMIT:
+            raise QueryError(f"limit must be between 0 and {MAX_LIMIT}")
+        if offset is not None and offset < 0:
+            raise QueryError("offset must not be negative")
+        if min_cap is not None and max_cap is not None and min_cap > max_cap:
+            raise QueryError("min_cap is greater than max_cap")
+
+        projection = None
+        if fields is not None:
+            projection = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+            unknown = [f for f in projection if f not in FIELDS]
+            if unknown or not projection:
+                raise QueryError(f"Unknown fields {','.join(unknown)}" if unknown else "fields is empty")
+
+        return cls(sector=sector.strip() if sector else None, min_cap=min_cap, max_cap=max_cap,
+                   sort=sort, limit=limit, offset=offset or 0, fields=projection)
+
+    def resolve(self, columns: ColumnarStore) -> "StockQuery":
+        """Same query with the sector spelled as in columns - QueryError for
+        an unknown sector"""
+        if self.sector is None:
+            return self
+        name = resolve_sector(columns, self.sector)
+        if name is None:
+            raise QueryError(f"Unknown sector {self.sector}")
+        return self if name == self.sector else replace(self, sector=name)
+
+
+def resolve_sector(columns: ColumnarStore, sector: str) -> Optional[str]:
+    """Exact or case-insensitive sector name, None when there is no such sector"""
+    if sector in columns.sector_index:
+        return sector
+    lowered = sector.lower()
+    return next((name for name in columns.sectors if name.lower() == lowered), None)
+
+
+def select(columns: ColumnarStore, query: StockQuery) -> Tuple[np.ndarray, int]:
+    """(rows of the requested page, number of rows matching the filters).
+
+    Filtering works on rows presorted by market cap (the whole universe or
+    one sector), so the cap range is two binary searches and the default
+    sort is a slice - O(log n + k). Other sort fields reorder only the
+    matching rows by their precomputed rank. QueryError for an unknown
+    sector.
+    """
+    query = query.resolve(columns)
+    rows = columns.cap_order if query.sector is None else columns.sector_index[query.sector]
+
+    if query.min_cap is not None or query.max_cap is not None:
+        # rows are by cap descending, so their negated caps (precomputed per store) ascend
+        neg_caps = columns.cap_keys[query.sector]
+        lo = 0 if query.max_cap is None else np.searchsorted(neg_caps, -query.max_cap, "left")
+        hi = len(rows) if query.min_cap is None else np.searchsorted(neg_caps, -query.min_cap, "right")
+        rows = rows[lo:hi]
+
+    descending = query.sort.startswith("-")
+    field = query.sort.lstrip("-")
+    if field == "market_cap":
+        if not descending:
+            rows = rows[::-1]
+    else:
+        ranks = columns.rank(field)[rows]
+        rows = rows[np.argsort(-ranks if descending else ranks, kind="stable")]
+
+    total = len(rows)
+    end = None if query.limit is None else query.offset + query.limit
+    return rows[query.offset:end], total
+
+
+def query_payload(columns: ColumnarStore, query: StockQuery, format: str, meta: Dict):
+    """Body for a filtered /api/stocks request in the requested format"""
+    rows, total = select(columns, query)
+    page = {"total": total, "offset": query.offset, "limit": query.limit}
+    if format == "binary":
+        return columns.take(rows).to_binary({**meta, **page})
+    if format == "columnar":
+        body = columns.take(rows).to_columns(query.fields or FIELDS)
+        return {**body, "count": len(rows), **page, "format": "columnar", **meta}
+    stocks = columns.to_records(rows, query.fields)
+    return {"stocks": stocks, "count": len(stocks), **page, **meta}
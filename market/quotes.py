@@ -0,0 +1,97 @@
+"""
+Bulk quote fetching - resolves many tickers with one chunked yfinance
+download instead of a fast_info round trip per ticker (the download itself
+lives in market/providers.py)
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+MAX_TICKERS = 500   # Upper bound for a single /api/quotes request
+CHUNK_SIZE = 100    # Tickers per upstream yf.download call
+
+_TICKER_RE = re.compile(r"^[A-Z0-9^][A-Z0-9.\-=^]{0,15}$")
+
+
+def parse_tickers(raw: str, limit: int = MAX_TICKERS) -> List[str]:
+    """Split a comma separated ticker list - upper-cased, de-duplicated, order kept"""
+    tickers = []
+    seen = set()
+    for part in (raw or "").split(","):
+        ticker = part.strip().upper().replace(".", "-")
+        if not ticker or ticker in seen or not _TICKER_RE.match(ticker):
+            continue
+        seen.add(ticker)
+        tickers.append(ticker)
+        if len(tickers) >= limit:
+            break
+    return tickers
+
+
+def build_quote(ticker: str, price: float, prev: Optional[float], market_cap: int = 0) -> Dict:
+    """Quote record in the same shape as /api/stock/{ticker} returns"""
+    prev = prev or price
+    change = ((price - prev) / prev * 100) if prev else 0
+    return {
+        "ticker": ticker,
+        "price": round(price, 2),
+        "change_percent": round(change, 2),
+        "market_cap": market_cap,
+        "is_live": True
+    }
+
+
+def chunked(items: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def closes_for(df, ticker: str, single: bool):
+    """Close column for one ticker from a yf.download frame (flat or grouped)"""
+    if getattr(df.columns, "nlevels", 1) > 1:
+        if ticker not in df.columns.get_level_values(0):
+            return None
+        return df[ticker]["Close"]
+    # yfinance returns flat columns when only one ticker was requested
+    return df["Close"] if single and "Close" in df.columns else None
+
+
+def quotes_from_frame(df, tickers: List[str]) -> Dict[str, Optional[Dict]]:
+    """Extract last price / previous close per ticker from a yf.download frame.
+
+    Tickers the frame has no prices for map to None. An empty frame means the
+    whole download failed, so nothing is reported for it.
+    """
+    if df is None or getattr(df, "empty", True):
+        return {}
+
+    quotes = {}
+    single = len(tickers) == 1
+    for ticker in tickers:
+        quotes[ticker] = None
+        closes = closes_for(df, ticker, single)
+        if closes is None:
+            continue
+        closes = closes.dropna()
+        if closes.empty:
+            continue
+        price = float(closes.iloc[-1])
+        prev = float(closes.iloc[-2]) if len(closes) > 1 else price
+        if price > 0:
+            quotes[ticker] = build_quote(ticker, price, prev)
+    return quotes
+
+
+def fetch_quotes(tickers: List[str], chunk_size: int = CHUNK_SIZE) -> Dict[str, Optional[Dict]]:
+    """Fetch live quotes in chunked bulk downloads via the default provider.
+
+    Returns {ticker: quote} for priced tickers and {ticker: None} for tickers
+    upstream answered without data. A failing chunk only loses its own
+    tickers - they are absent from the result and the caller decides how to
+    fall back.
+    """
+    if not tickers:
+        return {}
+
+    from market.providers import default_provider
+    return default_provider().quotes(tickers, chunk_size)
@@ -0,0 +1,191 @@
+"""
+Background price refresher - keeps the whole universe warm with chunked bulk
+downloads, refreshing heavyweights more often than the tail
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market.columnar import ColumnarStore
+from market.snapshot import SnapshotStore
+
+# (number of names by weight, refresh every N cycles) - None takes the rest
+DEFAULT_TIERS = ((50, 1), (150, 3), (None, 10))
+
+
+def apply_quotes(columns: ColumnarStore, quotes: Dict[str, Dict]) -> Tuple[ColumnarStore, List[str]]:
+    """Return a new store with live price/change and the tickers that moved.
+
+    Market cap follows the price (implied share count stays constant) and
+    weights are recomputed across the whole universe in one vectorised pass.
+    The input store is not modified - it may still be served from an older
+    snapshot.
+    """
+    positions = columns.positions
+    hits = [(positions[t], q["price"], q["change_percent"]) for t, q in quotes.items() if t in positions]
+    if not hits:
+        return columns, []
+
+    rows = np.fromiter((h[0] for h in hits), np.int64, len(hits))
+    new_price = np.fromiter((h[1] for h in hits), np.float64, len(hits))
+    new_change = np.fromiter((h[2] for h in hits), np.float64, len(hits))
+
+    moved = (columns.price[rows] != new_price) | (columns.change_percent[rows] != new_change)
+    if not moved.any():
+        return columns, []
+    rows, new_price, new_change = rows[moved], new_price[moved], new_change[moved]
+
+    old_price = columns.price[rows]
+    market_cap = columns.market_cap.copy()
+    scale = np.divide(new_price, old_price, out=np.ones_like(new_price), where=old_price > 0)
+    market_cap[rows] = np.floor(market_cap[rows] * scale)
+
+    price = columns.price.copy()
+    price[rows] = new_price
+    change = columns.change_percent.copy()
+    change[rows] = new_change
+    weight = np.round(market_cap / (market_cap.sum() or 1) * 100, 4)
+
+    changed = [columns.tickers[i] for i in rows.tolist()]
+    return columns.with_prices(market_cap, price, change, weight), changed
+
+
+def carry_prices(columns: ColumnarStore, current: ColumnarStore) -> Tuple[ColumnarStore, Optional[List[str]]]:
+    """Rebuilt universe with the live price/change of every ticker that is
+    still listed, and the tickers that differ from `current` - None when the
+    ticker list itself changed (subscribers must resync then).
+
+    Rows are matched once into an index array and the columns copied with
+    fancy indexing; market cap follows the price as in apply_quotes.
+    """
+    same = columns.tickers == current.tickers
+    if same:
+        rows = src = np.arange(len(columns))
+    else:
+        live = current.positions
+        index = np.fromiter((live.get(t, -1) for t in columns.tickers), np.int64, len(columns))
+        rows = np.flatnonzero(index >= 0)
+        src = index[rows]
+
+    old_price = columns.price[rows]
+    new_price = current.price[src]
+    scale = np.divide(new_price, old_price, out=np.ones_like(new_price), where=old_price > 0)
+    market_cap = columns.market_cap.copy()
+    market_cap[rows] = np.floor(market_cap[rows] * scale)
+    price = columns.price.copy()
+    price[rows] = new_price
+    change = columns.change_percent.copy()
+    change[rows] = current.change_percent[src]
+    weight = np.round(market_cap / (market_cap.sum() or 1) * 100, 4)
+    columns = columns.with_prices(market_cap, price, change, weight)
+    if not same:
+        return columns, None
+
+    differs = ((columns.market_cap != current.market_cap) | (columns.price != current.price)
+               | (columns.change_percent != current.change_percent) | (columns.weight != current.weight))
+    if columns.sectors != current.sectors or not np.array_equal(columns.sector_codes, current.sector_codes):
+        differs |= np.asarray(columns.sectors)[columns.sector_codes] != np.asarray(current.sectors)[current.sector_codes]
+    if columns.names != current.names:
+        differs |= np.fromiter((a != b for a, b in zip(columns.names, current.names)), bool, len(columns))
+    return columns, [columns.tickers[i] for i in np.flatnonzero(differs).tolist()]
+
+
+def due_tickers(columns: ColumnarStore, cycle: int, tiers: Sequence[Tuple[Optional[int], int]] = DEFAULT_TIERS) -> List[str]:
+    """Tickers to refresh on this cycle - ranked by weight, tiered cadence"""
+    ranked = np.argsort(-columns.weight, kind="stable")
+    due = []
+    start = 0
+    for size, every in tiers:
+        end = len(ranked) if size is None else start + size
+        if cycle % every == 0:
+            due.extend(columns.tickers[i] for i in ranked[start:end].tolist())
+        start = end
+    return due
+
+
+class PriceRefresher:
+    """Periodically refreshes prices and publishes a new snapshot per cycle.
+
+    `fetch(tickers)` is the blocking bulk quote call and `run(fn, *args,
+    timeout=...)` the executor it runs on, so no cycle touches the event loop
+    with network I/O. `on_quotes` sees every batch of fresh quotes after it
+    was published (e.g. to warm the per-ticker quote cache).
+    """
+
+    def __init__(self, store: SnapshotStore, fetch: Callable, run: Callable,
+                 interval: float = 60, tiers=DEFAULT_TIERS, timeout: float = 60,
+                 on_quotes: Optional[Callable[[Dict[str, Dict]], None]] = None):
+        self.store = store
+        self.interval = interval
+        self.tiers = tiers
+        self.timeout = timeout
+        self._fetch = fetch
+        self._run = run
+        self._on_quotes = on_quotes
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.errors = 0
+        self.last_refresh: Optional[float] = None
+        self.last_duration = 0.0
+        self.last_changed = 0
+
+    async def refresh_once(self) -> int:
+        """Run one cycle - returns the number of tickers whose price moved"""
+        cycle = self.cycles
+        self.cycles += 1
+        tickers = due_tickers(self.store.current.columns, cycle, self.tiers)
+        if not tickers:
+            return 0
+
+        start = time.perf_counter()
+        fetched = await self._run(self._fetch, tickers, timeout=self.timeout)
+        quotes = {t: q for t, q in fetched.items() if q}
+
+        # Re-read current: a manual refresh may have published meanwhile
+        columns, changed = apply_quotes(self.store.current.columns, quotes)
+        if changed:
+            self.store.publish(columns, source="refresh", changed=changed)
+        if quotes and self._on_quotes:
+            self._on_quotes(quotes)
+
+        self.last_refresh = time.time()
+        self.last_duration = time.perf_counter() - start
+        self.last_changed = len(changed)
+        return len(changed)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"Price refresh failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "errors": self.errors,
+            "last_refresh": self.last_refresh,
+            "last_duration": round(self.last_duration, 3),
+            "last_changed": self.last_changed
+        }
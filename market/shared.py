@@ -0,0 +1,315 @@
+"""
+Multi-worker sharing - with `uvicorn --workers N` one elected worker loads,
+refreshes and publishes the universe, the others map every version it
+publishes zero-copy, and live quotes fetched by any worker land in one
+shared table.
+
+Everything lives in a directory (tmpfs such as /dev/shm in production):
+
+    leader.lock   flock held by the leader for its lifetime - the kernel
+                  drops it when the process dies and a follower takes over
+    universe.bin  the newest snapshot in the persist.py file format,
+                  replaced atomically per version
+    control.bin   header (universe version, refresh tickets) + quote table,
+                  mapped read-write by every worker
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from market.cache import FRESH, MISS, NEGATIVE, STALE
+from market.columnar import ColumnarStore
+from market.persist import SnapshotFileError, SnapshotInfo, load_snapshot, write_snapshot
+
+MAGIC = b"SPSHARE\x00"
+LAYOUT = 1
+# magic, layout, reserved, quote slots, then u64 fields at the offsets below
+HEADER = struct.Struct("<8sHHIQQQQQQ")  # 64 bytes
+VERSION, USED, LEADER_PID, REQUESTED, COMPLETED, REFRESH_OK = range(16, 64, 8)
+# seq (odd while written), flags, ticker, stored_at (unix), price, change %, market cap
+SLOT = struct.Struct("<II16sdddq8x")    # 64 bytes
+USED_SLOT, NEGATIVE_SLOT = 1, 2
+PROBE = 8       # Slots searched per key - the oldest of them is evicted when all are taken
+RETRIES = 16    # Re-reads of a slot a writer is busy with before treating it as a miss
+_U64 = struct.Struct("<Q")
+_U32 = struct.Struct("<I")
+
+
+def table_slots(maxsize: int) -> int:
+    """Power of two at least twice maxsize - keeps probe runs short"""
+    slots = 64
+    while slots < maxsize * 2:
+        slots *= 2
+    return slots
+
+
+class SharedSegment:
+    """The shared directory as seen by one worker.
+
+    Writes to control.bin happen under flock (plus a thread lock - flock
+    does not exclude threads sharing the descriptor); reads are lock-free.
+    Open it in the worker process itself: descriptors inherited over fork
+    would share their locks.
+    """
+
+    def __init__(self, directory: str, quote_slots: int = 4096):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.universe_path = os.path.join(directory, "universe.bin")
+        self._lock_path = os.path.join(directory, "leader.lock")
+        self._thread_lock = threading.Lock()
+        self._leader_fd: Optional[int] = None
+        self._refresh_taken = 0
+        self.published = 0
+        self.loaded = 0
+
+        self._fd = os.open(os.path.join(directory, "control.bin"), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._flock():
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) == HEADER.size and header[:8] == MAGIC and HEADER.unpack(header)[1] == LAYOUT:
+                quote_slots = HEADER.unpack(header)[3]  # Created by another worker - its size wins
+            else:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, HEADER.size + quote_slots * SLOT.size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, LAYOUT, 0, quote_slots, 0, 0, 0, 0, 0, 0), 0)
+        self.quote_slots = quote_slots
+        self.mm = mmap.mmap(self._fd, HEADER.size + quote_slots * SLOT.size)
+
+    @contextmanager
+    def _flock(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _get(self, offset: int) -> int:
+        return _U64.unpack_from(self.mm, offset)[0]
+
+    def _set(self, offset: int, value: int) -> None:
+        _U64.pack_into(self.mm, offset, value)
+
+    # Leader election
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_fd is not None
+
+    def try_lead(self) -> bool:
+        """Take the leader lock if nobody holds it - True when this worker leads"""
+        if self._leader_fd is None:
+            fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            self._leader_fd = fd
+            self._set(LEADER_PID, os.getpid())
+        return True
+
+    def resign(self) -> None:
+        """Release the leader lock (shutdown) so a follower takes over at once"""
+        if self._leader_fd is not None:
+            os.close(self._leader_fd)
+            self._leader_fd = None
+
+    # Universe
+
+    @property
+    def version(self) -> int:
+        """Newest published universe version - one read from the mapping"""
+        return self._get(VERSION)
+
+    def publish(self, columns: ColumnarStore, source: str, version: int,
+                changed: Optional[Iterable[str]], meta: Optional[Dict] = None) -> None:
+        """Leader: write one version for the followers. `changed` lets a
+        follower that is exactly one version behind apply it as a delta."""
+        write_snapshot(self.universe_path, columns, source, durable=False, meta={
+            **(meta or {}), "version": version, "changed": sorted(changed) if changed is not None else None,
+        })
+        self._set(VERSION, version)
+        self.published += 1
+
+    def load(self) -> Optional[Tuple[ColumnarStore, SnapshotInfo]]:
+        """The published universe with numeric columns as views onto the
+        file mapping - the page cache holds one copy for all workers"""
+        if not self.version:
+            return None
+        try:
+            loaded = load_snapshot(self.universe_path)
+        except SnapshotFileError as e:
+            print(f"Ignoring shared universe: {e}")
+            return None
+        self.loaded += 1
+        return loaded
+
+    # Refresh requests - followers hand POST /api/refresh to the leader
+
+    def request_refresh(self) -> int:
+        """Ask the leader for a rebuild - returns the ticket to wait on"""
+        with self._flock():
+            ticket = self._get(REQUESTED) + 1
+            self._set(REQUESTED, ticket)
+        return ticket
+
+    def take_refresh(self) -> int:
+        """Leader: newest ticket nobody is working on yet, 0 when none"""
+        requested = self._get(REQUESTED)
+        if requested <= max(self._get(COMPLETED), self._refresh_taken):
+            return 0
+        self._refresh_taken = requested
+        return requested
+
+    def complete_refresh(self, ticket: int, ok: bool) -> None:
+        with self._flock():
+            self._set(REFRESH_OK, int(ok))
+            self._set(COMPLETED, max(ticket, self._get(COMPLETED)))
+
+    def refresh_result(self, ticket: int) -> Optional[bool]:
+        """None while the ticket is pending, else whether the refresh worked"""
+        if self._get(COMPLETED) < ticket:
+            return None
+        return bool(self._get(REFRESH_OK))
+
+    def stats(self) -> Dict:
+        return {
+            "directory": self.directory, "pid": os.getpid(), "leader": self.is_leader,
+            "leader_pid": self._get(LEADER_PID), "version": self.version,
+            "published": self.published, "loaded": self.loaded,
+            "refresh_requested": self._get(REQUESTED), "refresh_completed": self._get(COMPLETED),
+        }
+
+
+class SharedQuoteCache:
+    """QuoteCache over the control.bin quote table - same lookup states and
+    TTLs, but every worker sees the quotes any worker stored.
+
+    Open addressing keyed by crc32 of the ticker (stable across processes,
+    unlike hash()). Each slot is a seqlock: a writer bumps `seq` to odd,
+    writes, bumps it to even; a reader copies the slot and retries when
+    `seq` was odd or changed meanwhile. Only price, change and market cap
+    are kept - the fields of a quote record. Hit/miss counters are per
+    worker.
+    """
+
+    def __init__(self, segment: SharedSegment, ttl: float = 60, stale_ttl: float = 240,
+                 negative_ttl: float = 300, clock: Callable[[], float] = time.time):
+        self.segment = segment
+        self.maxsize = segment.quote_slots
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._mm = segment.mm
+        self._mask = segment.quote_slots - 1
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+            "evictions": 0, "expirations": 0
+        }
+
+    def __len__(self) -> int:
+        return self.segment._get(USED)
+
+    def _read(self, i: int) -> Optional[Tuple]:
+        offset = HEADER.size + i * SLOT.size
+        for _ in range(RETRIES):
+            raw = self._mm[offset:offset + SLOT.size]
+            if not raw[0] & 1 and self._mm[offset:offset + 4] == raw[:4]:
+                return SLOT.unpack(raw)
+        return None
+
+    def _find(self, key: bytes) -> Optional[Tuple]:
+        start = zlib.crc32(key)
+        for probe in range(PROBE):
+            fields = self._read((start + probe) & self._mask)
+            if fields is None:
+                continue
+            if not fields[1] & USED_SLOT:
+                return None  # Slots are never emptied - the key is not further along
+            if fields[2].rstrip(b"\0") == key:
+                return fields
+        return None
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def lookup(self, key: str) -> Tuple[str, Any]:
+        """Return (state, value) - value is None for NEGATIVE and MISS"""
+        fields = self._find(key.encode())
+        if fields is None:
+            self._count("misses")
+            return MISS, None
+
+        _, flags, _, stored_at, price, change, market_cap = fields
+        age = self._clock() - stored_at
+        if flags & NEGATIVE_SLOT:
+            if age < self.negative_ttl:
+                self._count("negative_hits")
+                return NEGATIVE, None
+        elif age < self.ttl + self.stale_ttl:
+            self._count("hits" if age < self.ttl else "stale_hits")
+            value = {"ticker": key, "price": price, "change_percent": change,
+                     "market_cap": market_cap, "is_live": True}
+            return (FRESH if age < self.ttl else STALE), value
+
+        with self._lock:
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+        return MISS, None
+
+    def set(self, key: str, value: Dict) -> None:
+        self._store(key, USED_SLOT, value["price"], value["change_percent"], value.get("market_cap") or 0)
+
+    def set_missing(self, key: str) -> None:
+        """Remember that upstream has no data for key (negative entry)"""
+        self._store(key, USED_SLOT | NEGATIVE_SLOT, 0.0, 0.0, 0)
+
+    def _store(self, key: str, flags: int, price: float, change: float, market_cap: int) -> None:
+        encoded = key.encode()
+        if len(encoded) > 16:
+            return  # Longer than any listed ticker - not worth a slot
+        start = zlib.crc32(encoded)
+        with self.segment._flock():
+            target, oldest, empty = None, None, False
+            for probe in range(PROBE):
+                i = (start + probe) & self._mask
+                fields = SLOT.unpack_from(self._mm, HEADER.size + i * SLOT.size)
+                if not fields[1] & USED_SLOT:
+                    target, empty = i, True
+                    break
+                if fields[2].rstrip(b"\0") == encoded:
+                    target = i
+                    break
+                if oldest is None or fields[3] < oldest:
+                    target, oldest = i, fields[3]
+            else:
+                self._count("evictions")
+
+            offset = HEADER.size + target * SLOT.size
+            seq = _U32.unpack_from(self._mm, offset)[0]
+            _U32.pack_into(self._mm, offset, (seq + 1) & 0xFFFFFFFF)
+            body = SLOT.pack(0, flags, encoded, self._clock(), float(price), float(change), int(market_cap))
+            self._mm[offset + 4:offset + SLOT.size] = body[4:]
+            _U32.pack_into(self._mm, offset, (seq + 2) & 0xFFFFFFFF)
+            if empty:
+                self.segment._set(USED, self.segment._get(USED) + 1)
+
+    def clear(self) -> None:
+        with self.segment._flock():
+            self._mm[HEADER.size:] = bytes(len(self._mm) - HEADER.size)
+            self.segment._set(USED, 0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self), "maxsize": self.maxsize}
@@ -0,0 +1,111 @@
+"""
+Versioned universe snapshots - every change to the stock list (startup load,
+price refresh, manual refresh) publishes a new snapshot with a higher version
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cached_property
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+from market.columnar import ColumnarStore
+
+CHANGE_HISTORY = 256  # Versions kept for delta lookups (?since=)
+
+
+@dataclass(frozen=True, eq=False)
+class Snapshot:
+    """One published state of the universe, backed by a ColumnarStore.
+
+    Row dicts (`stocks`) are only materialised when something asks for the
+    classic row-oriented shape, and then kept for the snapshot's lifetime.
+    Treat both as read-only - changes go through SnapshotStore.publish.
+    """
+    version: int
+    columns: ColumnarStore
+    created_at: datetime = field(default_factory=datetime.now)
+    source: str = "empty"
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    @cached_property
+    def stocks(self) -> List[Dict]:
+        return self.columns.to_records()
+
+    def get(self, ticker: str) -> Optional[Dict]:
+        """Row dict for ticker, or None - O(1) without materialising all rows"""
+        i = self.columns.positions.get(ticker)
+        return None if i is None else self.columns.record(i)
+
+
+class SnapshotStore:
+    """Holds the current snapshot - readers grab `current` once per request
+    and keep using it even if a newer one is published meanwhile.
+
+    The store remembers which tickers changed in the last CHANGE_HISTORY
+    versions so clients can ask for a delta instead of the full list.
+    """
+
+    def __init__(self, history: int = CHANGE_HISTORY):
+        self._lock = threading.Lock()
+        self._current = Snapshot(version=0, columns=ColumnarStore.empty())
+        # (version, changed tickers) - None marks a full replacement
+        self._changes = deque(maxlen=history)
+        self._listeners: List[Callable[[Snapshot, Optional[frozenset]], None]] = []
+
+    @property
+    def current(self) -> Snapshot:
+        return self._current
+
+    def add_listener(self, listener: Callable[[Snapshot, Optional[frozenset]], None]) -> None:
+        """Call listener(snapshot, changed) after every publish, on the
+        publishing thread"""
+        self._listeners.append(listener)
+
+    def publish(self, data: Union[ColumnarStore, Sequence[Dict]], source: str,
+                changed: Optional[Iterable[str]] = None, version: Optional[int] = None,
+                created_at: Optional[datetime] = None) -> Snapshot:
+        """Swap in a new snapshot built from a ColumnarStore or row dicts.
+        `changed` lists the tickers that differ from the previous one - leave
+        it None when the whole universe was replaced. `version` and
+        `created_at` adopt a snapshot published by another worker, so every
+        worker serves the same bytes for a version."""
+        columns = data if isinstance(data, ColumnarStore) else ColumnarStore.from_records(data)
+        changed = frozenset(changed) if changed is not None else None
+        with self._lock:
+            if version is None:
+                version = self._current.version + 1
+            elif version <= self._current.version:
+                raise ValueError(f"Version {version} is not newer than {self._current.version}")
+            snapshot = Snapshot(version=version, columns=columns, source=source,
+                                created_at=created_at or datetime.now())
+            self._current = snapshot
+            self._changes.append((snapshot.version, changed))
+        for listener in self._listeners:
+            listener(snapshot, changed)
+        return snapshot
+
+    def changes_since(self, version: int, until: Optional[int] = None) -> Optional[Set[str]]:
+        """Tickers changed after `version` up to `until` (default: current), or
+        None if the client must resync (version unknown, too old, or a full
+        replacement happened in between)"""
+        with self._lock:
+            current = self._current.version
+            changes = list(self._changes)
+        until = current if until is None else min(until, current)
+        if version == until:
+            return set()
+        if version > until or not changes or version < changes[0][0] - 1:
+            return None
+
+        tickers = set()
+        for v, changed in changes:
+            if v <= version or v > until:
+                continue
+            if changed is None:
+                return None
+            tickers.update(changed)
+        return tickers
@@ -0,0 +1,124 @@
+"""
+Server-Sent Events fan-out for snapshot deltas - each delta is encoded once
+and shared by every subscriber; slow subscribers are dropped to a resync
+"""
+
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from market.encoding import dumps
+
+QUEUE_SIZE = 32         # Pending events per subscriber before it is dropped
+KEEPALIVE_SECONDS = 15  # Comment line so proxies keep idle streams open
+
+
+def sse_event(event: str, data: Dict, event_id: Optional[int] = None) -> bytes:
+    """Encode one SSE message"""
+    head = f"event: {event}\n"
+    if event_id is not None:
+        head += f"id: {event_id}\n"
+    return head.encode() + b"data: " + dumps(data) + b"\n\n"
+
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def delta_payload(snapshot, since: int, tickers: Optional[Set[str]]) -> Dict:
+    """Delta body shared by /api/stocks?since= and the stream.
+
+    `tickers` is the changed set from SnapshotStore.changes_since - None means
+    the client is too far behind and gets the full list (`full: true`).
+    """
+    if tickers is None:
+        stocks = snapshot.stocks
+    else:
+        positions = snapshot.columns.positions
+        stocks = snapshot.columns.to_records(sorted(positions[t] for t in tickers if t in positions))
+    return {
+        "stocks": stocks,
+        "count": len(stocks),
+        "version": snapshot.version,
+        "since": since,
+        "full": tickers is None,
+        "last_updated": snapshot.created_at.isoformat()
+    }
+
+
+class Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, queue_size: int):
+        # (version, encoded event) - version lets the stream skip duplicates
+        self.queue: "asyncio.Queue[Tuple[int, bytes]]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class Broadcaster:
+    """Fans pre-encoded events out to bounded per-subscriber queues.
+
+    Publishing never waits on a subscriber: a full queue means the client is
+    not keeping up, so its backlog is replaced by a single `resync` event and
+    it is removed from the fan-out (the client reconnects with ?since=).
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Loop that owns the subscriber queues - publishes from other
+        threads are handed over to it"""
+        self._loop = loop
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(self, version: int, message: bytes) -> None:
+        """Queue message for every subscriber (loop thread only)"""
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait((version, message))
+            except asyncio.QueueFull:
+                self._drop(subscriber, version)
+
+    def publish_threadsafe(self, version: int, message: bytes) -> None:
+        """publish() from any thread - snapshots can be published by executor workers"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.publish(version, message)
+        else:
+            loop.call_soon_threadsafe(self.publish, version, message)
+
+    def _drop(self, subscriber: Subscriber, version: int) -> None:
+        self.dropped += 1
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait((version, sse_event("resync", {"version": version}, version)))
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+            "queue_size": self.queue_size
+        }
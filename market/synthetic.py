@@ -0,0 +1,136 @@
+"""
+Seeded, vectorised universe generation - market caps, share-count tiers,
+prices, changes and weights for N tickers in one batched NumPy pass.
+The same seed always yields the same universe, at 500 or 50,000 names.
+"""
+
+import random
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from market.columnar import ColumnarStore
+from market.reference import KNOWN_CAPS, REAL_PRICES
+
+DEFAULT_SEED = 500
+
+SECTORS = (
+    "Information Technology", "Health Care", "Financials", "Consumer Discretionary",
+    "Communication Services", "Industrials", "Consumer Staples", "Energy",
+    "Utilities", "Real Estate", "Materials"
+)
+
+# (ticker, name, sector, market cap in $B) - the head of every synthetic universe
+TOP_COMPANIES = (
+    ("AAPL", "Apple Inc.", "Information Technology", 3000),
+    ("MSFT", "Microsoft", "Information Technology", 2800),
+    ("GOOGL", "Alphabet", "Communication Services", 1700),
+    ("AMZN", "Amazon", "Consumer Discretionary", 1600),
+    ("NVDA", "NVIDIA", "Information Technology", 1500),
+    ("META", "Meta Platforms", "Communication Services", 900),
+    ("TSLA", "Tesla", "Consumer Discretionary", 750),
+    ("BRK-B", "Berkshire Hathaway", "Financials", 780),
+    ("UNH", "UnitedHealth", "Health Care", 500),
+    ("XOM", "Exxon Mobil", "Energy", 450),
+)
+
+# Average shares outstanding by market cap tier: (cap above, shares)
+SHARE_TIERS = (
+    (500_000_000_000, 15_000_000_000),  # Large cap ~15B shares
+    (100_000_000_000, 3_000_000_000),   # Mid-large cap ~3B shares
+    (50_000_000_000, 1_000_000_000),    # Mid cap ~1B shares
+    (0, 500_000_000),                   # Smaller cap ~500M shares
+)
+MIN_PRICE, MAX_PRICE = 15, 800
+TAIL_CAP = 25_000_000_000  # Largest generated (non-top) cap before noise
+TOTAL_MARKET_CAP = 62_000_000_000_000  # ~$62T target for a listed index
+MIN_CAP, MAX_CAP = 5_000_000_000, 150_000_000_000  # Range of estimated caps
+
+
+def shares_outstanding(market_cap: np.ndarray) -> np.ndarray:
+    """Implied share count per row from its market cap tier"""
+    thresholds = [cap for cap, _ in SHARE_TIERS]
+    shares = [s for _, s in SHARE_TIERS]
+    return np.select([market_cap > t for t in thresholds[:-1]], shares[:-1], default=shares[-1]).astype(np.float64)
+
+
+def price_universe(tickers: Sequence[str], names: Sequence[str], sectors: Sequence[str],
+                   sector_codes: np.ndarray, market_cap: np.ndarray, rng: np.random.Generator,
+                   real_prices: Mapping[str, float] = REAL_PRICES) -> ColumnarStore:
+    """Prices, changes and weights for a set of companies in one pass.
+
+    Tickers with a reference price keep it (with a small random change); the
+    rest get cap / tier share count with +-5% noise, clamped to a sane range.
+    """
+    n = len(tickers)
+    market_cap = np.asarray(market_cap, np.float64)
+    reference = np.fromiter((real_prices.get(t, np.nan) for t in tickers), np.float64, n)
+    known = ~np.isnan(reference)
+
+    noise = rng.uniform(0.95, 1.05, n)
+    estimated = np.clip(market_cap / shares_outstanding(market_cap) * noise, MIN_PRICE, MAX_PRICE)
+    price = np.round(np.where(known, reference, estimated), 2)
+    change = np.round(np.where(known, rng.uniform(-1.5, 1.5, n), rng.uniform(-2.0, 2.0, n)), 2)
+    weight = np.round(market_cap / (market_cap.sum() or 1) * 100, 4)
+
+    return ColumnarStore(
+        tickers=tuple(tickers), names=tuple(names), sectors=tuple(sectors),
+        sector_codes=np.asarray(sector_codes, np.uint8 if len(sectors) <= 256 else np.uint16),
+        market_cap=market_cap, price=price, change_percent=change, weight=weight,
+    )
+
+
+def synthetic_universe(size: int, seed: Optional[int] = DEFAULT_SEED) -> ColumnarStore:
+    """TOP_COMPANIES followed by generated STKnnn names, `size` rows in total.
+
+    Generated caps fall off linearly with rank (times 0.5-1.5 noise), so the
+    shape of the distribution is the same at any size.
+    """
+    rng = np.random.default_rng(seed)
+    top = TOP_COMPANIES[:size]
+    rest = size - len(top)
+    width = max(3, len(str(size - 1)))
+
+    idx = np.arange(len(top), size)
+    tickers = [t for t, _, _, _ in top] + [f"STK{i:0{width}d}" for i in idx.tolist()]
+    names = [n for _, n, _, _ in top] + [f"Company {i}" for i in idx.tolist()]
+    codes = np.concatenate([
+        np.fromiter((SECTORS.index(s) for _, _, s, _ in top), np.int64, len(top)),
+        rng.integers(0, len(SECTORS), rest),
+    ])
+    caps = np.concatenate([
+        np.fromiter((mc * 1_000_000_000 for _, _, _, mc in top), np.float64, len(top)),
+        np.floor(TAIL_CAP * (1 - idx / size) * rng.uniform(0.5, 1.5, rest)),
+    ])
+    return price_universe(tickers, names, SECTORS, codes, caps, rng)
+
+
+def estimate_caps(listed: List[Dict], seed: Optional[int] = DEFAULT_SEED,
+                  known_caps: Mapping[str, int] = KNOWN_CAPS) -> List[Dict]:
+    """{ticker, name, sector, market_cap} per listed company - known caps as
+    is, the rest spread around the average of what TOTAL_MARKET_CAP leaves.
+    The same seed always estimates the same caps."""
+    rng = random.Random(seed)
+    remaining = TOTAL_MARKET_CAP - sum(known_caps.values())
+    avg = remaining / max(len(listed) - len([t for t in known_caps if known_caps[t] > 0]), 1)
+    companies = []
+    for company in listed:
+        ticker = company["ticker"]
+        if ticker in known_caps:
+            market_cap = known_caps[ticker]
+        else:
+            market_cap = int(max(MIN_CAP, min(MAX_CAP, avg * rng.uniform(0.3, 1.7))))
+        companies.append({"ticker": ticker, "name": company["name"], "sector": company["sector"],
+                          "market_cap": market_cap})
+    return companies
+
+
+def companies_universe(companies: List[Dict], seed: Optional[int] = DEFAULT_SEED) -> ColumnarStore:
+    """Price a list of {ticker, name, sector, market_cap} companies (e.g. from Wikipedia)"""
+    rng = np.random.default_rng(seed)
+    lookup: Dict[str, int] = {}
+    codes = np.fromiter((lookup.setdefault(c["sector"], len(lookup)) for c in companies), np.int64, len(companies))
+    return price_universe(
+        [c["ticker"] for c in companies], [c["name"] for c in companies], tuple(lookup), codes,
+        np.fromiter((c["market_cap"] for c in companies), np.float64, len(companies)), rng,
+    )
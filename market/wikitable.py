@@ -0,0 +1,124 @@
+"""
+Streaming wikitable reader - stdlib html.parser instead of pandas.read_html.
+
+Rows of the first `wikitable` on a page are yielded as soon as their closing
+tag arrives, so a caller can start building records while the rest of the
+page is still downloading, and stop reading once the table is complete.
+"""
+
+import codecs
+import re
+from collections import deque
+from html.parser import HTMLParser
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Union
+
+CHUNK_SIZE = 64 * 1024   # Bytes per read from the network
+FEED_SIZE = 16 * 1024    # Characters per parser.feed call
+_TAIL = 1024
+_TABLE_START = re.compile(r"""<table\b[^>]*\bclass=["']?[^"'>]*\bwikitable\b""", re.IGNORECASE)
+
+
+class WikitableParser(HTMLParser):
+    """Collects rows of the first table whose class list contains `wikitable`.
+
+    The first row is taken as the header; every later row becomes a
+    {header: cell text} dict in `rows`. Cell text is whitespace-normalised
+    like pandas does. rowspan/colspan are not expanded - the constituents
+    table doesn't use them.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.header: Optional[List[str]] = None
+        self.rows: Deque[Dict[str, str]] = deque()
+        self.done = False
+        self._depth = 0          # Table nesting inside the wikitable, 0 = outside
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "table":
+            if self._depth:
+                self._depth += 1
+            elif "wikitable" in (dict(attrs).get("class") or "").split():
+                self._depth = 1
+            return
+        if self._depth != 1:
+            return
+        if tag == "tr":
+            if self._row is not None:  # </tr> is optional in HTML
+                self._end_row()
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            if self._cell is not None:  # So is </td>
+                self._end_cell()
+            self._cell = []
+        elif tag == "br" and self._cell is not None:
+            self._cell.append(" ")
+
+    def handle_endtag(self, tag):
+        if not self._depth or self.done:
+            return
+        if tag == "table":
+            if self._depth == 1 and self._row is not None:
+                self._end_row()
+            self._depth -= 1
+            self.done = self._depth == 0
+        elif self._depth != 1:
+            return
+        elif tag in ("td", "th") and self._cell is not None:
+            self._end_cell()
+        elif tag == "tr" and self._row is not None:
+            self._end_row()
+
+    def _end_cell(self):
+        self._row.append(" ".join("".join(self._cell).split()))
+        self._cell = None
+
+    def _end_row(self):
+        if self._cell is not None:
+            self._end_cell()
+        row, self._row = self._row, None
+        if not row:
+            return
+        if self.header is None:
+            self.header = row
+        else:
+            self.rows.append(dict(zip(self.header, row)))
+
+    def handle_data(self, data):
+        if self._cell is not None and self._depth == 1:
+            self._cell.append(data)
+
+
+def iter_rows(chunks: Iterable[Union[bytes, str]], encoding: str = "utf-8") -> Iterator[Dict[str, str]]:
+    """Yield rows of the first wikitable from an iterable of HTML chunks.
+
+    Everything before the table is skipped with a plain regex search instead
+    of being tokenised, and `chunks` is no longer consumed once the table is
+    closed.
+    """
+    parser = WikitableParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if pending is not None:
+            pending += text
+            match = _TABLE_START.search(pending)
+            if match is None:
+                pending = pending[-_TAIL:]  # The tag may straddle two chunks
+                continue
+            text, pending = pending[match.start():], None
+        # Fed in slices so a single large chunk still stops at </table>
+        for i in range(0, len(text), FEED_SIZE):
+            parser.feed(text[i:i + FEED_SIZE])
+            while parser.rows:
+                yield parser.rows.popleft()
+            if parser.done:
+                return
+    parser.close()
+    while parser.rows:
+        yield parser.rows.popleft()